@@ -3,29 +3,52 @@ Laboratory Experiment Cost Estimator
 Flask Application with Separate Database Files
 """
 
-from flask import Flask, render_template, jsonify, request, session
+from flask import (Blueprint, Flask, Response, g, has_app_context, render_template, jsonify, request, session,
+                   stream_with_context)
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
+from contextlib import contextmanager
 from functools import wraps
-import json
+import atexit
+import bulk_io
+import logging
+import math
 import os
 import secrets
-from datetime import timedelta
-from waitress import serve
-
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))  # Use env variable in production
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SECURE'] = False  # Set True if using HTTPS
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
-
-app.config["DEBUG"] = False
-
-
-USERS_FILE = "users.json"
-EXPERIMENTS_FILE = 'experiments.json'
-ITEMS_FILE = 'items.json'
-CATEGORIES_FILE = 'exp_catagories.json'
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from waitress import create_server
+from caching import LRUCache
+from catalog import Catalog
+from change_feed import ChangeFeed
+from cost_engine import Scenario, aggregate, evaluate_scenarios
+from experiment_index import ExperimentIndex
+import http_caching
+import metrics
+import reports
+from rate_limit import RateLimiter
+from records import RECORD_TYPES, ExperimentRecord, compact_collections, item_details, item_pairs
+from search_index import SearchIndex
+import serialization
+from storage import create_storage
+from user_store import UserStore
+from shared_state import SharedStateCoordinator
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+api = Blueprint('lab', __name__)
+
+storage = create_storage()
+atexit.register(storage.close)  # Flush pending writes on shutdown
+user_store = UserStore(storage, float(os.environ.get('USER_CACHE_CHECK_SECONDS', 1)))
+
+# e.g. 'pbkdf2:sha256:100000' or 'scrypt:16384:8:1'; unset keeps werkzeug's default.
+# Only new hashes use it; existing hashes verify with the cost they were created with.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD')
 
 # ==================== AUTHENTICATION DECORATOR ====================
 
@@ -52,100 +75,617 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def write_locked(f):
+    """Decorator to serialize mutating routes so concurrent edits don't lose updates"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with storage.lock, mutating():
+            try:
+                if coordinator is None:
+                    # A reload may have swapped the data since the request started; write to the live set
+                    bind_data()
+                    return f(*args, **kwargs)
+                # Also exclude writers in other worker processes
+                with coordinator.write():
+                    bind_data()
+                    return f(*args, **kwargs)
+            finally:
+                bump_data_version()
+    decorated_function.writes = True  # asgi.py sends these to its write executor
+    return decorated_function
+
 # ==================== FILE OPERATIONS ====================
 
-def load_users():
-    try:
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+@metrics.timed('load_users')
+def load_users(for_update=False):
+    """Get the cached user table; for_update returns a private copy to modify and save"""
+    if for_update:
+        return user_store.get_for_update()
+    return user_store.get()
 
 def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    user_store.save(users)
 
-def load_json_file(filepath, default_value):
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading {filepath}: {e}")
-            return default_value
-    return default_value
-
-def save_json_file(filepath, data):
-    try:
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving {filepath}: {e}")
+# Set by asgi.py to a ProcessPoolExecutor so hashing doesn't hold this process's GIL
+password_pool = None
+
+def run_password_task(func, *args, **kwargs):
+    """Call a hashing function, in password_pool if one is configured"""
+    if password_pool is None:
+        return func(*args, **kwargs)
+    return password_pool.submit(func, *args, **kwargs).result()
+
+def hash_password(password):
+    """Hash a new password with the configured PASSWORD_HASH_METHOD"""
+    if PASSWORD_HASH_METHOD:
+        return run_password_task(generate_password_hash, password, method=PASSWORD_HASH_METHOD)
+    return run_password_task(generate_password_hash, password)
+
+def verify_password(password_hash, password):
+    return run_password_task(check_password_hash, password_hash, password)
 
 
 def load_all_data():
     """Load all database files"""
-    experiments = load_json_file(EXPERIMENTS_FILE, {})
-    items_data = load_json_file(ITEMS_FILE, {'items': []})
-    categories_data = load_json_file(CATEGORIES_FILE, {'categories': []})
+    experiments = storage.load_experiments()
+    items_data = storage.load_items()
+    categories_data = storage.load_categories()
+    
+    # Re-apply mutations journaled after the last snapshot
+    storage.replay_journal(experiments, items_data, categories_data)
+    
+    # Slotted records from here on; in place, since the storage engine persists these objects
+    compact_collections(experiments, items_data, categories_data)
+    storage.save_binary_snapshots()
     
     return experiments, items_data, categories_data
 
-# Load data on startup
-experiments_db, items_data, categories_data = load_all_data()
+def build_search_index(experiments, items_data, categories_data):
+    """/api/search index over the given collections"""
+    documents = [('item', item['id'], item['name'], item.get('unit', '')) for item in items_data['items']]
+    documents += [('experiment', exp['id'], exp['name']) for exp in experiments.values()]
+    documents += [('category', cat['id'], cat['name'], cat.get('subject', ''))
+                  for cat in categories_data['categories']]
+    index = SearchIndex()
+    index.reset(documents)
+    return index
+
+class LabData:
+    """The loaded collections and the indexes built over them, swapped in as one"""
+
+    __slots__ = ('experiments_db', 'items_data', 'categories_data', 'catalog', 'experiment_index', 'search_index')
+
+    def __init__(self, experiments_db, items_data, categories_data, catalog, experiment_index, search_index):
+        self.experiments_db = experiments_db
+        self.items_data = items_data
+        self.categories_data = categories_data
+        self.catalog = catalog
+        self.experiment_index = experiment_index
+        self.search_index = search_index
+
+def build_data():
+    """Load the collections and build their indexes without touching the live ones"""
+    experiments, items, categories = load_all_data()
+    new_catalog = Catalog(items, categories)
+    new_experiment_index = ExperimentIndex(experiments, new_catalog)
+    new_search_index = build_search_index(experiments, items, categories)
+    return LabData(experiments, items, categories, new_catalog, new_experiment_index, new_search_index)
+
+def install_data(data):
+    """Make a LabData returned by build_data() the live one
+
+    One reference is swapped; requests keep the set they bound (see
+    current_data), except the one doing the reload, which moves to the new one.
+    """
+    global dataset
+    dataset = data
+    if has_app_context():
+        bind_data()
+
+# Loaded on first use (init_data), not at import, so tools and tests that never
+# touch the data don't pay for parsing it
+dataset = None
+_data_lock = threading.Lock()
+
+def bind_data():
+    """Pin the live LabData to the current request"""
+    g.lab_data = dataset
+
+def _bound_data():
+    data = g.get('lab_data') if has_app_context() else None
+    return data if data is not None else dataset
+
+# The LabData a request works on. It is bound once per request, so a reload
+# mid-request can't mix old and new collections; outside a request it is the live set.
+current_data = LocalProxy(_bound_data)
+
+def init_data():
+    """Load the collections unless they already are; cheap after the first call"""
+    if dataset is None:
+        with _data_lock:
+            if dataset is None:
+                with storage.lock:
+                    install_data(build_data())
+
+# Bumped by every mutation; cache keys include it so stale entries are never served
+data_version = 0
+
+def bump_data_version():
+    global data_version
+    data_version += 1
+
+# Mutations running in this process (writes, shared-state reloads), all under storage.lock
+mutations_running = 0
+
+@contextmanager
+def mutating():
+    """Mark in-memory data as changing; a response built meanwhile gets no ETag"""
+    global mutations_running
+    mutations_running += 1
+    try:
+        yield
+    finally:
+        mutations_running -= 1
+
+# What changed, for clients patching their copies (/api/changes)
+change_feed = ChangeFeed(int(os.environ.get('CHANGE_FEED_SIZE', 10000)))
+
+def reload_data():
+    """Swap in freshly loaded collections (another worker process wrote, or an admin asked)
+
+    The new set is built completely before it replaces the old one, so
+    requests already running finish on the objects they started with.
+    """
+    with storage.lock:
+        install_data(build_data())
+        user_store.invalidate()
+        change_feed.reset()
+        bump_data_version()
+
+# ==================== SHARED STATE (MULTI-PROCESS) ====================
+
+coordinator = None
+
+def enable_shared_state():
+    """Keep this process coherent with other workers serving the same data files"""
+    global coordinator
+    if coordinator is None:
+        storage.make_synchronous()
+        coordinator = SharedStateCoordinator(reload_data)
+    return coordinator
+
+def cache_version():
+    """Version of the data cacheable GET bodies are built from
+
+    data_version is a per-process counter, so with several workers only the
+    shared version file identifies the same data in every process. None while
+    a mutation is running, since a body built now could mix old and new data.
+    """
+    if mutations_running:
+        return None
+    if coordinator is not None:
+        return f"s{coordinator.seen_version}"
+    return data_version
+
+if os.environ.get('SHARED_STATE') == '1':
+    enable_shared_state()
+
+@api.before_app_request
+def load_data_on_first_request():
+    init_data()
+
+@api.before_app_request
+def refresh_shared_state():
+    if coordinator is not None and coordinator.is_stale():
+        with storage.lock, mutating():
+            coordinator.refresh()
+
+@api.before_app_request
+def bind_request_data():
+    bind_data()
+
+# ==================== METRICS ====================
+
+metrics.REGISTRY.register(metrics.Gauge('lab_data_version', 'In-memory data version', lambda: data_version))
+metrics.REGISTRY.register(metrics.Gauge(
+    'lab_experiments', 'Experiments loaded', lambda: len(dataset.experiments_db) if dataset is not None else None))
+metrics.REGISTRY.register(metrics.Gauge(
+    'lab_items', 'Catalog items loaded', lambda: len(dataset.items_data['items']) if dataset is not None else None))
 
 # ==================== HELPER FUNCTIONS ====================
 
 def get_item_by_id(item_id):
     """Get item details from items database"""
-    for item in items_data['items']:
-        if item['id'] == item_id:
-            return item
-    return None
+    return current_data.catalog.get_item(item_id)
 
 def get_category_by_id(category_id):
     """Get category name from categories database"""
-    for cat in categories_data['categories']:
-        if cat['id'] == category_id:
-            return cat['name']
-    return 'Unknown'
+    cat = current_data.catalog.get_category(category_id)
+    return cat['name'] if cat else 'Unknown'
 
 
 def get_category_id_by_name(category_name):
     """Get category ID from category name"""
-    for cat in categories_data['categories']:
-        if cat['name'] == category_name:
-            return cat['id']
-    return ''
+    return current_data.catalog.get_category_id_by_name(category_name)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_amount(value):
+    """A finite, non-negative number (quantity or price)"""
+    return is_number(value) and math.isfinite(value) and value >= 0
+
 
+def experiment_changed(experiment):
+    """Persist an experiment and refresh everything derived from it"""
+    storage.save_experiment(experiment)
+    current_data.experiment_index.refresh_experiment(experiment['id'])
+    current_data.search_index.add('experiment', experiment['id'], experiment['name'])
+    change_feed.record('experiment', 'upsert', experiment['id'])
 
+def experiment_deleted(exp_id):
+    storage.delete_experiment(exp_id)
+    current_data.experiment_index.remove_experiment(exp_id)
+    current_data.search_index.remove('experiment', exp_id)
+    change_feed.record('experiment', 'delete', exp_id)
+
+def item_changed(item):
+    """Persist a catalog item and refresh the experiments that use it"""
+    storage.save_item(item)
+    current_data.experiment_index.item_changed(item['id'])
+    current_data.search_index.add('item', item['id'], item['name'], item.get('unit', ''))
+    change_feed.record('item', 'upsert', item['id'])
+
+def category_changed(category):
+    storage.save_category(category)
+    current_data.search_index.add('category', category['id'], category['name'], category.get('subject', ''))
+    change_feed.record('category', 'upsert', category['id'])
+
+
+@metrics.timed('build_experiment_response')
 def build_experiment_response(exp_data):
     """Build full experiment response with item and category details"""
+    catalog = current_data.catalog
+    exp_category = catalog.get_category(exp_data.get('category', ''))
     result = {
         'id': exp_data['id'],
         'name': exp_data['name'],
         'trials': exp_data.get('trials', 1),
-        'category': get_category_by_id(exp_data.get('category', '')),
+        'category': exp_category['name'] if exp_category else 'Unknown',
         'category_id': exp_data.get('category', ''),
         'grade': exp_data.get('grade', []),
         'items': []
     }
     
     # Populate items with full details
-    for exp_item in exp_data.get('items', []):
-        item_details = get_item_by_id(exp_item['id'])
-        if item_details:
+    for item_id, quantity in item_pairs(exp_data):
+        item = catalog.get_item(item_id)
+        if item:
+            name, unit, price, category = item_details(item)
             result['items'].append({
-                'id': exp_item['id'],
-                'name': item_details['name'],
-                'quantity': exp_item['quantity'],
-                'unit': item_details['unit'],
-                'price': item_details['price_per_unit'],
-                'category': item_details.get('category', 'consumable')
+                'id': item_id,
+                'name': name,
+                'quantity': quantity,
+                'unit': unit,
+                'price': price,
+                'category': category
             })
     
     return result
 
+# ==================== EXPERIMENT EDITING ====================
+
+def next_experiment_id():
+    """Generate the next free experiment ID"""
+    max_num = 0
+    for exp_id in current_data.experiments_db.keys():
+        try:
+            num = int(exp_id.replace('EXP', ''))
+            max_num = max(max_num, num)
+        except:
+            pass
+    return f"EXP{max_num + 1:03d}"
+
+def add_new_experiment(data):
+    """Create an experiment from request data and add it to the database (not yet persisted)"""
+    # Generate new ID
+    new_id = next_experiment_id()
+    
+    # Find category ID from name
+    category_name = data.get('category', 'Molecular Biology')
+    category_id = get_category_id_by_name(category_name)
+    
+    new_experiment = ExperimentRecord({
+        'id': new_id,
+        'name': data.get('name', 'New Experiment'),
+        'category': category_id,
+        'trials': max(1, int(data.get('trials', 1))),
+        'grade': data.get('grade', []),
+        'items': []
+    })
+    
+    current_data.experiments_db[new_id] = new_experiment
+    return new_experiment
+
+def apply_experiment_fields(experiment, data):
+    """Copy name / category / trials / grade from request data onto an experiment"""
+    if 'name' in data:
+        experiment['name'] = data['name']
+    
+    if 'category' in data:
+        # Convert category name to ID
+        experiment['category'] = get_category_id_by_name(data['category'])
+    
+    if 'trials' in data:
+        experiment['trials'] = max(1, int(data['trials']))
+    
+    if 'grade' in data:
+        experiment['grade'] = data['grade']
+
+def experiment_has_item_named(experiment, item_name):
+    """Check if an item with this name (case-insensitive) is already in the experiment"""
+    for exp_item in experiment.get('items', []):
+        existing_item = get_item_by_id(exp_item['id'])
+        if existing_item and existing_item['name'].lower() == item_name.lower():
+            return True
+    return False
+
+def attach_item(experiment, data):
+    """Add an item reference to an experiment, reusing a catalog item with the same name"""
+    item_name = data.get('name', '').strip()
+    
+    # Check if item already exists in items database (by name)
+    item = current_data.catalog.find_item_by_name(item_name)
+    if item:
+        # Update existing item's details
+        current_data.catalog.update_item(
+            item['id'],
+            price_per_unit=data.get('price', item['price_per_unit']),
+            unit=data.get('unit', item['unit']),
+            category=data.get('category', item.get('category', 'consumable'))
+        )
+    else:
+        # If item doesn't exist, create new item in items database
+        item = current_data.catalog.add_item({
+            'id': current_data.catalog.next_item_id(),
+            'name': item_name,
+            'price_per_unit': data.get('price', 0),
+            'unit': data.get('unit', 'ml'),
+            'category': data.get('category', 'consumable')
+        })
+    item_changed(item)
+    
+    exp_item = {
+        'id': item['id'],
+        'quantity': data.get('quantity', 1)
+    }
+    experiment['items'].append(exp_item)
+    return item, exp_item
+
+def update_attached_item(experiment, item_idx, data):
+    """Update an experiment's item quantity and the catalog item's details"""
+    exp_item = experiment['items'][item_idx]
+    if 'quantity' in data:
+        exp_item['quantity'] = data['quantity']
+    
+    item = current_data.catalog.get_item(exp_item['id'])
+    if item:
+        fields = {}
+        if 'name' in data:
+            fields['name'] = data['name']
+        if 'price' in data:
+            fields['price_per_unit'] = data['price']
+        if 'unit' in data:
+            fields['unit'] = data['unit']
+        if 'category' in data:
+            fields['category'] = data['category']
+        
+        current_data.catalog.update_item(item['id'], **fields)
+        item_changed(item)
+    return item, exp_item
+
+def detach_item(experiment, item_id):
+    """Remove an item reference from an experiment; returns False if it wasn't there"""
+    original_length = len(experiment['items'])
+    experiment['items'] = [item for item in experiment['items'] if item['id'] != item_id]
+    return len(experiment['items']) != original_length
+
+def item_entry_error(entry):
+    """Check one items.add / items.update entry; returns an error message or None"""
+    if not isinstance(entry, dict):
+        return 'Each item edit must be an object'
+    for field in ('id', 'name', 'unit', 'category'):
+        if field in entry and not isinstance(entry[field], str):
+            return f"Item '{field}' must be a string"
+    if 'quantity' in entry and not is_amount(entry['quantity']):
+        return 'Quantity must be a non-negative number'
+    if 'price' in entry and not is_amount(entry['price']):
+        return 'Price must be a non-negative number'
+    return None
+
+def validate_experiment_patch(experiment, patch):
+    """Check a whole experiment edit before anything is applied; returns an error or None
+
+    patch holds experiment fields plus items: {add: [...], update: [...], remove: [ids]}.
+    experiment is None when the patch creates a new experiment.
+    """
+    if not isinstance(patch, dict):
+        return 'Each experiment edit must be an object'
+    if experiment is None and not patch.get('name'):
+        return 'Missing experiment name'
+    for field in ('name', 'category'):
+        if field in patch and not isinstance(patch[field], str):
+            return f"'{field}' must be a string"
+    if 'grade' in patch and not isinstance(patch['grade'], list):
+        return "'grade' must be a list"
+    if 'trials' in patch:
+        try:
+            int(patch['trials'])
+        except (TypeError, ValueError, OverflowError):
+            return 'Trials must be a number'
+    
+    items = patch.get('items', {})
+    if not isinstance(items, dict):
+        return "'items' must be an object with add, update and remove lists"
+    for key in ('add', 'update', 'remove'):
+        if not isinstance(items.get(key, []), list):
+            return f"'items.{key}' must be a list"
+    for entry in items.get('add', []) + items.get('update', []):
+        error = item_entry_error(entry)
+        if error:
+            return error
+    
+    current_ids = [exp_item['id'] for exp_item in experiment['items']] if experiment else []
+    removed = set()
+    for item_id in items.get('remove', []):
+        if not isinstance(item_id, str) or item_id not in current_ids:
+            return f'Item {item_id} not found in experiment'
+        removed.add(item_id)
+    
+    updates = {}
+    for update in items.get('update', []):
+        if update.get('id') not in current_ids or update['id'] in removed:
+            return f'Item {update.get("id")} not found in experiment'
+        updates[update['id']] = update
+    
+    # Names the experiment will hold once removals and renames are applied
+    names = set()
+    for item_id in current_ids:
+        if item_id in removed:
+            continue
+        item = get_item_by_id(item_id)
+        name = updates.get(item_id, {}).get('name') or (item['name'] if item else '')
+        names.add(name.lower())
+    
+    for added in items.get('add', []):
+        item_name = added.get('name', '').strip()
+        if not item_name:
+            return 'Item name is required'
+        if item_name.lower() in names:
+            return f'Item "{item_name}" already exists in this experiment'
+        names.add(item_name.lower())
+    return None
+
+def apply_experiment_patch(experiment, patch):
+    """Apply a validated experiment edit in one pass: fields, removals, updates, additions"""
+    apply_experiment_fields(experiment, patch)
+    items = patch.get('items', {})
+    
+    for item_id in items.get('remove', []):
+        detach_item(experiment, item_id)
+    
+    positions = {exp_item['id']: idx for idx, exp_item in enumerate(experiment['items'])}
+    for update in items.get('update', []):
+        update_attached_item(experiment, positions[update['id']], update)
+    
+    for added in items.get('add', []):
+        attach_item(experiment, added)
+    
+    experiment_changed(experiment)
+
+class ExperimentEditUndo:
+    """Undo log for experiment edits, so a failed request leaves nothing changed in memory
+
+    Pair it with storage.batch(atomic=True), which drops the persisted side.
+    Originals are copied the first time an edit touches them.
+    """
+
+    def __init__(self):
+        self.experiments = {}  # exp id -> copy before the first change, or None if the edit created it
+        self.items = {}        # item id -> fields before the first change
+        self.item_count = len(current_data.items_data['items'])
+
+    def created(self, experiment):
+        self.experiments.setdefault(experiment['id'], None)
+
+    def save(self, experiment, patch):
+        """Copy what apply_experiment_patch(experiment, patch) may change; call before applying it"""
+        if experiment['id'] not in self.experiments:
+            original = ExperimentRecord(dict(
+                experiment,
+                items=[{'id': exp_item['id'], 'quantity': exp_item['quantity']} for exp_item in experiment['items']]
+            ))
+            if isinstance(original.get('grade'), list):
+                original['grade'] = list(original['grade'])
+            self.experiments[experiment['id']] = original
+        items = patch.get('items', {})
+        touched = [current_data.catalog.get_item(update['id']) for update in items.get('update', [])]
+        touched += [current_data.catalog.find_item_by_name(added.get('name', '').strip()) for added in items.get('add', [])]
+        # Items an earlier edit created are dropped by restore(), not put back
+        created = {item['id'] for item in current_data.items_data['items'][self.item_count:]}
+        for item in touched:
+            if item is not None and item['id'] not in self.items and item['id'] not in created:
+                self.items[item['id']] = dict(item)
+
+    def restore(self):
+        """Put every touched experiment and catalog item back and refresh what is derived from them"""
+        created_items = current_data.items_data['items'][self.item_count:]
+        del current_data.items_data['items'][self.item_count:]
+        for item_id, fields in self.items.items():
+            item = current_data.catalog.get_item(item_id)
+            for key in [key for key in item if key not in fields]:
+                del item[key]
+            item.update(fields)
+        current_data.catalog.reset(current_data.items_data, current_data.categories_data)
+        
+        for exp_id, original in self.experiments.items():
+            if original is None:
+                current_data.experiments_db.pop(exp_id, None)
+                current_data.experiment_index.remove_experiment(exp_id)
+                current_data.search_index.remove('experiment', exp_id)
+                change_feed.record('experiment', 'delete', exp_id)
+            else:
+                current_data.experiments_db[exp_id] = original
+                current_data.experiment_index.refresh_experiment(exp_id)
+                current_data.search_index.add('experiment', exp_id, original['name'])
+                change_feed.record('experiment', 'upsert', exp_id)
+        
+        for item in created_items:
+            current_data.search_index.remove('item', item['id'])
+            change_feed.record('item', 'delete', item['id'])
+        for item_id in self.items:
+            item = current_data.catalog.get_item(item_id)
+            current_data.experiment_index.item_changed(item_id)
+            current_data.search_index.add('item', item_id, item['name'], item.get('unit', ''))
+            change_feed.record('item', 'upsert', item_id)
+
+class RejectedEdit(Exception):
+    """A batch edit that failed validation after earlier edits were applied"""
+
+    def __init__(self, message, index, status=400):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+
+def experiment_item_response(item, exp_item):
+    """Full item details as returned by the item routes"""
+    return {
+        'id': item['id'],
+        'name': item['name'],
+        'quantity': exp_item['quantity'],
+        'unit': item['unit'],
+        'price': item['price_per_unit'],
+        'category': item.get('category', 'consumable')
+    }
+
+def project_experiment(exp_data, fields=None):
+    """Build only the requested response fields; items are joined only when asked for"""
+    if fields is None or 'items' in fields:
+        result = build_experiment_response(exp_data)
+    else:
+        result = {
+            'id': exp_data['id'],
+            'name': exp_data['name'],
+            'trials': exp_data.get('trials', 1),
+            'category': get_category_by_id(exp_data.get('category', '')) if 'category' in fields else None,
+            'category_id': exp_data.get('category', ''),
+            'grade': exp_data.get('grade', []),
+            'items_count': len(exp_data.get('items', []))
+        }
+    if fields is None:
+        return result
+    return {field: result[field] for field in fields if field in result}
+
 def check_subject_access(username, requested_subject):
     """Check if user can access the requested subject"""
     users = load_users()
@@ -160,12 +700,18 @@ def check_subject_access(username, requested_subject):
 
 # ==================== ROUTES ====================
 
-@app.route('/')
+@api.route('/')
 def index():
     return render_template('index.html')
 
 # ==================== AUTH ROUTES ===================
-@app.route('/api/login', methods=['POST'])
+
+suggestion_limiter = RateLimiter(
+    int(os.environ.get('LOGIN_SUGGEST_PER_MINUTE', 30)),
+    int(os.environ.get('LOGIN_SUGGEST_BURST', 10))
+)
+
+@api.route('/api/login', methods=['POST'])
 def login():
     """Validate login and return user's subject"""
     try:
@@ -182,18 +728,17 @@ def login():
         
         # ✅ CHECK 1: Does username exist?
         if username not in users:
-            # Find similar usernames (case-insensitive, partial match)
-            similar_users = []
-            username_lower = username.lower()
+            # Suggestions reveal account names, so unauthenticated callers are throttled
+            if not suggestion_limiter.allow(request.remote_addr):
+                response = jsonify({
+                    'error': 'Too many login attempts. Please wait and try again.',
+                    'error_type': 'rate_limited'
+                })
+                response.headers['Retry-After'] = str(suggestion_limiter.retry_after())
+                return response, 429
             
-            for existing_user in users.keys():
-                existing_lower = existing_user.lower()
-                # Check if input is substring of existing username
-                if username_lower in existing_lower or existing_lower in username_lower:
-                    similar_users.append(existing_user)
-                # Check if they share common characters (more than 50%)
-                elif len(set(username_lower) & set(existing_lower)) >= len(username_lower) * 0.5:
-                    similar_users.append(existing_user)
+            # Find similar usernames through the trigram index
+            similar_users = user_store.suggest(username, k=3)
             
             error_msg = f'Username "{username}" not found'
             if similar_users:
@@ -206,7 +751,7 @@ def login():
             }), 401
         
         # ✅ CHECK 2: Is password correct?
-        if not check_password_hash(users[username]["password"], password):
+        if not verify_password(users[username]["password"], password):
             return jsonify({
                 'error': 'Incorrect password',
                 'error_type': 'wrong_password',
@@ -251,7 +796,7 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 @login_required
 def logout():
     """Clear session and logout"""
@@ -259,8 +804,9 @@ def logout():
     return jsonify({'message': 'Logged out successfully'}), 200
 
 
-@app.route('/api/create-account', methods=['POST'])
+@api.route('/api/create-account', methods=['POST'])
 @admin_required 
+@write_locked
 def create_account():
     """Create a new user account (admin only)"""
     try:
@@ -274,9 +820,9 @@ def create_account():
         if not all([admin_username, admin_password, new_username, new_password, subject]):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        users = load_users()
+        users = load_users(for_update=True)
         
-        if not check_password_hash(users[admin_username]["password"], admin_password):
+        if not verify_password(users[admin_username]["password"], admin_password):
             return jsonify({'error': 'Unauthorized: Invalid admin credentials'}), 403
         
         # Check if user is actually admin
@@ -303,7 +849,7 @@ def create_account():
         
         # Create new user
         users[new_username] = {
-            'password': generate_password_hash(new_password),
+            'password': hash_password(new_password),
             'subject': subject
         }
         save_users(users)
@@ -316,8 +862,9 @@ def create_account():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
-@app.route('/api/change-password', methods=['POST'])
+@api.route('/api/change-password', methods=['POST'])
 @login_required
+@write_locked
 def change_password():
     """Change user password"""
     try:
@@ -329,10 +876,10 @@ def change_password():
         if not username or not current_password or not new_password:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        users = load_users()
+        users = load_users(for_update=True)
 
         # Verify current password
-        if username not in users or not check_password_hash(users[username]["password"], current_password):
+        if username not in users or not verify_password(users[username]["password"], current_password):
             return jsonify({'error': 'Invalid username or current password'}), 401
 
         # Validate new password (minimum 6 characters)
@@ -340,7 +887,7 @@ def change_password():
             return jsonify({'error': 'New password must be at least 6 characters'}), 400
         
         # Update password
-        users[username]["password"] = generate_password_hash(new_password)
+        users[username]["password"] = hash_password(new_password)
         save_users(users)
         
         return jsonify({'message': 'Password changed successfully'}), 200
@@ -348,8 +895,9 @@ def change_password():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/change-username', methods=['POST'])
+@api.route('/api/change-username', methods=['POST'])
 @login_required
+@write_locked
 def change_username():
     """Change username"""
     try:
@@ -361,9 +909,9 @@ def change_username():
         if not current_username or not password or not new_username:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        users = load_users()
+        users = load_users(for_update=True)
         # Verify current username and password
-        if current_username not in users or not check_password_hash(users[current_username]["password"], password):
+        if current_username not in users or not verify_password(users[current_username]["password"], password):
             return jsonify({'error': 'Invalid username or password'}), 401
 
         
@@ -387,7 +935,7 @@ def change_username():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/user-profile', methods=['GET'])
+@api.route('/api/user-profile', methods=['GET'])
 @login_required
 def get_user_profile():
     """Get current user profile info"""
@@ -402,15 +950,64 @@ def get_user_profile():
     
 # ==================== API ROUTES ====================
 
-@app.route('/api/items', methods=['GET'])
+@api.route('/api/items', methods=['GET'])
 @login_required
 def get_all_items():
     """Get all items"""
-    return jsonify(items_data)
+    return jsonify(current_data.items_data)
+
+SEARCH_TYPES = ('item', 'experiment', 'category')
+
+def search_result(kind, doc_id):
+    """Resolve a search index key to a small result record, or None if it has gone"""
+    if kind == 'item':
+        item = current_data.catalog.get_item(doc_id)
+        if item:
+            return dict(item, type='item')
+    elif kind == 'experiment':
+        exp = current_data.experiments_db.get(doc_id)
+        if exp:
+            return {
+                'type': 'experiment',
+                'id': exp['id'],
+                'name': exp['name'],
+                'category': get_category_by_id(exp.get('category', '')),
+                'grade': exp.get('grade', [])
+            }
+    elif kind == 'category':
+        cat = current_data.catalog.get_category(doc_id)
+        if cat:
+            return dict(cat, type='category')
+    return None
+
+@api.route('/api/search', methods=['GET'])
+@login_required
+def search():
+    """Typeahead search over item names / formulas / units, experiments and categories
+
+    Query parameters: q, types (comma-separated: item,experiment,category), limit.
+    Every word of q must match the start of a word in the result.
+    """
+    query = request.args.get('q', '')
+    kinds = None
+    if request.args.get('types'):
+        kinds = {kind.strip() for kind in request.args['types'].split(',') if kind.strip()}
+        unknown = kinds - set(SEARCH_TYPES)
+        if unknown:
+            return jsonify({'error': f'Unknown search type: {", ".join(sorted(unknown))}'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    keys, total = current_data.search_index.search(query, kinds, limit)
+    results = [result for result in (search_result(kind, doc_id) for kind, doc_id in keys) if result]
+    return jsonify({'query': query, 'results': results, 'total': total})
 
 # Replace the create_category route
-@app.route('/api/categories', methods=['POST'])
+@api.route('/api/categories', methods=['POST'])
 @login_required
+@write_locked
 def create_category():
     """Create a new category"""
     try:
@@ -423,19 +1020,11 @@ def create_category():
             return jsonify({'error': 'Missing subject'}), 400
         
         # Check if category already exists in this subject
-        for cat in categories_data['categories']:
-            if cat['name'].lower() == data['name'].lower() and cat['subject'] == data['subject']:
-                return jsonify({'error': 'Category already exists in this subject'}), 400
+        if current_data.catalog.find_category(data['subject'], data['name']):
+            return jsonify({'error': 'Category already exists in this subject'}), 400
         
         # Generate new ID
-        max_num = 0
-        for cat in categories_data['categories']:
-            try:
-                num = int(cat['id'].replace('CAT', ''))
-                max_num = max(max_num, num)
-            except:
-                pass
-        new_id = f"CAT{max_num + 1:04d}"
+        new_id = current_data.catalog.next_category_id()
         
         new_category = {
             'id': new_id,
@@ -443,25 +1032,75 @@ def create_category():
             'name': data['name']
         }
         
-        categories_data['categories'].append(new_category)
-        save_json_file(CATEGORIES_FILE, categories_data)
+        current_data.catalog.add_category(new_category)
+        category_changed(new_category)
         
         return jsonify(new_category), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 
-@app.route('/api/experiments', methods=['GET'])
+MAX_PAGE_SIZE = 500
+
+@api.route('/api/experiments', methods=['GET'])
 @login_required
 def get_all_experiments():
-    """Get all experiments with full details"""
-    result = []
-    for exp_id, exp_data in experiments_db.items():
-        result.append(build_experiment_response(exp_data))
-    return jsonify(result)
+    """Get all experiments with full details
+
+    Optional query parameters switch to a filtered, paginated listing:
+    subject, category_id, grade, name (prefix), cursor, limit and
+    fields (comma-separated projection, e.g. fields=id,name).
+    """
+    listing_params = ('subject', 'category_id', 'grade', 'name', 'cursor', 'limit', 'fields')
+    if not any(param in request.args for param in listing_params):
+        result = []
+        for exp_id, exp_data in current_data.experiments_db.items():
+            result.append(build_experiment_response(exp_data))
+        return jsonify(result)
+
+    try:
+        category_ids = None
+        if request.args.get('subject'):
+            category_ids = set(current_data.catalog.category_ids_for_subject(request.args['subject']))
+        if request.args.get('category_id'):
+            requested = {request.args['category_id']}
+            category_ids = requested if category_ids is None else category_ids & requested
+
+        grade = request.args.get('grade')
+        cursor = int(request.args.get('cursor') or 0)
+        limit = request.args.get('limit')
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE)) if limit else None
+    except ValueError:
+        return jsonify({'error': 'cursor and limit must be integers'}), 400
+
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+
+    page, next_cursor, total = current_data.experiment_index.query(
+        category_ids=category_ids,
+        grade=grade or None,
+        name_prefix=request.args.get('name'),
+        after=cursor,
+        limit=limit
+    )
+
+    experiments_db = current_data.experiments_db
+    return jsonify({
+        'experiments': [project_experiment(experiments_db[exp_id], fields) for exp_id in page],
+        'next_cursor': str(next_cursor) if next_cursor is not None else None,
+        'total': total
+    })
+
+@api.route('/api/experiments/summary', methods=['GET'])
+@login_required
+def get_experiment_summaries():
+    """Get precomputed cost totals for every experiment (no item details)"""
+    return jsonify(current_data.experiment_index.summaries())
 
-@app.route('/api/experiments', methods=['POST'])
+@api.route('/api/experiments', methods=['POST'])
 @login_required
+@write_locked
 def create_experiment():
     """Create a new experiment"""
     try:
@@ -470,96 +1109,137 @@ def create_experiment():
         if not data or 'name' not in data:
             return jsonify({'error': 'Missing experiment name'}), 400
         
-        # Generate new ID
-        max_num = 0
-        for exp_id in experiments_db.keys():
-            try:
-                num = int(exp_id.replace('EXP', ''))
-                max_num = max(max_num, num)
-            except:
-                pass
-        new_id = f"EXP{max_num + 1:03d}"
-        
-        # Find category ID from name
-        category_name = data.get('category', 'Molecular Biology')
-        category_id = get_category_id_by_name(category_name)
-        
-        new_experiment = {
-            'id': new_id,
-            'name': data.get('name', 'New Experiment'),
-            'category': category_id,
-            'trials': max(1, int(data.get('trials', 1))),
-            'grade': data.get('grade', []),
-            'items': []
-        }
-        
-        experiments_db[new_id] = new_experiment
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
+        new_experiment = add_new_experiment(data)
+        experiment_changed(new_experiment)
         
         return jsonify(build_experiment_response(new_experiment)), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/experiments/<exp_id>', methods=['GET'])
+@api.route('/api/experiments/<exp_id>', methods=['GET'])
 @login_required
 def get_experiment(exp_id):
     """Get a specific experiment"""
-    if exp_id not in experiments_db:
+    if exp_id not in current_data.experiments_db:
         return jsonify({'error': 'Experiment not found'}), 404
-    return jsonify(build_experiment_response(experiments_db[exp_id]))
+    return jsonify(build_experiment_response(current_data.experiments_db[exp_id]))
 
-@app.route('/api/experiments/<exp_id>', methods=['PUT'])
+@api.route('/api/experiments/<exp_id>', methods=['PUT'])
 @login_required
+@write_locked
 def update_experiment(exp_id):
     """Update experiment"""
     try:
-        if exp_id not in experiments_db:
+        if exp_id not in current_data.experiments_db:
             return jsonify({'error': 'Experiment not found'}), 404
         
         data = request.get_json()
+        apply_experiment_fields(current_data.experiments_db[exp_id], data)
         
-        if 'name' in data:
-            experiments_db[exp_id]['name'] = data['name']
+        experiment_changed(current_data.experiments_db[exp_id])
+        return jsonify(build_experiment_response(current_data.experiments_db[exp_id]))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/experiments/<exp_id>', methods=['PATCH'])
+@login_required
+@write_locked
+def patch_experiment(exp_id):
+    """Apply experiment fields and a full item diff atomically, persisting once"""
+    try:
+        if exp_id not in current_data.experiments_db:
+            return jsonify({'error': 'Experiment not found'}), 404
         
-        if 'category' in data:
-            # Convert category name to ID
-            category_name = data['category']
-            category_id = get_category_id_by_name(category_name)
-            experiments_db[exp_id]['category'] = category_id
+        patch = request.get_json()
+        experiment = current_data.experiments_db[exp_id]
+        error = validate_experiment_patch(experiment, patch)
+        if error:
+            return jsonify({'error': error}), 400
         
-        if 'trials' in data:
-            experiments_db[exp_id]['trials'] = max(1, int(data['trials']))
+        undo = ExperimentEditUndo()
+        undo.save(experiment, patch)
+        try:
+            with storage.batch(atomic=True):
+                apply_experiment_patch(experiment, patch)
+        except Exception:
+            undo.restore()
+            raise
         
-        if 'grade' in data:
-            experiments_db[exp_id]['grade'] = data['grade']
+        return jsonify(build_experiment_response(experiment))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/experiments:batch', methods=['POST'])
+@login_required
+@write_locked
+def batch_experiments():
+    """Create or patch several experiments in one request
+
+    Body: {"experiments": [patch, ...]}; a patch with an "id" edits that experiment,
+    one without creates a new experiment. Each patch is validated against the state
+    the patches before it left; if any fails, none of them is kept.
+    """
+    try:
+        data = request.get_json() or {}
+        patches = data.get('experiments') if isinstance(data, dict) else None
+        if not isinstance(patches, list) or not patches:
+            return jsonify({'error': 'No experiments provided'}), 400
         
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
-        return jsonify(build_experiment_response(experiments_db[exp_id]))
+        results = []
+        undo = ExperimentEditUndo()
+        try:
+            with storage.batch(atomic=True):
+                for index, patch in enumerate(patches):
+                    exp_id = patch.get('id') if isinstance(patch, dict) else None
+                    if exp_id is not None and exp_id not in current_data.experiments_db:
+                        raise RejectedEdit(f'Experiment {exp_id} not found', index, 404)
+                    error = validate_experiment_patch(current_data.experiments_db.get(exp_id), patch)
+                    if error:
+                        raise RejectedEdit(error, index)
+                    
+                    if exp_id is None:
+                        experiment = add_new_experiment(patch)
+                        undo.created(experiment)
+                    else:
+                        experiment = current_data.experiments_db[exp_id]
+                    undo.save(experiment, patch)
+                    apply_experiment_patch(experiment, patch)
+                    results.append(build_experiment_response(experiment))
+        except RejectedEdit as e:
+            undo.restore()
+            return jsonify({'error': str(e), 'index': e.index}), e.status
+        except Exception:
+            undo.restore()
+            raise
+        
+        return jsonify({'experiments': results}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/experiments/<exp_id>', methods=['DELETE'])
+@api.route('/api/experiments/<exp_id>', methods=['DELETE'])
 @login_required
+@write_locked
 def delete_experiment(exp_id):
     """Delete an experiment"""
     try:
-        if exp_id not in experiments_db:
+        if exp_id not in current_data.experiments_db:
             return jsonify({'error': 'Experiment not found'}), 404
         
-        del experiments_db[exp_id]
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
+        del current_data.experiments_db[exp_id]
+        experiment_deleted(exp_id)
         return jsonify({'message': 'Experiment deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ==================== ITEM ROUTES ====================
 
-@app.route('/api/experiments/<exp_id>/items', methods=['POST'])
+@api.route('/api/experiments/<exp_id>/items', methods=['POST'])
 @login_required
+@write_locked
 def add_item(exp_id):
     """Add item to experiment"""
     try:
-        if exp_id not in experiments_db:
+        if exp_id not in current_data.experiments_db:
             return jsonify({'error': 'Experiment not found'}), 404
         
         data = request.get_json()
@@ -569,80 +1249,31 @@ def add_item(exp_id):
             return jsonify({'error': 'Item name is required'}), 400
         
         # Check if item already exists in this experiment (by name, case-insensitive)
-        experiment = experiments_db[exp_id]
-        for exp_item in experiment.get('items', []):
-            existing_item = get_item_by_id(exp_item['id'])
-            if existing_item and existing_item['name'].lower() == item_name.lower():
-                return jsonify({'error': f'Item "{item_name}" already exists in this experiment'}), 400
-        
-        # Check if item already exists in items database (by name)
-        item_id = None
-        for item in items_data['items']:
-            if item['name'].lower() == item_name.lower():
-                item_id = item['id']
-                # Update existing item's details
-                item['price_per_unit'] = data.get('price', item['price_per_unit'])
-                item['unit'] = data.get('unit', item['unit'])
-                item['category'] = data.get('category', item.get('category', 'consumable'))
-                save_json_file(ITEMS_FILE, items_data)
-                break
+        experiment = current_data.experiments_db[exp_id]
+        if experiment_has_item_named(experiment, item_name):
+            return jsonify({'error': f'Item "{item_name}" already exists in this experiment'}), 400
         
-        # If item doesn't exist, create new item in items database
-        if not item_id:
-            max_num = 0
-            for item in items_data['items']:
-                try:
-                    num = int(item['id'].replace('ITM', ''))
-                    max_num = max(max_num, num)
-                except:
-                    pass
-            item_id = f"ITM{max_num + 1:03d}"
-            
-            new_item = {
-                'id': item_id,
-                'name': item_name,
-                'price_per_unit': data.get('price', 0),
-                'unit': data.get('unit', 'ml'),
-                'category': data.get('category', 'consumable')
-            }
-            
-            items_data['items'].append(new_item)
-            save_json_file(ITEMS_FILE, items_data)
-        
-        # Add item reference to experiment
-        exp_item = {
-            'id': item_id,
-            'quantity': data.get('quantity', 1)
-        }
-        
-        experiments_db[exp_id]['items'].append(exp_item)
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
+        item, exp_item = attach_item(experiment, data)
+        experiment_changed(experiment)
         
         # Return full item details
-        item_details = get_item_by_id(item_id)
-        return jsonify({
-            'id': item_id,
-            'name': item_details['name'],
-            'quantity': exp_item['quantity'],
-            'unit': item_details['unit'],
-            'price': item_details['price_per_unit'],
-            'category': item_details.get('category', 'consumable')
-        }), 201
+        return jsonify(experiment_item_response(item, exp_item)), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
     return jsonify({'message': 'Item added successfully'}), 201
 
 
-@app.route('/api/experiments/<exp_id>/items/<item_id>', methods=['PUT'])
+@api.route('/api/experiments/<exp_id>/items/<item_id>', methods=['PUT'])
 @login_required
+@write_locked
 def update_item(exp_id, item_id):
     """Update an item in experiment"""
     try:
-        if exp_id not in experiments_db:
+        if exp_id not in current_data.experiments_db:
             return jsonify({'error': 'Experiment not found'}), 404
         
-        experiment = experiments_db[exp_id]
+        experiment = current_data.experiments_db[exp_id]
         item_idx = next((i for i, item in enumerate(experiment['items']) if item['id'] == item_id), None)
         
         if item_idx is None:
@@ -650,64 +1281,37 @@ def update_item(exp_id, item_id):
         
         data = request.get_json()
         
-        # Update quantity in experiment
-        if 'quantity' in data:
-            experiment['items'][item_idx]['quantity'] = data['quantity']
-        
-        # Update item details in items database
-        for item in items_data['items']:
-            if item['id'] == item_id:
-                if 'name' in data:
-                    item['name'] = data['name']
-                if 'price' in data:
-                    item['price_per_unit'] = data['price']
-                if 'unit' in data:
-                    item['unit'] = data['unit']
-                if 'category' in data:
-                    item['category'] = data['category']
-
-                save_json_file(ITEMS_FILE, items_data)
-                break
-        
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
-        
+        # Update quantity in experiment and item details in items database
+        item, exp_item = update_attached_item(experiment, item_idx, data)
+        experiment_changed(experiment)
         
         # Return full item details
-        item_details = get_item_by_id(item_id)
-        return jsonify({
-            'id': item_id,
-            'name': item_details['name'],
-            'quantity': experiment['items'][item_idx]['quantity'],
-            'unit': item_details['unit'],
-            'price': item_details['price_per_unit'],
-            'category': item_details.get('category', 'consumable')
-        })
+        return jsonify(experiment_item_response(item, exp_item))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/experiments/<exp_id>/items/<item_id>', methods=['DELETE'])
+@api.route('/api/experiments/<exp_id>/items/<item_id>', methods=['DELETE'])
 @login_required
+@write_locked
 def delete_item(exp_id, item_id):
     """Delete an item from experiment"""
     try:
-        if exp_id not in experiments_db:
+        if exp_id not in current_data.experiments_db:
             return jsonify({'error': 'Experiment not found'}), 404
         
-        experiment = experiments_db[exp_id]
-        original_length = len(experiment['items'])
-        experiment['items'] = [item for item in experiment['items'] if item['id'] != item_id]
-        
-        if len(experiment['items']) == original_length:
+        experiment = current_data.experiments_db[exp_id]
+        if not detach_item(experiment, item_id):
             return jsonify({'error': 'Item not found'}), 404
         
-        save_json_file(EXPERIMENTS_FILE, experiments_db)
+        experiment_changed(experiment)
         return jsonify({'message': 'Item deleted successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/items/<item_id>/price', methods=['PUT'])
+@api.route('/api/items/<item_id>/price', methods=['PUT'])
 @login_required
+@write_locked
 def update_item_price(item_id):
     """Update item price"""
     try:
@@ -725,18 +1329,14 @@ def update_item_price(item_id):
             return jsonify({'error': 'Invalid price value'}), 400
         
         # Find and update item
-        item_found = False
-        for item in items_data['items']:
-            if item['id'] == item_id:
-                old_price = item['price_per_unit']
-                item['price_per_unit'] = new_price
-                item_found = True
-                break
-        
-        if not item_found:
+        item = current_data.catalog.get_item(item_id)
+        if not item:
             return jsonify({'error': 'Item not found'}), 404
         
-        save_json_file(ITEMS_FILE, items_data)
+        old_price = item['price_per_unit']
+        current_data.catalog.update_item(item_id, price_per_unit=new_price)
+        
+        item_changed(item)
         
         return jsonify({
             'message': 'Price updated successfully',
@@ -748,120 +1348,478 @@ def update_item_price(item_id):
         return jsonify({'error': str(e)}), 500
     
 
+# ==================== IMPORT / EXPORT ROUTES ====================
+
+def export_response(header, rows, fmt, basename, sheet_title):
+    """Stream rows as a CSV or XLSX download"""
+    if fmt == 'xlsx':
+        body = bulk_io.stream_xlsx(header, rows, sheet_title)
+    else:
+        body = bulk_io.stream_csv(header, rows)
+    return export_response_body(body, fmt, basename)
+
+def export_response_body(body, fmt, basename):
+    """Wrap a file body (bytes or an iterator of chunks) as a download"""
+    if fmt == 'xlsx':
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        mimetype = 'text/csv'
+    if not isinstance(body, bytes):
+        # Rows are generated while the body streams; keep them on this request's data
+        body = stream_with_context(body)
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{basename}.{fmt}"'
+    return response
+
+@api.route('/api/items/import', methods=['POST'])
+@login_required
+@write_locked
+def import_items():
+    """Bulk upsert catalog items from an uploaded CSV or XLSX file
+
+    Send the file as multipart field "file", or as the raw request body with
+    ?format=csv|xlsx. Columns: id, name, price_per_unit (or price), unit, category.
+    """
+    try:
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        try:
+            fmt = bulk_io.file_format(upload.filename if upload else None, request.args.get('format'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        with storage.batch():
+            report = bulk_io.import_items(bulk_io.read_rows(stream, fmt), current_data.catalog, item_changed)
+        
+        status = 200 if report['rows'] else 400
+        return jsonify(report), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/items/export', methods=['GET'])
+@login_required
+def export_items():
+    """Download the item catalog as CSV or XLSX (?format=csv|xlsx)"""
+    try:
+        fmt = bulk_io.file_format(None, request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Shallow copy so concurrent additions don't change the list mid-stream
+    items = list(current_data.items_data['items'])
+    return export_response(bulk_io.ITEM_COLUMNS, bulk_io.item_rows(items), fmt, 'items', 'Items')
+
+@api.route('/api/experiments/export', methods=['GET'])
+@login_required
+def export_experiments():
+    """Download experiments (one row per experiment item) as CSV or XLSX
+
+    Optional ?subject= limits the export to one subject's categories.
+    """
+    try:
+        fmt = bulk_io.file_format(None, request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('subject'):
+        category_ids = set(current_data.catalog.category_ids_for_subject(request.args['subject']))
+        exp_ids, _, _ = current_data.experiment_index.query(category_ids=category_ids)
+        experiments = [current_data.experiments_db[exp_id] for exp_id in exp_ids]
+    else:
+        experiments = list(current_data.experiments_db.values())
+    
+    rows = bulk_io.experiment_rows(experiments, current_data.catalog.get_item, get_category_by_id)
+    return export_response(bulk_io.EXPERIMENT_COLUMNS, rows, fmt, 'experiments', 'Experiments')
+
+
 # ==================== CALCULATION ROUTES ====================
-@app.route('/api/calculate', methods=['POST'])
+
+calculation_cache = LRUCache(int(os.environ.get('CALC_CACHE_SIZE', 128)))
+report_cache = LRUCache(int(os.environ.get('REPORT_CACHE_SIZE', 16)))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+MAX_SCENARIOS = int(os.environ.get('MAX_SCENARIOS', 500))
+SCENARIO_COLUMNS = ['name', 'total_cost', 'common_cost', 'unique_cost', 'delta', 'delta_percent']
+SCENARIO_OVERLAYS = ('trials', 'price_multipliers', 'category_price_multipliers',
+                     'item_usage_type', 'item_custom_quantity')
+
+def selection_error(selected_exp_ids):
+    """Validate a list of experiment ids; returns an error response or None"""
+    if not selected_exp_ids:
+        return jsonify({'error': 'No experiments selected'}), 400
+    
+    for exp_id in selected_exp_ids:
+        if exp_id not in current_data.experiments_db:
+            return jsonify({'error': f'Experiment {exp_id} not found'}), 404
+    return None
+
+def cached_aggregation(selected_exp_ids, trial_multipliers=None):
+    """Required quantities per item for validated experiment ids, cached until the data changes
+
+    trial_multipliers optionally scales each experiment's trials (class sections).
+    """
+    multipliers_key = tuple(trial_multipliers) if trial_multipliers is not None else None
+    cache_key = (tuple(selected_exp_ids), multipliers_key, data_version)
+    aggregation = calculation_cache.get(cache_key)
+    if aggregation is None:
+        selected_experiments = [current_data.experiments_db[exp_id] for exp_id in selected_exp_ids]
+        with metrics.timer('calculate_aggregate'):
+            aggregation = aggregate(selected_experiments, current_data.catalog.get_item, trial_multipliers)
+        calculation_cache.put(cache_key, aggregation)
+    return aggregation
+
+def run_calculation(selected_exp_ids, item_usage_type, item_custom_quantity):
+    """Cost breakdown for validated experiment ids, as returned by /api/calculate"""
+    # Only the usage-type / custom-quantity overlay below is recomputed on a cache hit
+    aggregation = cached_aggregation(selected_exp_ids)
+    item_map = aggregation.item_map
+    
+    # Categorize items
+    common_items = []
+    unique_items = []
+    total_cost = 0
+    
+    for item_id, item_data in item_map.items():
+        is_multi_exp = len(item_data['experiments']) > 1
+        usage_type = item_usage_type.get(item_id, 'common' if is_multi_exp else 'unique')
+        
+        # Equipment counts once (max across experiments); consumables multiply by trials
+        required_qty = aggregation.required[item_id]
+        
+        if usage_type == 'common' and item_id in item_custom_quantity:
+            total_qty = max(required_qty, float(item_custom_quantity[item_id]))
+        else:
+            total_qty = required_qty
+        
+        item_cost = total_qty * item_data['price']
+        total_cost += item_cost
+        
+        item_result = {
+            'id': item_id,
+            'name': item_data['name'],
+            'price': item_data['price'],
+            'category': item_data['category'],
+            'unit': item_data['unit'],
+            'experiments': item_data['experiments'],
+            'total_quantity': total_qty,
+            'required_quantity': required_qty,
+            'total_cost': item_cost,
+            'usage_type': usage_type
+        }
+        
+        if usage_type == 'common' and is_multi_exp:
+            common_items.append(item_result)
+        else:
+            unique_items.append(item_result)
+    
+    return {
+        'common_items': common_items,
+        'unique_items': unique_items,
+        'total_cost': round(total_cost, 2),
+        'selected_count': len(selected_exp_ids)
+    }
+
+def scenario_error(spec, selected):
+    """Check one /api/calculate/scenarios overlay; returns an error message or None"""
+    if not isinstance(spec, dict):
+        return 'Each scenario must be an object'
+    unknown = set(spec) - set(SCENARIO_OVERLAYS) - {'name'}
+    if unknown:
+        return f"Unknown field '{sorted(unknown)[0]}'"
+    for field in SCENARIO_OVERLAYS:
+        if not isinstance(spec.get(field, {}), dict):
+            return f"'{field}' must be an object"
+    
+    for exp_id, trials in spec.get('trials', {}).items():
+        if exp_id not in selected:
+            return f'Experiment {exp_id} is not in the selection'
+        if not is_number(trials):
+            return 'Trials must be a number'
+    for field in ('price_multipliers', 'category_price_multipliers'):
+        if not all(is_number(factor) and factor >= 0 for factor in spec.get(field, {}).values()):
+            return 'Price multipliers must be non-negative numbers'
+    if not all(usage_type in ('common', 'unique') for usage_type in spec.get('item_usage_type', {}).values()):
+        return "Usage type must be 'common' or 'unique'"
+    if not all(is_number(qty) for qty in spec.get('item_custom_quantity', {}).values()):
+        return 'Custom quantities must be numbers'
+    return None
+
+def build_scenario(spec, index):
+    """Scenario from a validated overlay"""
+    return Scenario(
+        spec.get('name') or f'Scenario {index}',
+        trials={exp_id: max(1, int(trials)) for exp_id, trials in spec.get('trials', {}).items()},
+        price_multipliers=spec.get('price_multipliers'),
+        category_price_multipliers=spec.get('category_price_multipliers'),
+        item_usage_type=spec.get('item_usage_type'),
+        item_custom_quantity=spec.get('item_custom_quantity')
+    )
+
+def is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+def plan_error(data):
+    """Check a /api/calculate/plan body; returns an error message or None"""
+    if not isinstance(data, dict):
+        return 'Request body must be a JSON object'
+    sections = data.get('sections', {})
+    if not isinstance(sections, dict):
+        return "'sections' must be an object"
+    if not all(is_count(count) for count in sections.values()):
+        return 'Section counts must be positive integers'
+    
+    grades = data.get('grades')
+    if grades is not None:
+        if not isinstance(grades, list) or not all(isinstance(grade, (int, str)) for grade in grades):
+            return "'grades' must be a list"
+        planned = {str(grade) for grade in grades}
+        for grade in sections:
+            if str(grade) not in planned:
+                return f'Sections given for grade {grade}, which is not in grades'
+    if not grades and not sections:
+        return 'Select at least one grade'
+    
+    category_ids = data.get('category_ids')
+    if category_ids is not None and (not isinstance(category_ids, list)
+                                     or not all(isinstance(category_id, str) for category_id in category_ids)):
+        return "'category_ids' must be a list"
+    if data.get('subject') is not None and not isinstance(data['subject'], str):
+        return "'subject' must be a string"
+    return None
+
+@api.route('/api/calculate', methods=['POST'])
 @login_required
 def calculate_costs():
     """Calculate costs for selected experiments"""
     try:
         data = request.get_json()
         selected_exp_ids = data.get('experiment_ids', [])
-        item_usage_type = data.get('item_usage_type', {})
-        item_custom_quantity = data.get('item_custom_quantity', {})
         
-        if not selected_exp_ids:
-            return jsonify({'error': 'No experiments selected'}), 400
+        error = selection_error(selected_exp_ids)
+        if error:
+            return error
         
-        # Validate experiment IDs
-        for exp_id in selected_exp_ids:
-            if exp_id not in experiments_db:
-                return jsonify({'error': f'Experiment {exp_id} not found'}), 404
-        
-        selected_experiments = [experiments_db[exp_id] for exp_id in selected_exp_ids]
+        return jsonify(run_calculation(
+            selected_exp_ids,
+            data.get('item_usage_type', {}),
+            data.get('item_custom_quantity', {})
+        ))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500   
+
+
+@api.route('/api/calculate/scenarios', methods=['POST'])
+@login_required
+def calculate_scenarios():
+    """Compare what-if overlays of one selection against its baseline in a single pass
+
+    Body: the /api/calculate fields plus scenarios: [{name, trials,
+    price_multipliers, category_price_multipliers, item_usage_type,
+    item_custom_quantity}]. Returns one row per scenario, baseline first.
+    """
+    try:
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        selected_exp_ids = data.get('experiment_ids', [])
         
-        # Build item map
-        item_map = {}
+        error = selection_error(selected_exp_ids)
+        if error:
+            return error
+        
+        specs = data.get('scenarios')
+        if not isinstance(specs, list) or not specs:
+            return jsonify({'error': 'scenarios must be a non-empty list'}), 400
+        if len(specs) > MAX_SCENARIOS:
+            return jsonify({'error': f'At most {MAX_SCENARIOS} scenarios per request'}), 400
+        
+        scenarios = [Scenario('Baseline')]
+        selected = set(selected_exp_ids)
+        for index, spec in enumerate(specs, 1):
+            error = scenario_error(spec, selected)
+            if error:
+                return jsonify({'error': f'Scenario {index}: {error}'}), 400
+            scenarios.append(build_scenario(spec, index))
+        
+        aggregation = cached_aggregation(selected_exp_ids)
+        with metrics.timer('calculate_scenarios'):
+            costs = evaluate_scenarios(aggregation, selected_exp_ids, scenarios,
+                                       data.get('item_usage_type', {}), data.get('item_custom_quantity', {}))
+        
+        baseline = costs[0][0]
+        rows = []
+        for scenario, (total, common, unique) in zip(scenarios, costs):
+            delta = total - baseline
+            rows.append([
+                scenario.name,
+                round(total, 2),
+                round(common, 2),
+                round(unique, 2),
+                round(delta, 2),
+                round(100 * delta / baseline, 2) if baseline else None
+            ])
         
-        for exp in selected_experiments:
-            exp_name = exp['name']
+        return jsonify({
+            'selected_count': len(selected_exp_ids),
+            'item_count': len(aggregation.item_ids),
+            'columns': SCENARIO_COLUMNS,
+            'rows': rows
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/calculate/plan', methods=['POST'])
+@login_required
+def calculate_plan():
+    """School-year bill of materials: every experiment of the planned grades, run by each class section
+
+    Body: sections ({grade: number of sections}), plus optional grades (list;
+    a grade without a sections entry has one section), category_ids (list)
+    and subject. Consumables scale with trials x sections; equipment is
+    shared by all sections and counted once, as in /api/calculate.
+    """
+    try:
+        data = request.get_json() or {}
+        error = plan_error(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        sections = {str(grade): count for grade, count in data.get('sections', {}).items()}
+        if data.get('grades'):
+            sections = {str(grade): sections.get(str(grade), 1) for grade in data['grades']}
+        
+        category_ids = None
+        if data.get('subject'):
+            category_ids = set(current_data.catalog.category_ids_for_subject(data['subject']))
+        if data.get('category_ids') is not None:
+            requested = set(data['category_ids'])
+            category_ids = requested if category_ids is None else category_ids & requested
+        
+        exp_ids, exp_sections = current_data.experiment_index.sections_plan(sections, category_ids)
+        aggregation = cached_aggregation(exp_ids, exp_sections)
+        
+        experiments = []
+        for exp_id, count in zip(exp_ids, exp_sections):
+            exp = current_data.experiments_db[exp_id]
             trials = exp.get('trials', 1)
-            
-            for exp_item in exp['items']:
-                item_id = exp_item['id']
-                item_details = get_item_by_id(item_id)
-                
-                if not item_details:
-                    continue
-                
-                if item_id not in item_map:
-                    item_map[item_id] = {
-                        'name': item_details['name'],
-                        'price': item_details['price_per_unit'],
-                        'category': item_details.get('category', 'consumable'),
-                        'unit': item_details['unit'],
-                        'experiments': []
-                    }
-                
-                item_map[item_id]['experiments'].append({
-                    'exp_name': exp_name,
-                    'quantity': exp_item['quantity'],
-                    'trials': trials
-                })
-        
-        # Categorize items
-        common_items = []
-        unique_items = []
-        total_cost = 0
+            experiments.append({
+                'id': exp_id,
+                'name': exp['name'],
+                'sections': count,
+                'trials': trials,
+                'total_trials': trials * count
+            })
         
-        for item_id, item_data in item_map.items():
-            is_multi_exp = len(item_data['experiments']) > 1
-            usage_type = item_usage_type.get(item_id, 'common' if is_multi_exp else 'unique')
-            item_category = item_data['category']
-            
-            # Calculate required quantity based on category
-            if item_category == 'non_consumable':
-                # Equipment: count once (max quantity needed across all experiments)
-                required_qty = max(e['quantity'] for e in item_data['experiments'])
+        items = []
+        consumable_cost = 0
+        equipment_cost = 0
+        for item_id, entry_count in zip(aggregation.item_ids, aggregation.entry_counts):
+            item_data = aggregation.items[item_id]
+            quantity = aggregation.required[item_id]
+            item_cost = quantity * item_data['price']
+            if item_data['category'] == 'non_consumable':
+                equipment_cost += item_cost
             else:
-                # Consumable: multiply by trials
-                required_qty = sum(e['quantity'] * e['trials'] for e in item_data['experiments'])
-            
-            if usage_type == 'common' and item_id in item_custom_quantity:
-                total_qty = max(required_qty, float(item_custom_quantity[item_id]))
-            else:
-                total_qty = required_qty
-            
-            item_cost = total_qty * item_data['price']
-            total_cost += item_cost
-            
-            item_result = {
+                consumable_cost += item_cost
+            items.append({
                 'id': item_id,
                 'name': item_data['name'],
-                'price': item_data['price'],
                 'category': item_data['category'],
                 'unit': item_data['unit'],
-                'experiments': item_data['experiments'],
-                'total_quantity': total_qty,
-                'required_quantity': required_qty,
-                'total_cost': item_cost,
-                'usage_type': usage_type
-            }
-            
-            if usage_type == 'common' and is_multi_exp:
-                common_items.append(item_result)
-            else:
-                unique_items.append(item_result)
+                'price': item_data['price'],
+                'quantity': quantity,
+                'total_cost': round(item_cost, 2),
+                'experiment_count': entry_count
+            })
         
         return jsonify({
-            'common_items': common_items,
-            'unique_items': unique_items,
-            'total_cost': round(total_cost, 2),
-            'selected_count': len(selected_experiments)
+            'sections': sections,
+            'experiment_count': len(exp_ids),
+            'experiments': experiments,
+            'items': items,
+            'consumable_cost': round(consumable_cost, 2),
+            'equipment_cost': round(equipment_cost, 2),
+            'total_cost': round(consumable_cost + equipment_cost, 2)
         })
     
     except Exception as e:
-        return jsonify({'error': str(e)}), 500   
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/calculate/export', methods=['GET', 'POST'])
+@login_required
+def export_calculation():
+    """Download the procurement report for a selection (?format=xlsx|csv)
+
+    POST takes the same body as /api/calculate; GET takes
+    ?experiment_ids=EXP001,EXP002 so a report URL can be bookmarked or scheduled.
+    Identical reports are served from report_cache until the data changes.
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+        else:
+            ids = request.args.get('experiment_ids', '')
+            data = {'experiment_ids': [exp_id for exp_id in ids.split(',') if exp_id]}
+        selected_exp_ids = data.get('experiment_ids', [])
+        item_usage_type = data.get('item_usage_type', {})
+        item_custom_quantity = data.get('item_custom_quantity', {})
+        
+        try:
+            fmt = bulk_io.file_format(None, request.args.get('format') or data.get('format') or 'xlsx')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        error = selection_error(selected_exp_ids)
+        if error:
+            return error
+        
+        # The report states the day it was generated, so a cached body is only reused that day
+        today = datetime.now().strftime('%Y-%m-%d')
+        cache_key = (
+            fmt,
+            tuple(selected_exp_ids),
+            tuple(sorted(item_usage_type.items())),
+            tuple(sorted((item_id, str(qty)) for item_id, qty in item_custom_quantity.items())),
+            data_version,
+            today
+        )
+        body = report_cache.get(cache_key)
+        cache_status = 'hit'
+        if body is None:
+            cache_status = 'miss'
+            result = run_calculation(selected_exp_ids, item_usage_type, item_custom_quantity)
+            selected_experiments = [current_data.experiments_db[exp_id] for exp_id in selected_exp_ids]
+            chunks = reports.stream_report(fmt, result, selected_experiments, get_category_by_id, today)
+            body = reports.cache_stream(chunks, lambda report: report_cache.put(cache_key, report),
+                                        REPORT_CACHE_MAX_BYTES)
+        
+        basename = f"lab_procurement_{today}"
+        response = export_response_body(body, fmt, basename)
+        response.headers['X-Report-Cache'] = cache_status
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/calculate/cache-stats', methods=['GET'])
+@login_required
+def get_calculation_cache_stats():
+    """Get hit/miss counters for the calculation cache"""
+    return jsonify(dict(calculation_cache.stats(), data_version=data_version,
+                        reports=report_cache.stats())), 200
 
 # ==================== CATEGORIES ROUTE ====================
 
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
 # @login_required
 def get_categories():
     """Get all categories"""
-    return jsonify(categories_data)
+    return jsonify(current_data.categories_data)
 
 
-@app.route('/api/user-allowed-subject/<username>', methods=['GET'])
+@api.route('/api/user-allowed-subject/<username>', methods=['GET'])
 def get_user_allowed_subject(username):
     """
     Public endpoint: returns allowed subject for a username
@@ -878,12 +1836,283 @@ def get_user_allowed_subject(username):
     }), 200
 
 
+# ==================== CHANGE FEED ROUTES ====================
+
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 3000))
+changes_cache = LRUCache(int(os.environ.get('CHANGES_CACHE_SIZE', 64)))
+
+def change_record(kind, op, doc_id):
+    """One delta, carrying the record as its list endpoint returns it"""
+    data = None
+    if op != 'delete':
+        if kind == 'experiment':
+            experiment = current_data.experiments_db.get(doc_id)
+            data = build_experiment_response(experiment) if experiment is not None else None
+        elif kind == 'item':
+            data = current_data.catalog.get_item(doc_id)
+        elif kind == 'category':
+            data = current_data.catalog.get_category(doc_id)
+        if data is None:
+            op = 'delete'
+    return {'type': kind, 'op': op, 'id': doc_id, 'data': data}
+
+def changes_since(since, epoch=None):
+    """/api/changes payload; clients at the same cursor share one build"""
+    if since is None or coordinator is not None:
+        # Worker processes each keep their own feed, so no cursor holds across them
+        current_epoch, version = change_feed.cursor()
+        return {'epoch': current_epoch, 'version': version, 'reset': since is not None, 'changes': []}
+
+    current_epoch, version, entries = change_feed.since(since, epoch)
+    key = (current_epoch, version, since if entries is not None else None, data_version)
+    payload = changes_cache.get(key)
+    if payload is None:
+        payload = {
+            'epoch': current_epoch,
+            'version': version,
+            'reset': entries is None,
+            'changes': [change_record(kind, op, doc_id) for _, kind, op, doc_id in entries or ()]
+        }
+        changes_cache.put(key, payload)
+    return payload
+
+def change_stream_cursor():
+    """(epoch, version) to stream from: the Last-Event-ID of a reconnect, else ?since=&epoch="""
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id:
+        epoch, _, version = last_event_id.rpartition(':')
+        return epoch or None, int(version)
+    since = request.args.get('since')
+    return request.args.get('epoch') or None, int(since) if since else None
+
+def sse_event(payload):
+    """A changes payload as one server-sent event; its id is the cursor to resume from"""
+    data = serialization.dumps(payload).decode('utf-8')
+    return f"id: {payload['epoch']}:{payload['version']}\nevent: changes\ndata: {data}\n\n"
+
+
+@api.route('/api/changes', methods=['GET'])
+@login_required
+def get_changes():
+    """Changes since a cursor: ?since=<version>&epoch=<epoch>
+
+    Each changed record appears once with its current data (op 'upsert') or
+    op 'delete'. Without since, only the current cursor is returned. reset=true
+    means the cursor can't be served (too old, or from before a reload or
+    restart): refetch the collections and continue from the returned cursor.
+    """
+    try:
+        since = request.args.get('since')
+        since = int(since) if since else None
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    return jsonify(changes_since(since, request.args.get('epoch') or None))
 
-if __name__ == '__main__':
-    serve(
-        app,
-        host="0.0.0.0", 
-        port=5000,
-        threads=4         
 
+@api.route('/api/changes/stream', methods=['GET'])
+@login_required
+def stream_changes():
+    """Server-sent /api/changes payloads
+
+    asgi.py keeps this stream open and pushes each change without holding a
+    thread. A WSGI server would need a thread per open stream, so here every
+    request answers with what is pending and EventSource reconnects after
+    SSE_RETRY_MS (resuming from the last event id).
+    """
+    try:
+        epoch, since = change_stream_cursor()
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    if coordinator is not None:
+        return '', 204  # Tells EventSource to stop reconnecting
+    payload = changes_since(since, epoch)
+    body = f"retry: {SSE_RETRY_MS}\n\n"
+    if since is None or payload['reset'] or payload['changes']:
+        body += sse_event(payload)
+    return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+# ==================== ADMIN ROUTES ====================
+
+@api.route('/api/admin/flush', methods=['POST'])
+@admin_required
+def flush_storage():
+    """Write all pending changes to disk now"""
+    try:
+        return jsonify(storage.flush()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/admin/reload', methods=['POST'])
+@admin_required
+@write_locked
+def reload_from_storage():
+    """Re-read every collection from storage and swap it in atomically"""
+    try:
+        started = time.perf_counter()
+        storage.flush()  # Pending writes would otherwise be lost with the old collections
+        reload_data()
+        return jsonify({
+            'message': 'Data reloaded',
+            'experiments': len(current_data.experiments_db),
+            'items': len(current_data.items_data['items']),
+            'categories': len(current_data.categories_data['categories']),
+            'seconds': round(time.perf_counter() - started, 3)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/admin/persistence', methods=['GET'])
+@admin_required
+def get_persistence_metrics():
+    """Get write-behind flush metrics"""
+    return jsonify(storage.persistence_metrics()), 200
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this worker process
+
+    Set METRICS_TOKEN to require "Authorization: Bearer <token>".
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Authentication required'}), 401
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ==================== APP FACTORY ====================
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider on serialization.dumps / loads (orjson when installed)
+
+    Also serializes the slotted records from records.py. Output stays compact
+    with sorted keys, as with Flask's default settings.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, RECORD_TYPES):
+            return o.to_json()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        return serialization.dumps(obj, sort_keys=self.sort_keys, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = serialization.dumps(obj, sort_keys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+def create_app(config=None):
+    """Build the Flask app; config overrides Flask settings (e.g. SECRET_KEY)
+
+    Cheap to call: the data is loaded by the first request, or by init_data().
+    """
+    flask_app = Flask(__name__)
+    flask_app.json = FastJSONProvider(flask_app)
+    flask_app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY'),  # Use env variable in production
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SECURE=False,  # Set True if using HTTPS
+        SESSION_COOKIE_SAMESITE='Lax',
+        PERMANENT_SESSION_LIFETIME=timedelta(days=30),
+        DEBUG=False
     )
+    flask_app.config.update(config or {})
+    if not flask_app.secret_key:
+        flask_app.secret_key = secrets.token_hex(32)
+
+    flask_app.register_blueprint(api)
+
+    # Registered before the caching hooks so the access log sees final (compressed) responses
+    metrics.init_app(flask_app, access_log=os.environ.get('ACCESS_LOG') == '1')
+
+    # Bodies of these GET endpoints depend only on the data version and the query string
+    http_caching.init_app(
+        flask_app,
+        cache_version,
+        cacheable_paths=['/api/items', '/api/categories', '/api/experiments', '/api/experiments/summary'],
+        public_paths=['/api/categories']
+    )
+    return flask_app
+
+# ==================== SERVER ====================
+
+def run_server(flask_app, **kwargs):
+    """waitress.serve(), keeping hold of the server so its thread pool can be reported"""
+    logging.basicConfig()
+    init_data()  # Before listening, so the first request doesn't pay for it
+    server = create_server(flask_app, **kwargs)
+    metrics.track_waitress(server.task_dispatcher)
+    server.print_listen('Serving on http://{}:{}')
+    server.run()
+
+def serve_workers(flask_app, workers, host="0.0.0.0", port=5000, threads=4):
+    """Pre-fork launcher: N waitress processes sharing one listening socket"""
+    enable_shared_state()
+    init_data()  # Parsed once here; the children share the pages until they write
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            storage.after_fork()
+            coordinator.after_fork()
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(0))
+            run_server(flask_app, sockets=[sock], threads=threads)
+            sys.exit(0)
+        children.append(pid)
+
+    def stop_children(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop_children)
+    signal.signal(signal.SIGINT, stop_children)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Laboratory Experiment Cost Estimator')
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes (more than 1 enables shared-state mode)')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.workers > 1:
+        serve_workers(app, args.workers, host=args.host, port=args.port, threads=args.threads)
+    else:
+        # Turn SIGTERM into a normal exit so pending writes are flushed by atexit
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        run_server(
+            app,
+            host=args.host, 
+            port=args.port,
+            threads=args.threads
+        )
@@ -0,0 +1,310 @@
+"""
+ASGI entry point serving the same app, with reads and writes on separate executors
+
+Run with any ASGI server, e.g.:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Requests to write_locked routes run on a small write executor (they are
+serialized by storage.lock anyway), everything else on the read executor, so a
+burst of saves queues behind the writers instead of occupying every thread.
+Password hashing and verification run in a bounded process pool.
+/api/changes/stream is served here as a coroutine, so idle SSE clients hold
+no thread at all.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from flask import session
+from werkzeug.exceptions import HTTPException
+
+import app as lab_app
+import metrics
+
+READ_THREADS = int(os.environ.get('ASGI_READ_THREADS', 16))
+WRITE_THREADS = int(os.environ.get('ASGI_WRITE_THREADS', 2))
+HASH_PROCESSES = int(os.environ.get('ASGI_HASH_PROCESSES', min(2, os.cpu_count() or 1)))
+BODY_SPOOL_BYTES = 1024 * 1024  # Larger request bodies (e.g. imports) are buffered on disk
+MAX_STREAMS = int(os.environ.get('ASGI_MAX_STREAMS', 1000))
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_PATH = '/api/changes/stream'
+
+read_pending = metrics.REGISTRY.register(metrics.Gauge(
+    'lab_asgi_read_pending', 'Read requests queued or running on the read executor'))
+write_pending = metrics.REGISTRY.register(metrics.Gauge(
+    'lab_asgi_write_pending', 'Write requests queued or running on the write executor'))
+open_streams = metrics.REGISTRY.register(metrics.Gauge(
+    'lab_sse_streams', 'Open /api/changes/stream connections'))
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope"""
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = client[0], str(client[1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    # The body is already read in full (chunked uploads carry no content-length), so
+    # its size is the real length and the stream ends where it does
+    environ['CONTENT_LENGTH'] = str(body.seek(0, 2))
+    environ['wsgi.input_terminated'] = True
+    body.seek(0)
+    return environ
+
+
+class ASGIAdapter:
+    """Runs a Flask (WSGI) app from an ASGI server on two thread pools"""
+
+    def __init__(self, flask_app, read_threads=READ_THREADS, write_threads=WRITE_THREADS):
+        self.flask_app = flask_app
+        self.urls = flask_app.url_map.bind('localhost')
+        self.reads = ThreadPoolExecutor(read_threads, thread_name_prefix='asgi-read')
+        self.writes = ThreadPoolExecutor(write_threads, thread_name_prefix='asgi-write')
+        self.streams = set()  # Wake-up events of the open change streams
+        self.stopping = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        if scope['method'] == 'GET' and scope['path'] == STREAM_PATH:
+            await self.stream_changes(build_environ(scope, BytesIO()), receive, send)
+            return
+
+        body = await self.read_body(receive)
+        environ = build_environ(scope, body)
+        if self.is_write(scope['method'], environ['PATH_INFO']):
+            executor, pending = self.writes, write_pending
+        else:
+            executor, pending = self.reads, read_pending
+
+        pending.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(executor, self.run_wsgi, environ, send, loop)
+        finally:
+            pending.dec()
+            body.close()
+
+    def is_write(self, method, path):
+        """Whether the matched view is write_locked"""
+        try:
+            endpoint, _ = self.urls.match(path, method=method)
+        except HTTPException:
+            return False
+        return getattr(self.flask_app.view_functions.get(endpoint), 'writes', False)
+
+    async def read_body(self, receive):
+        body = SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    def run_wsgi(self, environ, send, loop):
+        """Call the app on an executor thread, relaying its response through the event loop"""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started and started[0] is None:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [(status, headers)]
+
+        def send_messages(*messages):
+            async def send_all():
+                for message in messages:
+                    await send(message)
+            # Blocks this thread until the server has taken the data (backpressure)
+            asyncio.run_coroutine_threadsafe(send_all(), loop).result()
+
+        def with_head(messages):
+            if started and started[0] is not None:
+                status, headers = started[0]
+                started[0] = None  # Marks the head as sent
+                messages.insert(0, {
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]
+                })
+            return messages
+
+        response = self.flask_app(environ, start_response)
+        try:
+            # Hold one chunk back so a single-chunk body goes out in one hop with more_body=False
+            pending = None
+            for chunk in response:
+                if not chunk:
+                    continue
+                if pending is not None:
+                    send_messages(*with_head([{'type': 'http.response.body', 'body': pending, 'more_body': True}]))
+                pending = chunk
+            send_messages(*with_head([{'type': 'http.response.body', 'body': pending or b'', 'more_body': False}]))
+        finally:
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    def open_change_stream(self, environ):
+        """(epoch, version) cursor for an authenticated stream request, or None"""
+        with self.flask_app.request_context(environ):
+            if 'username' not in session:
+                return None
+            return lab_app.change_stream_cursor()
+
+    async def stream_changes(self, environ, receive, send):
+        """Push /api/changes payloads as server-sent events until the client leaves"""
+        loop = asyncio.get_running_loop()
+        try:
+            cursor = await loop.run_in_executor(self.reads, self.open_change_stream, environ)
+        except ValueError:
+            await send_json(send, 400, {'error': 'since must be an integer'})
+            return
+        if cursor is None:
+            await send_json(send, 401, {'error': 'Authentication required'})
+            return
+        if lab_app.coordinator is not None:
+            # Per-process feeds (see changes_since); 204 stops EventSource reconnecting
+            await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        if len(self.streams) >= MAX_STREAMS or self.stopping:
+            await send_json(send, 503, {'error': 'Too many open change streams'})
+            return
+
+        epoch, since = cursor
+        wake = asyncio.Event()
+
+        def on_change():
+            # Called from request threads; a pending wake-up already covers this change
+            if not wake.is_set():
+                loop.call_soon_threadsafe(wake.set)
+
+        lab_app.change_feed.subscribe(on_change)
+        self.streams.add(wake)
+        open_streams.inc()
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                            (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')]
+            })
+            await send_text(send, f"retry: {lab_app.SSE_RETRY_MS}\n\n")
+            while not disconnected.done() and not self.stopping:
+                # Cleared before reading, so a change recorded meanwhile wakes us again
+                wake.clear()
+                payload = await loop.run_in_executor(self.reads, lab_app.changes_since, since, epoch)
+                if since is None or payload['reset'] or payload['changes']:
+                    await send_text(send, lab_app.sse_event(payload))
+                    epoch, since = payload['epoch'], payload['version']
+
+                waiter = asyncio.ensure_future(wake.wait())
+                done, _ = await asyncio.wait({waiter, disconnected}, timeout=STREAM_KEEPALIVE_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done:
+                    await send_text(send, ': keepalive\n\n')
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            lab_app.change_feed.unsubscribe(on_change)
+            self.streams.discard(wake)
+            open_streams.dec()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Open change streams end; EventSource clients reconnect to the next server
+                self.stopping = True
+                for wake in self.streams:
+                    wake.set()
+                await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def shutdown(self):
+        """Let queued requests finish; pending storage writes are flushed at exit"""
+        self.writes.shutdown(wait=True)
+        self.reads.shutdown(wait=True)
+        if lab_app.password_pool is not None:
+            lab_app.password_pool.shutdown(wait=True)
+            lab_app.password_pool = None
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_text(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+async def send_json(send, status, data):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+
+def create_application():
+    if HASH_PROCESSES > 0:
+        # spawn, not fork: the parent already runs the write-behind thread
+        lab_app.password_pool = ProcessPoolExecutor(HASH_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+    flask_app = lab_app.create_app()
+    lab_app.init_data()  # Before serving, so the first request doesn't pay for it
+    return ASGIAdapter(flask_app)
+
+
+application = create_application()
@@ -0,0 +1,3 @@
+"""
+Benchmarks, synthetic data generator and load driver (run the modules as scripts)
+"""
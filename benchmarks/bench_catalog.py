@@ -0,0 +1,97 @@
+"""
+Microbenchmark: /api/experiments and /api/calculate latency vs catalog size
+
+Run from the repository root:
+    python benchmarks/bench_catalog.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as lab_app
+
+CATALOG_SIZES = [1000, 10000, 100000]
+EXPERIMENTS = 200
+ITEMS_PER_EXPERIMENT = 20
+DISTINCT_ITEMS = 100
+REPEAT = 5
+
+
+def build_dataset(catalog_size):
+    items = [
+        {
+            'id': f"ITM{i:06d}",
+            'name': f"Reagent {i}",
+            'price_per_unit': 1.0 + (i % 97),
+            'unit': 'g',
+            'category': 'non_consumable' if i % 5 == 0 else 'consumable'
+        }
+        for i in range(1, catalog_size + 1)
+    ]
+    # Fixed set of referenced items spread across the whole catalog, so response
+    # size stays constant and only lookup cost varies with catalog size
+    stride = catalog_size // DISTINCT_ITEMS
+    referenced = [items[i * stride]['id'] for i in range(DISTINCT_ITEMS)]
+    experiments = {}
+    for e in range(1, EXPERIMENTS + 1):
+        exp_id = f"EXP{e:04d}"
+        experiments[exp_id] = {
+            'id': exp_id,
+            'name': f"Experiment {e}",
+            'trials': 1 + e % 3,
+            'category': 'CAT0001',
+            'grade': [6 + e % 7],
+            'items': [
+                {'id': referenced[(e + k * 7) % DISTINCT_ITEMS], 'quantity': 1 + k % 4}
+                for k in range(ITEMS_PER_EXPERIMENT)
+            ]
+        }
+    categories = [{'id': 'CAT0001', 'subject': 'Chemistry', 'name': 'Bench'}]
+    return experiments, items, categories
+
+
+def install_dataset(experiments, items, categories):
+    lab_app.init_data()
+    lab_app.dataset.experiments_db.clear()
+    lab_app.dataset.experiments_db.update(experiments)
+    lab_app.dataset.items_data['items'] = items
+    lab_app.dataset.categories_data['categories'] = categories
+    lab_app.dataset.catalog.reset(lab_app.dataset.items_data, lab_app.dataset.categories_data)
+
+
+def timed(fn):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    client = lab_app.create_app().test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = 'bench'
+
+    print(f"{'catalog':>10} {'list (ms)':>12} {'calculate (ms)':>16}")
+    for size in CATALOG_SIZES:
+        experiments, items, categories = build_dataset(size)
+        install_dataset(experiments, items, categories)
+        exp_ids = list(experiments.keys())
+
+        def list_experiments():
+            resp = client.get('/api/experiments')
+            assert resp.status_code == 200
+
+        def calculate():
+            resp = client.post('/api/calculate', json={'experiment_ids': exp_ids})
+            assert resp.status_code == 200
+
+        print(f"{size:>10} {timed(list_experiments):>12.2f} {timed(calculate):>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
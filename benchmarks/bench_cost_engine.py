@@ -0,0 +1,77 @@
+"""
+Benchmark: vectorized cost engine vs the original nested loops
+
+Run from the repository root:
+    python benchmarks/bench_cost_engine.py
+
+"vectorized" is aggregate() alone (required quantities, which is all
+/api/calculate/scenarios and /api/calculate/plan use). "+ breakdown" also reads
+item_map, which builds the per-entry experiment breakdown /api/calculate
+returns. Parity is covered by tests/test_cost_engine.py.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cost_engine import aggregate, aggregate_reference
+
+SELECTIONS = [(10, 50), (100, 100), (300, 200), (500, 300)]  # (experiments, items per experiment)
+CATALOG_SIZE = 20000
+REPEAT = 3
+
+
+def build_dataset(n_experiments, items_per_experiment, seed=7):
+    rng = random.Random(seed)
+    items = {
+        f"ITM{i:06d}": {
+            'id': f"ITM{i:06d}",
+            'name': f"Reagent {i}",
+            'price_per_unit': rng.choice([2, 0.2, 1.66667, 7.5, 4500]),
+            'unit': rng.choice(['g', 'ml', 'pcs']),
+            'category': 'non_consumable' if i % 4 == 0 else 'consumable'
+        }
+        for i in range(1, CATALOG_SIZE + 1)
+    }
+    item_ids = list(items)
+    experiments = []
+    for e in range(n_experiments):
+        exp_items = [
+            # Mix ints and floats so JSON number types are exercised too
+            {'id': rng.choice(item_ids[:2000]), 'quantity': rng.choice([1, 2, 4, 0.5, 1.5, 12.25, 30])}
+            for _ in range(items_per_experiment)
+        ]
+        exp_items.append({'id': 'ITM_MISSING', 'quantity': 1})
+        experiments.append({
+            'id': f"EXP{e:05d}",
+            'name': f"Experiment {e}",
+            'trials': rng.choice([1, 2, 3, 5]),
+            'items': exp_items
+        })
+    return experiments, items
+
+
+def timed(fn):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    print(f"{'selection':>12} {'reference (ms)':>16} {'vectorized (ms)':>17} {'+ breakdown (ms)':>17}")
+    for n_experiments, per_experiment in SELECTIONS:
+        experiments, items = build_dataset(n_experiments, per_experiment)
+        reference = timed(lambda: aggregate_reference(experiments, items.get))
+        vectorized = timed(lambda: aggregate(experiments, items.get))
+        with_breakdown = timed(lambda: aggregate(experiments, items.get).item_map)
+        print(f"{n_experiments:>5}x{per_experiment:<6} {reference:>16.2f} {vectorized:>17.2f} {with_breakdown:>17.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Microbenchmark: login throughput vs password-hash cost, and cached user lookups
+
+Run from the repository root:
+    python benchmarks/bench_login.py
+
+Works in a scratch directory, so the real users.json is never touched.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+os.chdir(tempfile.mkdtemp(prefix='bench_login_'))
+
+from werkzeug.security import generate_password_hash
+
+import app as lab_app
+
+flask_app = lab_app.create_app()
+
+HASH_METHODS = [None, 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000', 'pbkdf2:sha256:10000']
+LOGINS = 20
+THREADS = 4
+USERS = 2000
+LOOKUPS = 2000
+
+
+def install_users(method):
+    password_hash = generate_password_hash('secret1', method=method) if method else generate_password_hash('secret1')
+    users = {f"user{i:05d}": {'password': password_hash, 'subject': 'Chemistry'} for i in range(USERS)}
+    users['bench'] = {'password': password_hash, 'subject': 'All'}
+    lab_app.save_users(users)
+
+
+def login_rate(threads):
+    def login(_):
+        client = flask_app.test_client()
+        resp = client.post('/api/login', json={'username': 'bench', 'password': 'secret1'})
+        assert resp.status_code == 200, resp.data
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(login, range(LOGINS)))
+    return LOGINS / (time.perf_counter() - start)
+
+
+def lookup_rate(get_users):
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        get_users()[f"user{i % USERS:05d}"]['subject']
+    return LOOKUPS / (time.perf_counter() - start)
+
+
+def main():
+    print(f"{'hash method':>24} {'logins/s (1 thread)':>20} {f'logins/s ({THREADS} threads)':>20}")
+    for method in HASH_METHODS:
+        install_users(method)
+        print(f"{method or 'werkzeug default':>24} {login_rate(1):>20.1f} {login_rate(THREADS):>20.1f}")
+
+    print()
+    print(f"user lookups/s with {USERS} users:")
+    print(f"  read users file each time: {lookup_rate(lab_app.storage.load_users):>12.0f}")
+    print(f"  cached user store:         {lookup_rate(lab_app.load_users):>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
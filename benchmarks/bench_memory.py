@@ -0,0 +1,94 @@
+"""
+Memory: collections as parsed JSON dicts vs the slotted records from records.py
+
+Run from the repository root:
+    python benchmarks/bench_memory.py
+
+For each dataset size the generated files are parsed the way load_all_data()
+does; tracemalloc reports what stays allocated with plain dicts and after
+compact_collections(). Conversion time and /api/calculate aggregation time
+over both shapes are reported alongside.
+"""
+
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_data import build_categories, build_experiments, build_items
+from cost_engine import aggregate
+from records import compact_collections
+
+SIZES = [(1000, 10000), (10000, 100000)]  # (experiments, items)
+CATEGORIES = 100
+ITEMS_PER_EXPERIMENT = 20
+SELECTION = 500
+REPEAT = 5
+
+
+def build_files(experiments, items, seed=1):
+    """JSON text of experiments.json / items.json / exp_catagories.json"""
+    rng = random.Random(seed)
+    categories = build_categories(CATEGORIES, rng)
+    item_list = build_items(items, rng)
+    experiment_map = build_experiments(experiments, item_list, categories, ITEMS_PER_EXPERIMENT, rng)
+    return json.dumps(experiment_map), json.dumps({'items': item_list}), json.dumps({'categories': categories})
+
+
+def load(texts, compact):
+    collections = tuple(json.loads(text) for text in texts)
+    if compact:
+        compact_collections(*collections)
+    return collections
+
+
+def retained_bytes(texts, compact):
+    """Bytes still allocated once the collections are loaded (and converted)"""
+    gc.collect()
+    tracemalloc.start()
+    collections = load(texts, compact)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del collections
+    return current, peak
+
+
+def aggregate_ms(experiments, items_data):
+    items_by_id = {item['id']: item for item in items_data['items']}
+    selected = list(experiments.values())[:SELECTION]
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        aggregate(selected, items_by_id.get)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    print(f"{'experiments':>11} {'items':>8} {'dicts (MB)':>11} {'records (MB)':>13} {'saved':>6} "
+          f"{'peak (MB)':>10} {'convert (ms)':>13} {'calc dicts':>11} {'calc records':>13}")
+    for n_experiments, n_items in SIZES:
+        texts = build_files(n_experiments, n_items)
+        plain, _ = retained_bytes(texts, compact=False)
+        compact, peak = retained_bytes(texts, compact=True)
+
+        collections = load(texts, compact=False)
+        plain_calc = aggregate_ms(collections[0], collections[1])
+        start = time.perf_counter()
+        compact_collections(*collections)
+        convert_ms = (time.perf_counter() - start) * 1000
+        compact_calc = aggregate_ms(collections[0], collections[1])
+
+        print(f"{n_experiments:>11} {n_items:>8} {plain / 1e6:>11.1f} {compact / 1e6:>13.1f} "
+              f"{1 - compact / plain:>6.0%} {peak / 1e6:>10.1f} {convert_ms:>13.0f} "
+              f"{plain_calc:>9.1f}ms {compact_calc:>11.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Microbenchmark: N what-if scenarios as N /api/calculate calls vs one /api/calculate/scenarios call
+
+Run from the repository root:
+    python benchmarks/bench_scenarios.py
+
+Every /api/calculate call re-aggregates (as it would after the price or trial
+edit a scenario stands for); the scenarios call aggregates once and evaluates
+all overlays in vectorized blocks.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as lab_app
+from benchmarks.generate_data import build_categories, build_experiments, build_items
+
+EXPERIMENTS = 2000
+ITEMS = 20000
+SELECTION = 200
+SCENARIO_COUNTS = [1, 10, 100]
+REPEAT = 3
+
+
+def install_dataset(rng):
+    categories = build_categories(50, rng)
+    items = build_items(ITEMS, rng)
+    experiments = build_experiments(EXPERIMENTS, items, categories, 20, rng)
+    lab_app.init_data()
+    lab_app.dataset.experiments_db.clear()
+    lab_app.dataset.experiments_db.update(experiments)
+    lab_app.dataset.items_data['items'] = items
+    lab_app.dataset.categories_data['categories'] = categories
+    lab_app.dataset.catalog.reset(lab_app.dataset.items_data, lab_app.dataset.categories_data)
+
+
+def build_scenarios(count, exp_ids, rng):
+    scenarios = []
+    for i in range(count):
+        scenarios.append({
+            'name': f"Inflation {i}",
+            'category_price_multipliers': {'consumable': 1 + i / 100},
+            'trials': {rng.choice(exp_ids): rng.randint(1, 5)}
+        })
+    return scenarios
+
+
+def timed(fn):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    rng = random.Random(1)
+    client = lab_app.create_app().test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = 'bench'
+    install_dataset(rng)
+    exp_ids = rng.sample(sorted(lab_app.dataset.experiments_db), SELECTION)
+
+    print(f"{'scenarios':>10} {'N x calculate (ms)':>19} {'scenarios call (ms)':>20} {'speedup':>8}")
+    for count in SCENARIO_COUNTS:
+        scenarios = build_scenarios(count, exp_ids, rng)
+
+        def separate_calls():
+            for _ in scenarios:
+                lab_app.data_version += 1  # Each edit invalidates the cached aggregation
+                resp = client.post('/api/calculate', json={'experiment_ids': exp_ids})
+                assert resp.status_code == 200
+
+        def one_call():
+            lab_app.data_version += 1
+            resp = client.post('/api/calculate/scenarios', json={'experiment_ids': exp_ids, 'scenarios': scenarios})
+            assert resp.status_code == 200
+
+        separate_ms, batched_ms = timed(separate_calls), timed(one_call)
+        print(f"{count:>10} {separate_ms:>19.1f} {batched_ms:>20.1f} {separate_ms / batched_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
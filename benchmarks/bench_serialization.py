@@ -0,0 +1,97 @@
+"""
+Serialization and cold start: stdlib json vs serialization.dumps/loads, JSON files vs binary snapshots
+
+Run from the repository root:
+    python benchmarks/bench_serialization.py [--experiments 10000 --items 100000]
+
+Works on a generated dataset in a scratch directory. Reports response encoding
+(GET /api/experiments and /api/items bodies), data file writes (the old
+indent=2 dump vs compact JSON) and load_all_data() from JSON or from the
+binary snapshots. "stdlib" rows use json with Flask's default response
+settings; the others use whatever serialization picked (orjson if installed).
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from benchmarks.generate_data import generate
+
+REPEAT = 3
+
+
+def best_ms(fn):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--experiments', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix='bench_serialization_')
+    generate(data_dir, experiments=args.experiments, items=args.items)
+    os.chdir(data_dir)
+
+    import app as lab_app
+    import serialization
+    import storage
+    from records import json_default
+    lab_app.create_app()
+    lab_app.init_data()
+    print(f"{args.experiments} experiments, {args.items} items; encoder: "
+          f"{'orjson' if serialization.orjson is not None else 'stdlib json'}\n")
+
+    def stdlib_response(obj):
+        return json.dumps(obj, separators=(',', ':'), sort_keys=True, default=json_default)
+
+    def fast_response(obj):
+        return serialization.dumps(obj, sort_keys=True)
+
+    experiments_body = [lab_app.build_experiment_response(exp) for exp in lab_app.dataset.experiments_db.values()]
+    print(f"{'encode':<26} {'stdlib (ms)':>12} {'new (ms)':>10} {'speedup':>8}")
+    for label, obj in (('GET /api/experiments', experiments_body), ('GET /api/items', lab_app.dataset.items_data)):
+        old_ms, new_ms = best_ms(lambda: stdlib_response(obj)), best_ms(lambda: fast_response(obj))
+        print(f"{label:<26} {old_ms:>12.1f} {new_ms:>10.1f} {old_ms / new_ms:>7.1f}x")
+
+    print(f"\n{'data file write':<26} {'indent=2 (ms)':>14} {'compact (ms)':>13} {'size (MB)':>16}")
+    for label, obj in (('experiments.json', lab_app.dataset.experiments_db), ('items.json', lab_app.dataset.items_data)):
+        old_text = json.dumps(obj, indent=2, default=json_default)
+        new_text = serialization.dumps(obj)
+        old_ms = best_ms(lambda: json.dumps(obj, indent=2, default=json_default))
+        new_ms = best_ms(lambda: serialization.dumps(obj))
+        sizes = f"{len(old_text.encode('utf-8')) / 1e6:.1f} -> {len(new_text) / 1e6:.1f}"
+        print(f"{label:<26} {old_ms:>14.1f} {new_ms:>13.1f} {sizes:>16}")
+
+    def cold_load(binary_snapshots):
+        lab_app.storage = storage.JSONStorage(binary_snapshots=binary_snapshots)
+        lab_app.load_all_data()
+
+    # Write the binary snapshots once, then time loads from each source
+    cold_load(binary_snapshots=True)
+    fast_json_ms = best_ms(lambda: cold_load(binary_snapshots=False))
+    binary_ms = best_ms(lambda: cold_load(binary_snapshots=True))
+    orjson, serialization.orjson = serialization.orjson, None
+    stdlib_ms = best_ms(lambda: cold_load(binary_snapshots=False))
+    serialization.orjson = orjson
+
+    print(f"\n{'load_all_data from':<26} {'ms':>8}")
+    print(f"{'JSON, stdlib json':<26} {stdlib_ms:>8.0f}")
+    print(f"{'JSON, serialization':<26} {fast_json_ms:>8.0f}")
+    print(f"{'binary snapshots':<26} {binary_ms:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
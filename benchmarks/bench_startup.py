@@ -0,0 +1,70 @@
+"""
+Startup time: import + create_app() vs the first data load and a reload, per dataset size
+
+Run from the repository root:
+    python benchmarks/bench_startup.py
+
+Each measurement runs in a fresh interpreter against a generated dataset in a
+scratch directory. Target: import + create_app() stays under STARTUP_TARGET_SECONDS
+however large the data is; only init_data() (first request or server start) grows with it.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from benchmarks.generate_data import generate
+
+SIZES = [(1000, 10000), (10000, 100000)]  # (experiments, items)
+STARTUP_TARGET_SECONDS = 0.5
+
+
+def measure():
+    """Runs in the child interpreter, inside the dataset directory"""
+    timings = {}
+    start = time.perf_counter()
+    import app as lab_app
+    timings['import'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lab_app.create_app()
+    timings['create_app'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lab_app.init_data()
+    timings['init_data'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lab_app.reload_data()
+    timings['reload_data'] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+
+def main():
+    print(f"{'experiments':>11} {'items':>8} {'import+create_app':>18} {'init_data':>10} {'reload':>8}")
+    ok = True
+    for experiments, items in SIZES:
+        data_dir = tempfile.mkdtemp(prefix='bench_startup_')
+        generate(data_dir, experiments=experiments, items=items)
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--measure'],
+                                         cwd=data_dir, env=dict(os.environ, PYTHONPATH=REPO), text=True)
+        timings = json.loads(output.strip().splitlines()[-1])
+        startup = timings['import'] + timings['create_app']
+        ok = ok and startup < STARTUP_TARGET_SECONDS
+        print(f"{experiments:>11} {items:>8} {startup:>17.2f}s {timings['init_data']:>9.2f}s "
+              f"{timings['reload_data']:>7.2f}s")
+    print(f"\nimport + create_app() target < {STARTUP_TARGET_SECONDS}s: {'met' if ok else 'MISSED'}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    if '--measure' in sys.argv:
+        measure()
+    else:
+        sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Synthetic dataset generator: experiments.json, items.json, exp_catagories.json, users.json
+
+Run from the repository root, e.g.:
+    python benchmarks/generate_data.py --out /tmp/labdata --experiments 10000 --items 100000
+
+The files use the same layout as the shipped sample data, so the app can be
+started in the output directory. users.json holds one admin account
+(BENCH_USER / BENCH_PASSWORD) hashed with a cheap method for load testing.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from werkzeug.security import generate_password_hash
+
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-password'
+SUBJECTS = ['Chemistry', 'Physics', 'Biology']
+SUBSTANCES = ['Sodium Chloride (NaCl)', 'Sodium Carbonate (Na2CO3)', 'Copper Sulfate (CuSO4)',
+              'Potassium Permanganate (KMnO4)', 'Acetic Acid', 'Ethanol', 'Zinc Granules',
+              'Iron Filings', 'Magnesium Ribbon', 'Hydrochloric Acid (HCl)', 'Agar', 'Iodine Solution']
+EQUIPMENT = ['Beaker', 'Test Tube', 'Conical Flask', 'Pipette', 'Burette', 'Petri Dish',
+             'Measuring Cylinder', 'Magnifying Lens', 'Spring Balance', 'Glass Rod', 'Multimeter']
+PACKING = ['Zip Bag', 'Sample Bottle', 'Label Sheet']
+UNITS = {'consumable': ['g', 'ml', 'pcs'], 'non_consumable': ['pcs'], 'packing': ['pcs']}
+TOPICS = ['Electrochemistry', 'Acid-Base', 'Optics', 'Mechanics', 'Genetics', 'Ecology',
+          'Thermodynamics', 'Microbiology', 'Circuits', 'Titration', 'Crystals', 'Plants']
+
+
+def build_categories(count, rng):
+    return [
+        {
+            'id': f"CAT{i:04d}",
+            'subject': SUBJECTS[(i - 1) % len(SUBJECTS)],
+            'name': f"{rng.choice(TOPICS)} {i}"
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def build_items(count, rng):
+    items = []
+    for i in range(1, count + 1):
+        roll = rng.random()
+        if roll < 0.6:
+            category, base = 'consumable', rng.choice(SUBSTANCES)
+        elif roll < 0.95:
+            category, base = 'non_consumable', rng.choice(EQUIPMENT)
+        else:
+            category, base = 'packing', rng.choice(PACKING)
+        items.append({
+            'id': f"ITM{i:03d}",
+            # The index keeps names unique, as the app expects (case-insensitive)
+            'name': f"{base} #{i}",
+            'price_per_unit': round(rng.uniform(0.5, 500), 2),
+            'unit': rng.choice(UNITS[category]),
+            'category': category
+        })
+    return items
+
+
+def build_experiments(count, items, categories, items_per_experiment, rng):
+    # Skewed item popularity so some items are shared by many experiments
+    popular = items[:max(1, len(items) // 100)]
+    experiments = {}
+    for i in range(1, count + 1):
+        exp_id = f"EXP{i:03d}"
+        chosen = {}
+        while len(chosen) < min(items_per_experiment, len(items)):
+            pool = popular if rng.random() < 0.3 else items
+            item = rng.choice(pool)
+            chosen[item['id']] = rng.randint(1, 50)
+        experiments[exp_id] = {
+            'id': exp_id,
+            'name': f"{rng.choice(TOPICS)} Experiment {i}",
+            'trials': rng.randint(1, 5),
+            'category': rng.choice(categories)['id'],
+            'grade': sorted(rng.sample(range(6, 13), rng.randint(1, 3))),
+            'items': [{'id': item_id, 'quantity': qty} for item_id, qty in chosen.items()]
+        }
+    return experiments
+
+
+def generate(out_dir, experiments=1000, items=10000, categories=100, items_per_experiment=20, seed=1):
+    """Write a synthetic dataset into out_dir and return its sizes"""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    category_list = build_categories(categories, rng)
+    item_list = build_items(items, rng)
+    experiment_map = build_experiments(experiments, item_list, category_list, items_per_experiment, rng)
+    users = {BENCH_USER: {'password': generate_password_hash(BENCH_PASSWORD, method='pbkdf2:sha256:1000'),
+                          'subject': 'All'}}
+
+    files = {
+        'experiments.json': experiment_map,
+        'items.json': {'items': item_list},
+        'exp_catagories.json': {'categories': category_list},
+        'users.json': users
+    }
+    for filename, data in files.items():
+        with open(os.path.join(out_dir, filename), 'w') as f:
+            json.dump(data, f)
+
+    return {
+        'experiments': experiments,
+        'items': items,
+        'categories': categories,
+        'items_per_experiment': items_per_experiment,
+        'seed': seed
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic lab dataset')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--experiments', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=100)
+    parser.add_argument('--items-per-experiment', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sizes = generate(args.out, args.experiments, args.items, args.categories,
+                     args.items_per_experiment, args.seed)
+    print(f"Wrote {sizes} to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
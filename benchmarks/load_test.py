@@ -0,0 +1,249 @@
+"""
+Load driver: p50/p99 latency and throughput of the main endpoints under concurrency
+
+Run from the repository root against a generated dataset, in-process:
+    python benchmarks/generate_data.py --out /tmp/labdata --experiments 10000 --items 100000
+    python benchmarks/load_test.py --data /tmp/labdata --concurrency 8 --out results.json
+
+or against a running server (started in a directory holding the dataset):
+    python benchmarks/load_test.py --data /tmp/labdata --url http://localhost:5000
+
+In-process runs work on a copy of --data, so the dataset stays reusable.
+Results are written as JSON; pass --compare old.json to print the change.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from benchmarks.generate_data import BENCH_PASSWORD, BENCH_USER
+
+SCENARIOS = ['list_experiments', 'list_experiments_page', 'calculate', 'add_item', 'update_item_price']
+CALCULATE_SELECTION = 10
+
+
+class Context:
+    """Ids the scenarios pick from, plus a counter for unique item names"""
+
+    def __init__(self, data_dir):
+        with open(os.path.join(data_dir, 'experiments.json')) as f:
+            self.exp_ids = list(json.load(f))
+        with open(os.path.join(data_dir, 'items.json')) as f:
+            self.item_ids = [item['id'] for item in json.load(f)['items']]
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def unique(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+
+def build_request(scenario, ctx, rng):
+    """(method, path, json body) for one request of a scenario"""
+    if scenario == 'list_experiments':
+        return 'GET', '/api/experiments', None
+    if scenario == 'list_experiments_page':
+        return 'GET', '/api/experiments?limit=50&fields=id,name', None
+    if scenario == 'calculate':
+        selection = rng.sample(ctx.exp_ids, min(CALCULATE_SELECTION, len(ctx.exp_ids)))
+        return 'POST', '/api/calculate', {'experiment_ids': selection}
+    if scenario == 'add_item':
+        body = {'name': f"Load item {ctx.unique()}", 'quantity': 2, 'price': 3.5, 'unit': 'pcs'}
+        return 'POST', f"/api/experiments/{rng.choice(ctx.exp_ids)}/items", body
+    if scenario == 'update_item_price':
+        return 'PUT', f"/api/items/{rng.choice(ctx.item_ids)}/price", {'price': round(rng.uniform(1, 100), 2)}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+# ==================== CLIENTS ====================
+
+class TestClientSession:
+    """In-process Flask test client, logged in by writing the session directly"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['username'] = BENCH_USER
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPSession:
+    """urllib client with its own cookie jar, logged in through /api/login"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        status = self.request('POST', '/api/login', {'username': BENCH_USER, 'password': BENCH_PASSWORD})
+        if status != 200:
+            raise RuntimeError(f"Login as {BENCH_USER} failed with HTTP {status}")
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+# ==================== RUNNER ====================
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(scenario, make_session, ctx, requests, concurrency, seed):
+    sessions = [make_session() for _ in range(concurrency)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        session = sessions[index]
+        own, own_errors = [], 0
+        for _ in range(requests // concurrency + (1 if index < requests % concurrency else 0)):
+            method, path, body = build_request(scenario, ctx, rng)
+            start = time.perf_counter()
+            status = session.request(method, path, body)
+            own.append(time.perf_counter() - start)
+            if status >= 400:
+                own_errors += 1
+        with lock:
+            latencies.extend(own)
+            errors += own_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'concurrency': concurrency,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p90_ms': ms(percentile(latencies, 90)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    print(f"\nvs {baseline_path}:")
+    for scenario, current in results.items():
+        old = baseline.get(scenario)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p99_ms', 'throughput_rps'):
+            if old.get(key) and current.get(key) is not None:
+                changes.append(f"{key} {(current[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {scenario:<22} " + ', '.join(changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the lab cost estimator')
+    parser.add_argument('--data', required=True, help='Dataset directory (see generate_data.py)')
+    parser.add_argument('--url', help='Test a running server instead of an in-process test client')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='Write results JSON here')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    ctx = Context(args.data)
+    if args.url:
+        target = args.url
+        make_session = lambda: HTTPSession(args.url)
+    else:
+        # The app reads its data files from the working directory
+        workdir = tempfile.mkdtemp(prefix='lab_load_')
+        for filename in os.listdir(args.data):
+            shutil.copy(os.path.join(args.data, filename), workdir)
+        os.chdir(workdir)
+        import app as lab_app
+        flask_app = lab_app.create_app()
+        load_start = time.perf_counter()
+        lab_app.init_data()
+        print(f"Loaded dataset in {time.perf_counter() - load_start:.2f}s")
+        target = 'test_client'
+        make_session = lambda: TestClientSession(flask_app)
+
+    results = {}
+    print(f"{'scenario':<22} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+        result = run_scenario(scenario, make_session, ctx, args.requests, args.concurrency, args.seed)
+        results[scenario] = result
+        print(f"{scenario:<22} {result['throughput_rps']:>9} {result['p50_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['errors']:>7}")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'target': target,
+            'storage_engine': os.environ.get('STORAGE_ENGINE', 'json'),
+            'dataset': {'experiments': len(ctx.exp_ids), 'items': len(ctx.item_ids)},
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests
+        },
+        'results': results
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
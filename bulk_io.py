@@ -0,0 +1,249 @@
+"""
+Streaming CSV / XLSX import and export for the item catalog and experiments
+
+Rows are read and written one at a time, so a 100k-row catalog never needs
+more than one row (plus openpyxl's write-only temp file) in memory.
+"""
+
+import codecs
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+try:
+    import openpyxl
+except ImportError:  # CSV only
+    openpyxl = None
+
+from records import item_pairs
+
+ITEM_COLUMNS = ['id', 'name', 'price_per_unit', 'unit', 'category']
+EXPERIMENT_COLUMNS = ['experiment_id', 'experiment_name', 'category', 'trials', 'grade',
+                      'item_id', 'item_name', 'quantity', 'unit']
+ITEM_CATEGORIES = ('consumable', 'non_consumable', 'packing')
+# Header aliases accepted on import (spreadsheets tend to say "price")
+COLUMN_ALIASES = {'price': 'price_per_unit', 'item_id': 'id', 'item_name': 'name'}
+MAX_REPORTED_ERRORS = 200
+CHUNK_SIZE = 64 * 1024
+
+
+def file_format(filename, requested=None):
+    """Pick 'csv' or 'xlsx' from an explicit format or the file extension"""
+    fmt = (requested or os.path.splitext(filename or '')[1].lstrip('.') or 'csv').lower()
+    if fmt not in ('csv', 'xlsx'):
+        raise ValueError(f'Unsupported format: {fmt}')
+    if fmt == 'xlsx' and openpyxl is None:
+        raise ValueError('XLSX support needs the openpyxl package')
+    return fmt
+
+
+# ==================== READING ====================
+
+def read_rows(stream, fmt):
+    """Yield (row_number, {column: value}) from an uploaded CSV or XLSX file"""
+    if fmt == 'xlsx':
+        yield from _read_xlsx(stream)
+    else:
+        yield from _read_csv(stream)
+
+
+def _normalize_header(header):
+    names = []
+    for name in header:
+        name = str(name or '').strip().lower().replace(' ', '_')
+        names.append(COLUMN_ALIASES.get(name, name))
+    return names
+
+
+def _read_csv(stream):
+    # utf-8-sig drops the BOM Excel puts in front of CSV exports
+    reader = csv.reader(codecs.getreader('utf-8-sig')(stream))
+    header = _normalize_header(next(reader, []))
+    for row_number, values in enumerate(reader, start=2):
+        if any(value.strip() for value in values):
+            yield row_number, dict(zip(header, values))
+
+
+def _read_xlsx(stream):
+    if not (hasattr(stream, 'seekable') and stream.seekable()):
+        # XLSX is a zip archive, which needs random access; spool it to disk first
+        spooled = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16)
+        shutil.copyfileobj(stream, spooled, CHUNK_SIZE)
+        spooled.seek(0)
+        stream = spooled
+    # read_only mode parses the sheet XML lazily, one row at a time
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalize_header(next(rows, ()))
+        for row_number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield row_number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+# ==================== IMPORT ====================
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _parse_item_row(row):
+    """Validate one row; returns (fields, error)"""
+    fields = {}
+    name = _text(row.get('name'))
+    if name:
+        fields['name'] = name
+
+    price = row.get('price_per_unit')
+    if _text(price):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return None, f'Invalid price value: {price!r}'
+        if price < 0:
+            return None, 'Price cannot be negative'
+        fields['price_per_unit'] = price
+
+    unit = _text(row.get('unit'))
+    if unit:
+        fields['unit'] = unit
+
+    category = _text(row.get('category')).lower()
+    if category:
+        if category not in ITEM_CATEGORIES:
+            return None, f'Invalid category: {category!r}'
+        fields['category'] = category
+    return fields, None
+
+
+def import_items(rows, catalog, on_change):
+    """Upsert item rows into the catalog
+
+    Rows match an existing item by id, then by case-insensitive name (both are
+    catalog index lookups); unmatched rows with a name create a new item.
+    on_change(item) is called for every created or modified item. Returns a
+    report with counts and per-row errors (the first MAX_REPORTED_ERRORS).
+    """
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+
+    def fail(row_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': message})
+
+    for row_number, row in rows:
+        report['rows'] += 1
+        fields, error = _parse_item_row(row)
+        if error:
+            fail(row_number, error)
+            continue
+
+        item_id = _text(row.get('id'))
+        item = catalog.get_item(item_id) if item_id else None
+        if item is None and item_id and 'name' not in fields:
+            fail(row_number, f'Item {item_id} not found')
+            continue
+        if item is None and 'name' in fields:
+            item = catalog.find_item_by_name(fields['name'])
+
+        if item is None:
+            if 'name' not in fields:
+                fail(row_number, 'Item name or id is required')
+                continue
+            item = catalog.add_item({
+                'id': item_id or catalog.next_item_id(),
+                'name': fields['name'],
+                'price_per_unit': fields.get('price_per_unit', 0),
+                'unit': fields.get('unit', 'ml'),
+                'category': fields.get('category', 'consumable')
+            })
+            report['created'] += 1
+            on_change(item)
+            continue
+
+        if 'name' in fields and fields['name'].lower() != item['name'].lower():
+            other = catalog.find_item_by_name(fields['name'])
+            if other is not None and other is not item:
+                fail(row_number, f'Item "{fields["name"]}" already exists as {other["id"]}')
+                continue
+
+        changed = {key: value for key, value in fields.items() if item.get(key) != value}
+        if not changed:
+            report['unchanged'] += 1
+            continue
+        catalog.update_item(item['id'], **changed)
+        report['updated'] += 1
+        on_change(item)
+
+    return report
+
+
+# ==================== EXPORT ====================
+
+def item_rows(items):
+    for item in items:
+        yield [item.get(column, '') for column in ITEM_COLUMNS]
+
+
+def experiment_rows(experiments, get_item, get_category_name):
+    """One row per experiment item; experiments without items get one blank-item row"""
+    for exp in experiments:
+        base = [
+            exp['id'],
+            exp['name'],
+            get_category_name(exp.get('category', '')),
+            exp.get('trials', 1),
+            ','.join(str(g) for g in exp.get('grade', []) or [])
+        ]
+        if not exp.get('items'):
+            yield base + ['', '', '', '']
+            continue
+        for item_id, quantity in item_pairs(exp):
+            item = get_item(item_id) or {}
+            yield base + [item_id, item.get('name', ''), quantity, item.get('unit', '')]
+
+
+def stream_csv(header, rows, batch_rows=500):
+    """Yield CSV text in chunks of batch_rows rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % batch_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_xlsx(header, rows, sheet_title='Sheet1'):
+    """Write rows with openpyxl's write-only (constant-memory) mode and yield the file bytes"""
+    return stream_workbook([(sheet_title, header, rows)])
+
+
+def stream_workbook(sheets):
+    """Yield a multi-sheet workbook ([(title, header, rows), ...]) in chunks"""
+    with tempfile.TemporaryFile() as f:
+        write_xlsx(f, sheets)
+        f.seek(0)
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def write_xlsx(f, sheets):
+    """Write [(title, header, rows), ...] to file object f as one workbook"""
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, header, rows in sheets:
+        sheet = workbook.create_sheet(title=title[:31])
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(f)
@@ -0,0 +1,120 @@
+"""
+Indexed in-memory catalog for items and experiment categories
+"""
+
+from records import compact_item
+
+
+class Catalog:
+    """Dict indexes over items_data / categories_data, kept in sync on every write"""
+
+    def __init__(self, items_data, categories_data):
+        self.reset(items_data, categories_data)
+
+    def reset(self, items_data, categories_data):
+        """Rebuild every index from the raw JSON structures"""
+        self.items_data = items_data
+        self.categories_data = categories_data
+
+        self._items_by_id = {}
+        self._items_by_name = {}
+        self._max_item_num = 0
+        for item in items_data['items']:
+            self._index_item(item)
+
+        self._categories_by_id = {}
+        self._category_id_by_name = {}
+        self._categories_by_subject_name = {}
+        self._category_ids_by_subject = {}
+        self._max_category_num = 0
+        for cat in categories_data['categories']:
+            self._index_category(cat)
+
+    # ==================== ITEMS ====================
+
+    def _index_item(self, item):
+        # First occurrence wins, matching the old linear scans
+        self._items_by_id.setdefault(item['id'], item)
+        self._items_by_name.setdefault(item['name'].lower(), item)
+        self._max_item_num = max(self._max_item_num, _id_number(item['id'], 'ITM'))
+
+    def get_item(self, item_id):
+        """Get item by ID, or None"""
+        return self._items_by_id.get(item_id)
+
+    def find_item_by_name(self, name):
+        """Get item by case-insensitive name, or None"""
+        return self._items_by_name.get(name.lower())
+
+    def next_item_id(self):
+        """Generate the next free item ID"""
+        return f"ITM{self._max_item_num + 1:03d}"
+
+    def add_item(self, item):
+        """Append a new item to the catalog and index it; returns the stored record"""
+        item = compact_item(item)
+        self.items_data['items'].append(item)
+        self._index_item(item)
+        return item
+
+    def update_item(self, item_id, **fields):
+        """Update item fields in place, re-indexing the name if it changed"""
+        item = self._items_by_id.get(item_id)
+        if item is None:
+            return None
+
+        if 'name' in fields and fields['name'] != item['name']:
+            old_key = item['name'].lower()
+            if self._items_by_name.get(old_key) is item:
+                del self._items_by_name[old_key]
+                # Another item may share the old name; let it take over the slot
+                for other in self.items_data['items']:
+                    if other is not item and other['name'].lower() == old_key:
+                        self._items_by_name[old_key] = other
+                        break
+            self._items_by_name.setdefault(fields['name'].lower(), item)
+
+        item.update(fields)
+        return item
+
+    # ==================== CATEGORIES ====================
+
+    def _index_category(self, cat):
+        self._categories_by_id.setdefault(cat['id'], cat)
+        self._category_id_by_name.setdefault(cat['name'], cat['id'])
+        self._categories_by_subject_name.setdefault((cat['subject'], cat['name'].lower()), cat)
+        self._category_ids_by_subject.setdefault(cat['subject'], set()).add(cat['id'])
+        self._max_category_num = max(self._max_category_num, _id_number(cat['id'], 'CAT'))
+
+    def get_category(self, category_id):
+        """Get category by ID, or None"""
+        return self._categories_by_id.get(category_id)
+
+    def get_category_id_by_name(self, name):
+        """Get category ID from exact category name, or ''"""
+        return self._category_id_by_name.get(name, '')
+
+    def find_category(self, subject, name):
+        """Get category by subject and case-insensitive name, or None"""
+        return self._categories_by_subject_name.get((subject, name.lower()))
+
+    def category_ids_for_subject(self, subject):
+        """Get the IDs of every category in a subject"""
+        return self._category_ids_by_subject.get(subject, set())
+
+    def next_category_id(self):
+        """Generate the next free category ID"""
+        return f"CAT{self._max_category_num + 1:04d}"
+
+    def add_category(self, cat):
+        """Append a new category and index it"""
+        self.categories_data['categories'].append(cat)
+        self._index_category(cat)
+        return cat
+
+
+def _id_number(record_id, prefix):
+    try:
+        return int(record_id.replace(prefix, ''))
+    except (ValueError, AttributeError):
+        return 0
@@ -0,0 +1,75 @@
+"""
+Bounded in-process log of data changes behind /api/changes and its SSE stream
+"""
+
+import secrets
+import threading
+from collections import deque
+
+
+class ChangeFeed:
+    """Version-numbered (kind, op, id) changes, oldest first
+
+    Only keys are logged; readers resolve them to the current records, so a
+    burst of edits to one record costs one delta. Versions belong to this
+    process: `epoch` changes whenever the history is dropped (start-up, a
+    wholesale reload), telling clients their cursor no longer applies.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._listeners = set()
+
+    def record(self, kind, op, doc_id):
+        with self._lock:
+            self.version += 1
+            self._entries.append((self.version, kind, op, doc_id))
+        self._notify()
+
+    def reset(self):
+        """Drop the history; every existing cursor now needs a full refetch"""
+        with self._lock:
+            self.epoch = secrets.token_hex(4)
+            self._entries.clear()
+        self._notify()
+
+    def cursor(self):
+        with self._lock:
+            return self.epoch, self.version
+
+    def since(self, version, epoch=None):
+        """(epoch, latest version, [(version, kind, op, id)]) after version, one entry per
+        record (its latest op); the list is None when the cursor can't be served"""
+        with self._lock:
+            oldest = self._entries[0][0] if self._entries else self.version + 1
+            if (epoch is not None and epoch != self.epoch) or version > self.version or version < oldest - 1:
+                return self.epoch, self.version, None
+            latest = {}
+            # Newest first, stopping at the cursor, so the cost follows the delta size
+            for entry in reversed(self._entries):
+                if entry[0] <= version:
+                    break
+                latest.setdefault((entry[1], entry[3]), entry)
+            return self.epoch, self.version, sorted(latest.values())
+
+    def subscribe(self, listener):
+        """Call listener() after every change; it must be quick and thread-safe"""
+        with self._lock:
+            self._listeners.add(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    def listener_count(self):
+        with self._lock:
+            return len(self._listeners)
+
+    def _notify(self):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
@@ -0,0 +1,373 @@
+"""
+Vectorized cost aggregation for /api/calculate
+
+The selection is flattened into parallel arrays (one entry per experiment item):
+experiment row, item column, quantity, plus a trials vector per experiment and
+a price vector / consumable mask per item. Required quantities are computed in
+one pass with np.bincount (consumables: sum of quantity x trials) and
+np.maximum.at (equipment: largest quantity in any experiment). The per-item
+experiment breakdown is only built when a caller reads it.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # Falls back to the pure-Python aggregation
+    np = None
+
+from records import item_columns, item_details
+
+
+class CostAggregation:
+    """Per-item aggregation of a set of experiments
+
+    Required quantities come straight from the entry arrays. The per-item
+    breakdown (item_map[...]['experiments'], one dict per entry) is only built
+    the first time item_map is read, since scenarios and plans never need it.
+    """
+
+    def __init__(self, item_ids, items, entry_counts, required, rows, cols, quantities, trials, prices,
+                 consumable, breakdown_source):
+        self.item_ids = item_ids          # item ids in first-seen order
+        self.items = items                # item id -> name/price/category/unit
+        self.entry_counts = entry_counts  # number of entries per item column
+        self.required = required          # item id -> required quantity (int or float, as before)
+        self.rows = rows                  # experiment row of each entry
+        self.cols = cols                  # item column of each entry
+        self.quantities = quantities      # quantity of each entry
+        self.trials = trials              # trials per experiment row
+        self.prices = prices              # price per item column
+        self.consumable = consumable      # True where the item is not 'non_consumable'
+        self._breakdown_source = breakdown_source
+        self._item_map = None
+
+    @property
+    def item_map(self):
+        """item id -> name/price/category/unit/experiments, as /api/calculate reports it"""
+        if self._item_map is None:
+            self._item_map = _build_item_map(self.item_ids, self.items, self.entry_counts,
+                                             *self._breakdown_source)
+        return self._item_map
+
+
+def aggregate(selected_experiments, get_item, trial_multipliers=None):
+    """Build the item map and required quantities for the selected experiments
+
+    trial_multipliers optionally scales each experiment's trials (e.g. class sections).
+    """
+    item_index = {}  # item id -> column, or -1 if the catalog doesn't have it
+    item_ids = []
+    items = {}
+    names, trials = [], []
+    rows, cols, quantities = [], [], []
+
+    for row, exp in enumerate(selected_experiments):
+        exp_trials = exp.get('trials', 1)
+        if trial_multipliers is not None:
+            exp_trials = exp_trials * trial_multipliers[row]
+        names.append(exp['name'])
+        trials.append(exp_trials)
+
+        # Whole-list operations per experiment; only unseen item ids go through Python code
+        ids, exp_quantities = item_columns(exp)
+        exp_cols = list(map(item_index.get, ids))
+        if None in exp_cols:
+            for k in [k for k, col in enumerate(exp_cols) if col is None]:
+                exp_cols[k] = _add_column(ids[k], item_index, item_ids, items, get_item)
+        if -1 in exp_cols:
+            exp_quantities = exp_quantities[:]  # A record's own list; drop missing items from a copy
+            while -1 in exp_cols:
+                k = exp_cols.index(-1)
+                del exp_cols[k], exp_quantities[k]
+        rows.extend([row] * len(exp_cols))
+        cols.extend(exp_cols)
+        quantities.extend(exp_quantities)
+
+    n_items = len(item_ids)
+    breakdown_source = (rows, cols, quantities, names, trials)
+    if np is None:
+        entry_counts = [0] * n_items
+        for col in cols:
+            entry_counts[col] += 1
+        required = _required_python(item_ids, items, rows, cols, quantities, trials)
+        return CostAggregation(item_ids, items, entry_counts, required, rows, cols, quantities, trials,
+                               None, None, breakdown_source)
+
+    int_quantities = np.asarray([type(q) is int for q in quantities], dtype=bool)
+    int_trials = np.asarray([type(t) is int for t in trials], dtype=bool)
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    prices = np.asarray([items[i]['price'] for i in item_ids], dtype=np.float64)
+    consumable = np.asarray([items[i]['category'] != 'non_consumable' for i in item_ids], dtype=bool)
+
+    # bincount accumulates entries in input order, so float sums match Python's sum()
+    consumable_qty = np.bincount(cols, weights=quantities * trials[rows], minlength=n_items)
+    equipment_qty = np.full(n_items, -np.inf)
+    np.maximum.at(equipment_qty, cols, quantities)
+    required_qty = np.where(consumable, consumable_qty, equipment_qty)
+
+    # Keep JSON number types identical to the Python path: ints stay ints. Consumables
+    # need int quantities and trials; equipment takes the type of the first entry at
+    # the maximum, as max() does
+    exact = int_quantities & int_trials[rows]
+    inexact_count = np.bincount(cols, weights=~exact, minlength=n_items)
+    equipment_int = np.zeros(n_items, dtype=bool)
+    if len(cols):
+        at_max = np.flatnonzero(quantities == equipment_qty[cols])
+        max_cols, first = np.unique(cols[at_max], return_index=True)
+        equipment_int[max_cols] = int_quantities[at_max[first]]
+    is_int = np.where(consumable, inexact_count == 0, equipment_int)
+
+    required = {
+        item_id: int(qty) if as_int else float(qty)
+        for item_id, qty, as_int in zip(item_ids, required_qty.tolist(), is_int.tolist())
+    }
+    entry_counts = np.bincount(cols, minlength=n_items).tolist()
+    return CostAggregation(item_ids, items, entry_counts, required, rows, cols, quantities, trials,
+                           prices, consumable, breakdown_source)
+
+
+def _add_column(item_id, item_index, item_ids, items, get_item):
+    """Column of an item id first seen in this aggregation, or -1 if the catalog doesn't have it"""
+    col = item_index.get(item_id)
+    if col is not None:
+        return col  # Listed twice by the same experiment
+    item = get_item(item_id)
+    if not item:
+        col = -1
+    else:
+        col = len(item_ids)
+        item_ids.append(item_id)
+        name, unit, price, category = item_details(item)
+        items[item_id] = {'name': name, 'price': price, 'category': category, 'unit': unit}
+    item_index[item_id] = col
+    return col
+
+
+def _build_item_map(item_ids, items, entry_counts, rows, cols, quantities, names, trials):
+    """item_map with each item's [{'exp_name', 'quantity', 'trials'}] list, in one pass over the entries"""
+    if np is not None:
+        # Gather in numpy on object arrays, which keep the original Python values and types
+        order = np.argsort(np.asarray(cols, dtype=np.intp), kind='stable')
+        entry_rows = np.asarray(rows, dtype=np.intp)[order]
+        columns = (_objects(names)[entry_rows].tolist(), _objects(quantities)[order].tolist(),
+                   _objects(trials)[entry_rows].tolist())
+    else:
+        order = sorted(range(len(cols)), key=cols.__getitem__)
+        columns = ([names[rows[i]] for i in order], [quantities[i] for i in order],
+                   [trials[rows[i]] for i in order])
+    entries = [{'exp_name': name, 'quantity': quantity, 'trials': exp_trials}
+               for name, quantity, exp_trials in zip(*columns)]
+
+    item_map = {}
+    start = 0
+    for item_id, count in zip(item_ids, entry_counts):
+        item_map[item_id] = dict(items[item_id], experiments=entries[start:start + count])
+        start += count
+    return item_map
+
+
+def _objects(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _required_python(item_ids, items, rows, cols, quantities, trials):
+    """Required quantities without numpy: consumables sum quantity x trials, equipment takes the max"""
+    consumable_qty = {}
+    equipment_qty = {}
+    for row, col, quantity in zip(rows, cols, quantities):
+        consumable_qty[col] = consumable_qty.get(col, 0) + quantity * trials[row]
+        if col not in equipment_qty or quantity > equipment_qty[col]:
+            equipment_qty[col] = quantity
+
+    required = {}
+    for col, item_id in enumerate(item_ids):
+        if items[item_id]['category'] == 'non_consumable':
+            required[item_id] = equipment_qty[col]
+        else:
+            required[item_id] = consumable_qty[col]
+    return required
+
+
+class Scenario:
+    """A what-if overlay on a cost aggregation; every field is optional
+
+    trials: exp id -> trials; price_multipliers: item id -> factor;
+    category_price_multipliers: item category -> factor (applied before the
+    per-item factor); item_usage_type / item_custom_quantity: as in
+    /api/calculate, layered over the request's own.
+    """
+
+    def __init__(self, name, trials=None, price_multipliers=None, category_price_multipliers=None,
+                 item_usage_type=None, item_custom_quantity=None):
+        self.name = name
+        self.trials = trials or {}
+        self.price_multipliers = price_multipliers or {}
+        self.category_price_multipliers = category_price_multipliers or {}
+        self.item_usage_type = item_usage_type or {}
+        self.item_custom_quantity = item_custom_quantity or {}
+
+
+# Cells of one (scenarios x items) block; bounds the memory a scenarios request holds
+SCENARIO_BLOCK_CELLS = 1 << 18
+
+
+def evaluate_scenarios(aggregation, exp_ids, scenarios, item_usage_type, item_custom_quantity):
+    """(total, common, unique) cost per scenario, priced the way /api/calculate prices one
+
+    exp_ids are the aggregated experiments in row order. Consumable quantities
+    are summed once; a scenario's trial overrides only add the entries of the
+    experiments it changes. Scenarios are then priced in blocks of
+    (scenarios x items) matrices, at most SCENARIO_BLOCK_CELLS cells each.
+    """
+    if np is None or aggregation.prices is None:
+        return [_scenario_costs_python(aggregation, exp_ids, scenario, item_usage_type, item_custom_quantity)
+                for scenario in scenarios]
+
+    n_scenarios, n_items = len(scenarios), len(aggregation.item_ids)
+    cols_by_item = {item_id: col for col, item_id in enumerate(aggregation.item_ids)}
+    rows_by_exp = {}
+    for row, exp_id in enumerate(exp_ids):
+        rows_by_exp.setdefault(exp_id, []).append(row)
+
+    # Request-wide usage / custom quantities, shared by every scenario
+    multi_exp = np.asarray(aggregation.entry_counts) > 1
+    base_common = multi_exp.copy()
+    base_custom = np.full(n_items, -np.inf)
+    for item_id, usage_type in item_usage_type.items():
+        if item_id in cols_by_item:
+            base_common[cols_by_item[item_id]] = usage_type == 'common'
+    for item_id, qty in item_custom_quantity.items():
+        if item_id in cols_by_item:
+            base_custom[cols_by_item[item_id]] = float(qty)
+
+    # Shared by every scenario: consumables at the request's trials, and equipment (trials don't matter)
+    rows, cols, quantities = aggregation.rows, aggregation.cols, aggregation.quantities
+    base_consumable = np.bincount(cols, weights=quantities * aggregation.trials[rows], minlength=n_items)
+    equipment_qty = np.full(n_items, -np.inf)
+    np.maximum.at(equipment_qty, cols, quantities)
+    # Entries are laid out experiment by experiment, so row r owns entries row_starts[r]:row_starts[r + 1]
+    row_starts = np.searchsorted(rows, np.arange(len(aggregation.trials) + 1))
+    item_categories = np.asarray([aggregation.items[i]['category'] for i in aggregation.item_ids], dtype=object)
+    category_masks = {}
+
+    results = []
+    block = max(1, SCENARIO_BLOCK_CELLS // max(n_items, 1))
+    for start in range(0, n_scenarios, block):
+        block_scenarios = scenarios[start:start + block]
+        n_block = len(block_scenarios)
+        prices = np.tile(aggregation.prices, (n_block, 1))
+        common = np.tile(base_common, (n_block, 1))
+        custom = np.tile(base_custom, (n_block, 1))
+        override_scenarios, override_rows, override_trials = [], [], []
+
+        for s, scenario in enumerate(block_scenarios):
+            for exp_id, exp_trials in scenario.trials.items():
+                for row in rows_by_exp.get(exp_id, ()):
+                    override_scenarios.append(s)
+                    override_rows.append(row)
+                    override_trials.append(exp_trials)
+            for category, factor in scenario.category_price_multipliers.items():
+                if category not in category_masks:
+                    category_masks[category] = item_categories == category
+                prices[s, category_masks[category]] *= factor
+            for item_id, factor in scenario.price_multipliers.items():
+                if item_id in cols_by_item:
+                    prices[s, cols_by_item[item_id]] *= factor
+            for item_id, usage_type in scenario.item_usage_type.items():
+                if item_id in cols_by_item:
+                    common[s, cols_by_item[item_id]] = usage_type == 'common'
+            for item_id, qty in scenario.item_custom_quantity.items():
+                if item_id in cols_by_item:
+                    custom[s, cols_by_item[item_id]] = float(qty)
+
+        consumable_qty = np.tile(base_consumable, (n_block, 1))
+        if override_rows:
+            # Each override adds (new - old trials) x quantity for its experiment's entries
+            override_rows = np.asarray(override_rows, dtype=np.intp)
+            deltas = np.asarray(override_trials, dtype=float) - aggregation.trials[override_rows]
+            counts = row_starts[override_rows + 1] - row_starts[override_rows]
+            entries = np.repeat(row_starts[override_rows] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            cells = np.repeat(np.asarray(override_scenarios, dtype=np.intp) * n_items, counts) + cols[entries]
+            consumable_qty += np.bincount(cells, weights=np.repeat(deltas, counts) * quantities[entries],
+                                          minlength=n_block * n_items).reshape(n_block, n_items)
+        required = np.where(aggregation.consumable[None, :], consumable_qty, equipment_qty[None, :])
+
+        # Custom quantities only raise common items (as in run_calculation)
+        total_qty = np.where(common, np.maximum(required, custom), required)
+        costs = total_qty * prices
+        common_costs = np.where(common & multi_exp[None, :], costs, 0.0).sum(axis=1)
+        total_costs = costs.sum(axis=1)
+        results.extend(zip(total_costs.tolist(), common_costs.tolist(), (total_costs - common_costs).tolist()))
+    return results
+
+
+def _scenario_costs_python(aggregation, exp_ids, scenario, item_usage_type, item_custom_quantity):
+    trials = [scenario.trials.get(exp_id, exp_trials) for exp_id, exp_trials in zip(exp_ids, aggregation.trials)]
+    consumable_qty = {}
+    equipment_qty = {}
+    for row, col, quantity in zip(aggregation.rows, aggregation.cols, aggregation.quantities):
+        consumable_qty[col] = consumable_qty.get(col, 0) + quantity * trials[row]
+        equipment_qty[col] = max(equipment_qty.get(col, quantity), quantity)
+
+    usage_types = dict(item_usage_type, **scenario.item_usage_type)
+    custom_quantities = dict(item_custom_quantity, **scenario.item_custom_quantity)
+    total = common_total = 0
+    for col, item_id in enumerate(aggregation.item_ids):
+        item_data = aggregation.items[item_id]
+        is_multi_exp = aggregation.entry_counts[col] > 1
+        usage_type = usage_types.get(item_id, 'common' if is_multi_exp else 'unique')
+        if item_data['category'] == 'non_consumable':
+            qty = equipment_qty[col]
+        else:
+            qty = consumable_qty[col]
+        if usage_type == 'common' and item_id in custom_quantities:
+            qty = max(qty, float(custom_quantities[item_id]))
+        price = (item_data['price'] * scenario.category_price_multipliers.get(item_data['category'], 1)
+                 * scenario.price_multipliers.get(item_id, 1))
+        total += qty * price
+        if usage_type == 'common' and is_multi_exp:
+            common_total += qty * price
+    return total, common_total, total - common_total
+
+
+def aggregate_reference(selected_experiments, get_item):
+    """Original nested-loop aggregation, kept for parity checks"""
+    item_map = {}
+
+    for exp in selected_experiments:
+        exp_name = exp['name']
+        trials = exp.get('trials', 1)
+
+        for exp_item in exp['items']:
+            item_id = exp_item['id']
+            item_details = get_item(item_id)
+
+            if not item_details:
+                continue
+
+            if item_id not in item_map:
+                item_map[item_id] = {
+                    'name': item_details['name'],
+                    'price': item_details['price_per_unit'],
+                    'category': item_details.get('category', 'consumable'),
+                    'unit': item_details['unit'],
+                    'experiments': []
+                }
+
+            item_map[item_id]['experiments'].append({
+                'exp_name': exp_name,
+                'quantity': exp_item['quantity'],
+                'trials': trials
+            })
+
+    required = {}
+    for item_id, item_data in item_map.items():
+        if item_data['category'] == 'non_consumable':
+            required[item_id] = max(e['quantity'] for e in item_data['experiments'])
+        else:
+            required[item_id] = sum(e['quantity'] * e['trials'] for e in item_data['experiments'])
+    return item_map, required
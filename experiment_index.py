@@ -0,0 +1,223 @@
+"""
+Incrementally maintained per-experiment cost summaries and listing indexes
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+from records import item_details, item_pairs
+
+
+class ExperimentIndex:
+    """Materialized cost totals per experiment, a reverse index item id -> experiments,
+    and category / grade / name-prefix indexes for server-side listing filters"""
+
+    def __init__(self, experiments, catalog):
+        self.reset(experiments, catalog)
+
+    def reset(self, experiments, catalog):
+        """Rebuild every summary from scratch"""
+        self.experiments = experiments
+        self.catalog = catalog
+        self._summaries = {}
+        self._experiments_by_item = {}
+        self._items_by_experiment = {}
+        # Listing indexes; seq preserves experiments_db order for stable cursors
+        self._seq = {}
+        self._seq_list = []
+        self._id_by_seq = {}
+        self._next_seq = 1
+        self._attributes = {}
+        self._by_category = {}
+        self._by_grade = {}
+        self._names = []
+        for exp_id in experiments:
+            self.refresh_experiment(exp_id)
+
+    def refresh_experiment(self, exp_id):
+        """Recompute one experiment's totals and its reverse-index entries"""
+        exp = self.experiments.get(exp_id)
+        if exp is None:
+            self.remove_experiment(exp_id)
+            return None
+
+        item_ids = {item_id for item_id, _ in item_pairs(exp)}
+        old_item_ids = self._items_by_experiment.get(exp_id, set())
+        for item_id in old_item_ids - item_ids:
+            self._unlink(item_id, exp_id)
+        for item_id in item_ids - old_item_ids:
+            self._experiments_by_item.setdefault(item_id, set()).add(exp_id)
+        self._items_by_experiment[exp_id] = item_ids
+
+        if exp_id not in self._seq:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seq[exp_id] = seq
+            self._seq_list.append(seq)
+            self._id_by_seq[seq] = exp_id
+        self._index_attributes(exp_id, exp)
+
+        self._summaries[exp_id] = self._summarize(exp)
+        return self._summaries[exp_id]
+
+    def remove_experiment(self, exp_id):
+        for item_id in self._items_by_experiment.pop(exp_id, set()):
+            self._unlink(item_id, exp_id)
+        self._summaries.pop(exp_id, None)
+        self._unindex_attributes(exp_id)
+        seq = self._seq.pop(exp_id, None)
+        if seq is not None:
+            del self._seq_list[bisect_left(self._seq_list, seq)]
+            del self._id_by_seq[seq]
+
+    def item_changed(self, item_id):
+        """Refresh only the experiments that reference a changed item"""
+        for exp_id in list(self._experiments_by_item.get(item_id, ())):
+            self._summaries[exp_id] = self._summarize(self.experiments[exp_id])
+
+    def experiments_using(self, item_id):
+        return set(self._experiments_by_item.get(item_id, ()))
+
+    def summary(self, exp_id):
+        return self._summaries.get(exp_id)
+
+    def summaries(self):
+        """All summaries in experiment order"""
+        return [self._summaries[exp_id] for exp_id in self.experiments if exp_id in self._summaries]
+
+    def query(self, category_ids=None, grade=None, name_prefix=None, after=0, limit=None):
+        """Filter experiments through the indexes and return one page
+
+        category_ids is a set (union); every other filter intersects. Returns
+        (exp_ids in experiments_db order, next cursor or None, total matches).
+        """
+        candidate_sets = []
+        if category_ids is not None:
+            matched = set()
+            for category_id in category_ids:
+                matched |= self._by_category.get(category_id, set())
+            candidate_sets.append(matched)
+        if grade is not None:
+            candidate_sets.append(self._by_grade.get(_grade_key(grade), set()))
+        if name_prefix:
+            prefix = name_prefix.lower()
+            start = bisect_left(self._names, (prefix,))
+            end = bisect_left(self._names, (prefix + '\uffff',))
+            candidate_sets.append({exp_id for _, exp_id in self._names[start:end]})
+
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            matched = set(candidate_sets[0]).intersection(*candidate_sets[1:])
+            seqs = sorted(self._seq[exp_id] for exp_id in matched)
+        else:
+            seqs = self._seq_list
+
+        start = bisect_right(seqs, after)
+        end = len(seqs) if limit is None else min(len(seqs), start + limit)
+        page = [self._id_by_seq[seq] for seq in seqs[start:end]]
+        next_cursor = seqs[end - 1] if end < len(seqs) and end > start else None
+        return page, next_cursor, len(seqs)
+
+    def sections_plan(self, sections, category_ids=None):
+        """Resolve a sections-per-grade plan to experiments and the class sections running each
+
+        sections maps grade -> number of sections; category_ids (a set, union)
+        optionally narrows it. An experiment listed under several planned grades
+        is run by the sections of each. Returns (exp_ids in experiments_db
+        order, sections per experiment).
+        """
+        in_categories = None
+        if category_ids is not None:
+            in_categories = set()
+            for category_id in category_ids:
+                in_categories |= self._by_category.get(category_id, set())
+
+        counts = {}
+        for grade, count in sections.items():
+            for exp_id in self._by_grade.get(_grade_key(grade), ()):
+                if in_categories is None or exp_id in in_categories:
+                    counts[exp_id] = counts.get(exp_id, 0) + count
+
+        exp_ids = sorted(counts, key=self._seq.__getitem__)
+        return exp_ids, [counts[exp_id] for exp_id in exp_ids]
+
+    def _index_attributes(self, exp_id, exp):
+        attributes = (
+            exp.get('category', ''),
+            tuple(_grade_key(g) for g in exp.get('grade', []) or []),
+            exp['name'].lower()
+        )
+        if self._attributes.get(exp_id) == attributes:
+            return
+        self._unindex_attributes(exp_id)
+        category, grades, name = attributes
+        self._by_category.setdefault(category, set()).add(exp_id)
+        for grade in grades:
+            self._by_grade.setdefault(grade, set()).add(exp_id)
+        insort(self._names, (name, exp_id))
+        self._attributes[exp_id] = attributes
+
+    def _unindex_attributes(self, exp_id):
+        attributes = self._attributes.pop(exp_id, None)
+        if attributes is None:
+            return
+        category, grades, name = attributes
+        _discard(self._by_category, category, exp_id)
+        for grade in grades:
+            _discard(self._by_grade, grade, exp_id)
+        i = bisect_left(self._names, (name, exp_id))
+        if i < len(self._names) and self._names[i] == (name, exp_id):
+            del self._names[i]
+
+    def _unlink(self, item_id, exp_id):
+        exp_ids = self._experiments_by_item.get(item_id)
+        if exp_ids is not None:
+            exp_ids.discard(exp_id)
+            if not exp_ids:
+                del self._experiments_by_item[item_id]
+
+    def _summarize(self, exp):
+        trials = exp.get('trials', 1)
+        consumable_cost = 0
+        equipment_qty = {}
+        item_count = 0
+
+        for item_id, quantity in item_pairs(exp):
+            item = self.catalog.get_item(item_id)
+            if not item:
+                continue
+            item_count += 1
+            _, _, price, category = item_details(item)
+            if category == 'non_consumable':
+                # Equipment is shared across trials: largest quantity listed
+                equipment_qty[item_id] = max(equipment_qty.get(item_id, 0), quantity)
+            else:
+                consumable_cost += quantity * price * trials
+
+        equipment_cost = sum(qty * self.catalog.get_item(item_id)['price_per_unit']
+                             for item_id, qty in equipment_qty.items())
+
+        return {
+            'id': exp['id'],
+            'name': exp['name'],
+            'category_id': exp.get('category', ''),
+            'trials': trials,
+            'item_count': item_count,
+            'consumable_cost': round(consumable_cost, 2),
+            'equipment_cost': round(equipment_cost, 2),
+            'total_cost': round(consumable_cost + equipment_cost, 2)
+        }
+
+
+def _discard(index, key, exp_id):
+    members = index.get(key)
+    if members is not None:
+        members.discard(exp_id)
+        if not members:
+            del index[key]
+
+
+def _grade_key(grade):
+    try:
+        return int(grade)
+    except (TypeError, ValueError):
+        return grade
@@ -0,0 +1,184 @@
+"""
+ETag / conditional GET, response compression and static asset caching
+"""
+
+import gzip
+import os
+import secrets
+import zlib
+
+from flask import request, session
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/css', 'application/javascript', 'text/javascript'}
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# Changes on every restart, so a version counter that restarts at 0 never revalidates stale bodies.
+# Forked workers inherit it, so get_version() must mean the same data in every worker
+_ETAG_SALT = secrets.token_hex(4)
+
+_static_cache = {}
+
+
+def init_app(app, get_version, cacheable_paths, public_paths=()):
+    """Register the caching hooks on app
+
+    get_version() returns the current data version, which must identify the
+    same data in every worker process, or None while the data is changing;
+    cacheable_paths are GET endpoints whose body depends only on that version
+    and the query string. public_paths may answer 304 without a session.
+    """
+    cacheable_paths = set(cacheable_paths)
+    public_paths = set(public_paths)
+
+    def current_etag():
+        version = get_version()
+        if version is None:
+            return None
+        path_hash = zlib.crc32(request.full_path.encode('utf-8'))
+        return f"{_ETAG_SALT}-{version}-{path_hash:08x}"
+
+    @app.before_request
+    def conditional_get():
+        if request.method != 'GET' or request.path not in cacheable_paths:
+            return None
+        if request.path not in public_paths and 'username' not in session:
+            return None  # Let the route answer 401
+        etag = current_etag()
+        if etag is None:
+            return None
+        request.environ['lab.etag'] = etag
+        candidate = _matching_etag(etag)
+        if candidate is None:
+            return None
+        response = app.response_class(status=304)
+        response.set_etag(candidate)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @app.after_request
+    def cache_and_compress(response):
+        etag = request.environ.get('lab.etag')
+        # Only if the data didn't change while the body was built
+        if etag and response.status_code == 200 and current_etag() == etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+
+        if request.path.startswith('/static/') and response.status_code == 200:
+            if 'v' in request.args:
+                # URLs carry the file version, so browsers may keep them forever
+                response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+            # send_file only compares the unsuffixed ETag, so a gzip/br copy is revalidated here
+            candidate = _matching_etag(response.get_etag()[0])
+            if candidate is not None:
+                return _not_modified(app, response, candidate)
+            return _compress_static(response)
+
+        return compress_response(response)
+
+    @app.context_processor
+    def static_helpers():
+        return {'static_url': lambda filename: _versioned_static_url(app, filename)}
+
+
+def _matching_etag(etag):
+    """The If-None-Match entry matching etag or one of its encoded variants, if any"""
+    if not etag:
+        return None
+    # Compressed bodies were sent with an encoding-suffixed ETag; If-None-Match compares weakly
+    for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+        if request.if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+
+def _not_modified(app, response, etag):
+    """A 304 in place of a full static response, keeping its caching headers"""
+    response.close()
+    not_modified = app.response_class(status=304)
+    not_modified.set_etag(etag)
+    for header in ('Cache-Control', 'Expires', 'Last-Modified'):
+        if header in response.headers:
+            not_modified.headers[header] = response.headers[header]
+    not_modified.vary.add('Accept-Encoding')
+    return not_modified
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _encode(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def compress_response(response):
+    """gzip/brotli a buffered text response above COMPRESS_MIN_SIZE"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(_encode(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    _suffix_etag(response, encoding)
+    return response
+
+
+def _compress_static(response):
+    """Compress static files once per (file, mtime, encoding) and reuse the bytes"""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    key = (request.path, response.last_modified, encoding)
+    body = _static_cache.get(key)
+    if body is None:
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        body = _static_cache[key] = _encode(data, encoding)
+
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    _suffix_etag(response, encoding)
+    return response
+
+
+def _suffix_etag(response, encoding):
+    # A compressed body is a different representation, so it needs its own validator
+    etag, weak = response.get_etag()
+    if etag and not etag.endswith('-' + encoding):
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+
+
+def _versioned_static_url(app, filename):
+    path = os.path.join(app.static_folder, filename)
+    try:
+        version = int(os.path.getmtime(path))
+    except OSError:
+        version = 0
+    return f"{app.static_url_path}/{filename}?v={version}"
@@ -0,0 +1,168 @@
+"""
+Append-only mutation journal (write-ahead log) for the JSON storage engine
+"""
+
+import os
+import threading
+import time
+
+import metrics
+import serialization
+
+
+class MutationJournal:
+    """One JSON line per mutation; snapshots fold it in and truncate it
+
+    Compaction happens in two steps so requests never wait for the snapshot
+    write: rotate() moves the live log aside under the data lock, and
+    discard_rotated() drops it once the snapshots are safely on disk.
+    """
+
+    def __init__(self, path, fsync=True, history_path=None):
+        self.path = path
+        self.rotated_path = path + '.compacting'
+        self.history_path = history_path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._seq = self._last_seq()
+        self._drop_torn_tail()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.appended = 0
+
+    def _drop_torn_tail(self):
+        # A crash mid-append leaves a partial last line; the next append must not run on from it.
+        # Entries are acknowledged only once their newline is written, so the fragment never was.
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(serialization.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    print(f"Skipping unreadable journal line in {path}")
+        return entries
+
+    def _last_seq(self):
+        entries = self._read(self.rotated_path) + self._read(self.path)
+        return max((e.get('seq', 0) for e in entries), default=0)
+
+    def append(self, op, payload):
+        """Durably append one mutation and return its sequence number"""
+        with self._lock, metrics.timer('journal_append'):
+            self._reopen_if_rotated()
+            self._seq += 1
+            entry = {'seq': self._seq, 'ts': time.time(), 'op': op, 'data': payload}
+            self._file.write(serialization.dumps(entry).decode('utf-8') + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.appended += 1
+            return self._seq
+
+    def _reopen_if_rotated(self):
+        # Another worker process may have rotated the log out from under our handle
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._file.fileno()).st_ino:
+            self._file.close()
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def append_many(self, mutations):
+        """Append several (op, payload) mutations with a single write and fsync"""
+        with self._lock, metrics.timer('journal_append'):
+            self._reopen_if_rotated()
+            lines = []
+            now = time.time()
+            for op, payload in mutations:
+                self._seq += 1
+                entry = {'seq': self._seq, 'ts': now, 'op': op, 'data': payload}
+                lines.append(serialization.dumps(entry).decode('utf-8') + '\n')
+            self._file.write(''.join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.appended += len(lines)
+            return self._seq
+
+    def entries(self):
+        """All entries not yet folded into a snapshot, oldest first"""
+        with self._lock:
+            return self._read(self.rotated_path) + self._read(self.path)
+
+    def rotate(self):
+        """Move the live log aside before a snapshot is serialized"""
+        with self._lock:
+            self._file.close()
+            if os.path.exists(self.rotated_path):
+                # A previous compaction failed; keep its entries ahead of ours
+                with open(self.rotated_path, 'ab') as rotated, open(self.path, 'rb') as current:
+                    rotated.write(current.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.rotated_path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def discard_rotated(self):
+        """Drop the rotated log once the snapshots containing it are on disk"""
+        with self._lock:
+            if not os.path.exists(self.rotated_path):
+                return
+            if self.history_path:
+                with open(self.history_path, 'ab') as history, open(self.rotated_path, 'rb') as rotated:
+                    history.write(rotated.read())
+            os.remove(self.rotated_path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def replay(entries, experiments, items_data, categories_data):
+    """Apply journal entries on top of loaded snapshots; returns the collections touched"""
+    if not entries:
+        return set()
+    item_index = {item['id']: i for i, item in enumerate(items_data['items'])}
+    category_index = {cat['id']: i for i, cat in enumerate(categories_data['categories'])}
+    touched = set()
+
+    for entry in entries:
+        op, data = entry['op'], entry['data']
+        if op == 'experiment.save':
+            experiments[data['id']] = data
+            touched.add('experiments')
+        elif op == 'experiment.delete':
+            experiments.pop(data['id'], None)
+            touched.add('experiments')
+        elif op == 'item.save':
+            if data['id'] in item_index:
+                items_data['items'][item_index[data['id']]] = data
+            else:
+                item_index[data['id']] = len(items_data['items'])
+                items_data['items'].append(data)
+            touched.add('items')
+        elif op == 'category.save':
+            if data['id'] in category_index:
+                categories_data['categories'][category_index[data['id']]] = data
+            else:
+                category_index[data['id']] = len(categories_data['categories'])
+                categories_data['categories'].append(data)
+            touched.add('categories')
+        else:
+            print(f"Unknown journal operation {op!r} at seq {entry.get('seq')}")
+
+    return touched
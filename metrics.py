@@ -0,0 +1,258 @@
+"""
+In-process request / hot-path metrics in Prometheus text format, and a JSON access log
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, request, session
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+access_logger = logging.getLogger('lab.access')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in values]
+
+
+class Gauge:
+    """Current value, either set directly or read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                return []
+            if value is None:
+                return []
+        else:
+            value = self.value
+        return [f'{self.name} {_format_value(value)}']
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (made cumulative at render time), then sum and count
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            samples = metric.render()
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    'lab_http_requests_total', 'HTTP requests by route, method and status', ('method', 'route', 'status')))
+http_latency = REGISTRY.register(Histogram(
+    'lab_http_request_duration_seconds', 'Request latency by route', ('method', 'route')))
+http_in_flight = REGISTRY.register(Gauge(
+    'lab_http_requests_in_flight', 'Requests currently being handled in this process'))
+operation_latency = REGISTRY.register(Histogram(
+    'lab_operation_duration_seconds', 'Time spent in instrumented hot paths', ('operation',)))
+persist_bytes = REGISTRY.register(Histogram(
+    'lab_persist_bytes', 'Bytes written per file persist', ('file',), buckets=BYTES_BUCKETS))
+
+
+def timed(operation):
+    """Decorator: record the wrapped function's duration under lab_operation_duration_seconds"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                operation_latency.observe(time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorator
+
+
+def timer(operation):
+    """Context manager form of timed()"""
+    return operation_latency.time(operation=operation)
+
+
+def track_waitress(dispatcher):
+    """Export a waitress task dispatcher's thread pool and queue as gauges"""
+    REGISTRY.register(Gauge('lab_waitress_threads', 'Waitress worker threads',
+                            lambda: len(dispatcher.threads)))
+    REGISTRY.register(Gauge('lab_waitress_active_threads', 'Waitress threads busy with a request',
+                            lambda: dispatcher.active_count))
+    REGISTRY.register(Gauge('lab_waitress_queue_depth', 'Requests waiting for a free waitress thread',
+                            lambda: len(dispatcher.queue)))
+
+
+def init_app(app, access_log=False):
+    """Time every request; with access_log, also write one JSON line per request to lab.access"""
+    if access_log:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        access_logger.addHandler(handler)
+        access_logger.setLevel(logging.INFO)
+        access_logger.propagate = False
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        http_in_flight.inc()
+
+    @app.teardown_request
+    def record_request(exc):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        http_in_flight.dec()
+        elapsed = time.perf_counter() - started
+        # The URL rule, not the path, keeps label cardinality bounded (/api/experiments/<exp_id>)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = g.pop('response_status', 500 if exc is not None else 200)
+        http_latency.observe(elapsed, method=request.method, route=route)
+        http_requests.inc(method=request.method, route=route, status=str(status))
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info(json.dumps({
+                'ts': round(time.time(), 3),
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': status,
+                'duration_ms': round(elapsed * 1000, 3),
+                'bytes': g.pop('response_bytes', None),
+                'remote_addr': request.remote_addr,
+                'user': session.get('username')
+            }, separators=(',', ':')))
+
+    @app.after_request
+    def remember_status(response):
+        g.response_status = response.status_code
+        g.response_bytes = response.calculate_content_length()
+        return response
@@ -0,0 +1,195 @@
+"""
+Debounced write-behind persistence for the JSON storage engine
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import metrics
+import serialization
+
+
+def atomic_write(filepath, data):
+    """Write text or bytes to a temp file, fsync it and rename it over filepath"""
+    with metrics.timer('persist'):
+        written = _atomic_write(filepath, data.encode('utf-8') if isinstance(data, str) else data)
+    metrics.persist_bytes.observe(written, file=os.path.basename(filepath))
+    return written
+
+
+def _atomic_write(filepath, data):
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filepath) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Make the rename itself durable
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return len(data)
+
+
+def write_binary_snapshot(json_path, payload):
+    """Write json_path's binary snapshot, tied to the file as it is now; failures only cost speed"""
+    try:
+        snapshot = serialization.binary_snapshot(payload, serialization.file_stamp(json_path))
+        atomic_write(json_path + serialization.BINARY_SUFFIX, snapshot)
+    except Exception as e:
+        print(f"Error saving binary snapshot of {json_path}: {e}")
+
+
+class WriteBehindWriter:
+    """Coalesces file rewrites and flushes them at most every interval_ms
+
+    Collections are marked dirty by reference; the flusher serializes them under
+    the shared data lock and writes them outside it. interval_ms=0 flushes
+    synchronously on every mark. With a journal, each flush is a compaction:
+    the log is rotated when the snapshot is taken and dropped once it is written.
+    binary_kinds (path -> collection kind) also writes a binary snapshot
+    after each of those files (see serialization).
+    """
+
+    def __init__(self, lock, interval_ms=500, journal=None, binary_kinds=None):
+        self.lock = lock
+        self.journal = journal
+        self.binary_kinds = binary_kinds or {}
+        self.interval = interval_ms / 1000.0
+        self._dirty = {}
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._last_flush = 0.0
+        self._metrics = {
+            'flushes': 0,
+            'files_written': 0,
+            'bytes_written': 0,
+            'marks': 0,
+            'coalesced_marks': 0,
+            'errors': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'last_flush_at': None
+        }
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the worker and write anything still pending"""
+        self._stopped = True
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def after_fork(self):
+        """Threads don't survive fork(); start a fresh worker in the child"""
+        self._thread = None
+        self._stopped = False
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.start()
+
+    def is_dirty(self, filepath):
+        with self.lock:
+            return filepath in self._dirty
+
+    def mark_dirty(self, filepath, data):
+        """Schedule filepath to be rewritten with the (live) data object"""
+        with self.lock:
+            self._metrics['marks'] += 1
+            if filepath in self._dirty:
+                self._metrics['coalesced_marks'] += 1
+            self._dirty[filepath] = data
+
+        if self.interval <= 0 or self._thread is None:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait()
+            if self._stopped:
+                break
+            # Debounce: never flush more often than once per interval; stop() cuts the wait short
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0 and self._stopping.wait(delay):
+                break
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+
+    def flush(self):
+        """Write every dirty collection now; returns the metrics"""
+        with self._flush_lock:
+            # Serialize under the data lock so no request mutates mid-dump
+            with self.lock:
+                pending = self._dirty
+                self._dirty = {}
+                snapshots = {path: serialization.dumps(data) for path, data in pending.items()}
+                binaries = {path: serialization.encode_binary(self.binary_kinds[path], data)
+                            for path, data in pending.items() if path in self.binary_kinds}
+                if snapshots and self.journal is not None:
+                    self.journal.rotate()
+
+            if not snapshots:
+                return self.metrics()
+
+            start = time.perf_counter()
+            failed = False
+            for path, text in snapshots.items():
+                try:
+                    self._metrics['bytes_written'] += atomic_write(path, text)
+                    self._metrics['files_written'] += 1
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    failed = True
+                    print(f"Error saving {path}: {e}")
+                    # Put it back so the next flush retries, unless it was re-marked meanwhile
+                    with self.lock:
+                        self._dirty.setdefault(path, pending[path])
+                    continue
+                if binaries.get(path) is not None:
+                    write_binary_snapshot(path, binaries[path])
+
+            # Only drop the rotated log once every snapshot that folds it in is on disk
+            if self.journal is not None and not failed:
+                self.journal.discard_rotated()
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._last_flush = time.monotonic()
+            self._metrics['flushes'] += 1
+            self._metrics['last_flush_ms'] = round(elapsed_ms, 3)
+            self._metrics['max_flush_ms'] = round(max(self._metrics['max_flush_ms'], elapsed_ms), 3)
+            self._metrics['last_flush_at'] = time.time()
+            return self.metrics()
+
+    def metrics(self):
+        result = dict(self._metrics)
+        result['pending'] = sorted(self._dirty)
+        result['interval_ms'] = int(self.interval * 1000)
+        return result
@@ -0,0 +1,49 @@
+"""
+Per-client token-bucket rate limiting
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket per key (e.g. client address): burst requests at once, then rate_per_minute"""
+
+    def __init__(self, rate_per_minute, burst, max_keys=10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, key):
+        """Take one token for key; False when the bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if len(self._buckets) >= self.max_keys and key not in self._buckets:
+                self._prune(now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+    def retry_after(self):
+        """Seconds until an empty bucket has a token again"""
+        return max(1, int(1 / self.rate + 0.999)) if self.rate > 0 else 60
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate if self.rate > 0 else float('inf')
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            # Still full under a flood of distinct clients: drop the oldest half
+            oldest = sorted(self._buckets.items(), key=lambda entry: entry[1][1])
+            for key, _ in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
@@ -0,0 +1,331 @@
+"""
+Compact in-memory records for catalog items and experiments
+
+json.load gives every record its own dict, repeating keys like 'price_per_unit'
+and holding a private copy of strings such as 'ml' or 'consumable'. These
+records keep the mapping interface the rest of the app uses (record['name'],
+.get(), .update(), 'key' in record), but store fields in __slots__, intern the
+small vocabularies (unit, item category, subject, ids) and keep an experiment's
+items as parallel id / quantity lists. Conversion happens at the edges:
+compact_* after loading, json_default when writing JSON.
+"""
+
+import sys
+from collections.abc import Mapping, MutableMapping, MutableSequence
+
+_intern = sys.intern
+
+
+class Record(MutableMapping):
+    """Mapping over __slots__ fields, with a dict for any keys outside the schema"""
+
+    __slots__ = ('_extra',)
+    FIELDS = ()
+    INTERNED = frozenset()
+    _ATTRS = {}  # field -> slot name; they differ only where a field would shadow a Mapping method
+
+    def __init__(self, data):
+        # __setitem__ inlined: this runs once per record on every load
+        self._extra = None
+        attrs, interned = self._ATTRS, self.INTERNED
+        for key, value in data.items():
+            attr = attrs.get(key)
+            if attr is None:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+            else:
+                setattr(self, attr, _intern(value) if key in interned and type(value) is str else value)
+
+    def __getitem__(self, key):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            try:
+                return getattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key, default=None):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            return getattr(self, attr, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __setitem__(self, key, value):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            if key in self.INTERNED and type(value) is str:
+                value = _intern(value)
+            setattr(self, attr, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            try:
+                delattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            return hasattr(self, attr)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, self._ATTRS[field]):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        # Records always carry an id; spares `if item:` a walk over every field
+        return True
+
+    def to_json(self):
+        """Plain dict in the on-disk shape"""
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_json()!r})"
+
+
+class ItemRecord(Record):
+    """Catalog item: id, name, price_per_unit, unit, category"""
+
+    FIELDS = ('id', 'name', 'price_per_unit', 'unit', 'category')
+    INTERNED = frozenset({'id', 'unit', 'category'})
+    _ATTRS = {field: field for field in FIELDS}
+    __slots__ = FIELDS
+
+
+class ExperimentItem(Mapping):
+    """View of one entry of an ExperimentItems; quantity can be assigned through it"""
+
+    __slots__ = ('_items', '_index')
+
+    def __init__(self, items, index):
+        self._items = items
+        self._index = index
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self._items.ids[self._index]
+        if key == 'quantity':
+            return self._items.quantities[self._index]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key != 'quantity':
+            raise KeyError(f"Only the quantity of an experiment item can be changed, not {key!r}")
+        self._items.quantities[self._index] = value
+
+    def __iter__(self):
+        return iter(('id', 'quantity'))
+
+    def __len__(self):
+        return 2
+
+    def to_json(self):
+        return {'id': self['id'], 'quantity': self['quantity']}
+
+
+class ExperimentItems(MutableSequence):
+    """An experiment's {'id', 'quantity'} entries as two parallel lists
+
+    Quantities stay a list (not an array) so ints and floats come back out
+    exactly as they went in.
+    """
+
+    __slots__ = ('ids', 'quantities')
+
+    def __init__(self, entries=()):
+        entries = list(entries)
+        self.ids = [_intern(entry['id']) for entry in entries]
+        self.quantities = [entry['quantity'] for entry in entries]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self.ids))[index]]
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError('experiment item index out of range')
+        return ExperimentItem(self, index)
+
+    def __setitem__(self, index, entry):
+        self.ids[index] = _intern(entry['id'])
+        self.quantities[index] = entry['quantity']
+
+    def __delitem__(self, index):
+        del self.ids[index]
+        del self.quantities[index]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def insert(self, index, entry):
+        self.ids.insert(index, _intern(entry['id']))
+        self.quantities.insert(index, entry['quantity'])
+
+    def pairs(self):
+        """(item id, quantity) per entry, without building views"""
+        return zip(self.ids, self.quantities)
+
+    def to_json(self):
+        return [{'id': item_id, 'quantity': quantity} for item_id, quantity in zip(self.ids, self.quantities)]
+
+    def __repr__(self):
+        return f"ExperimentItems({self.to_json()!r})"
+
+
+class ExperimentRecord(Record):
+    """Experiment: id, name, trials, category, grade and its items"""
+
+    FIELDS = ('id', 'name', 'trials', 'category', 'grade', 'items')
+    INTERNED = frozenset({'id', 'category'})
+    _ATTRS = dict({field: field for field in FIELDS}, items='entries')
+    __slots__ = ('id', 'name', 'trials', 'category', 'grade', 'entries')
+
+    def __init__(self, data):
+        super().__init__(data)
+        entries = getattr(self, 'entries', None)
+        if entries is not None and type(entries) is not ExperimentItems:
+            self.entries = ExperimentItems(entries)
+
+    def __setitem__(self, key, value):
+        if key == 'items' and not isinstance(value, ExperimentItems):
+            value = ExperimentItems(value)
+        super().__setitem__(key, value)
+
+
+def item_pairs(experiment):
+    """(item id, quantity) for each of an experiment's items, record or plain dict"""
+    if type(experiment) is ExperimentRecord:
+        items = getattr(experiment, 'entries', ())
+    else:
+        items = experiment.get('items', ())
+    if type(items) is ExperimentItems:
+        return items.pairs()
+    return ((exp_item['id'], exp_item['quantity']) for exp_item in items)
+
+
+def item_columns(experiment):
+    """(item ids, quantities) lists of an experiment's items; read-only, records hand out their own"""
+    if type(experiment) is ExperimentRecord:
+        items = getattr(experiment, 'entries', ())
+    else:
+        items = experiment.get('items', ())
+    if type(items) is ExperimentItems:
+        return items.ids, items.quantities
+    return [exp_item['id'] for exp_item in items], [exp_item['quantity'] for exp_item in items]
+
+
+def item_details(item):
+    """(name, unit, price_per_unit, category) of a catalog item, record or plain dict"""
+    if type(item) is ItemRecord:
+        return item.name, item.unit, item.price_per_unit, getattr(item, 'category', 'consumable')
+    return item['name'], item['unit'], item['price_per_unit'], item.get('category', 'consumable')
+
+
+def compact_item(item):
+    return item if isinstance(item, ItemRecord) else ItemRecord(item)
+
+
+def compact_experiment(experiment):
+    return experiment if isinstance(experiment, ExperimentRecord) else ExperimentRecord(experiment)
+
+
+def compact_collections(experiments, items_data, categories_data):
+    """Convert freshly loaded collections to records, in place (storage keeps these objects)"""
+    for exp_id in list(experiments):
+        experiments[exp_id] = compact_experiment(experiments[exp_id])
+    items_data['items'][:] = [compact_item(item) for item in items_data['items']]
+    for category in categories_data['categories']:
+        for key in ('id', 'subject'):
+            if type(category.get(key)) is str:
+                category[key] = _intern(category[key])
+
+
+def _is_regular(record, cls):
+    """Exactly the schema fields, no extras; such records pack into columns"""
+    return type(record) is cls and record._extra is None and all(hasattr(record, cls._ATTRS[f]) for f in cls.FIELDS)
+
+
+def pack_collection(kind, data):
+    """Column-wise, marshal-friendly form of a loaded collection, or None if it can't be packed
+
+    kind is 'experiments' (id -> record), 'items' ({'items': [...]}) or
+    'categories' (plain dicts, packed as they are).
+    """
+    if kind == 'categories':
+        return kind, data
+    if kind == 'items':
+        items = data['items']
+        if not all(_is_regular(item, ItemRecord) for item in items):
+            return None
+        rest = {key: value for key, value in data.items() if key != 'items'}
+        return kind, rest, tuple([getattr(item, field) for item in items] for field in ItemRecord.FIELDS)
+    if kind == 'experiments':
+        experiments = list(data.values())
+        if not all(_is_regular(exp, ExperimentRecord) and type(exp.entries) is ExperimentItems for exp in experiments):
+            return None
+        columns = tuple([getattr(exp, field) for exp in experiments] for field in ('id', 'name', 'trials', 'category', 'grade'))
+        return kind, list(data), columns + ([exp.entries.ids for exp in experiments],
+                                            [exp.entries.quantities for exp in experiments])
+    raise ValueError(f"Unknown collection: {kind}")
+
+
+def unpack_collection(kind, packed):
+    """Inverse of pack_collection; builds the records without going through their dict constructors"""
+    if packed[0] != kind:
+        raise ValueError(f"Snapshot holds {packed[0]}, not {kind}")
+    if kind == 'categories':
+        return packed[1]
+    if kind == 'items':
+        _, rest, columns = packed
+        items = []
+        new = ItemRecord.__new__
+        for item_id, name, price, unit, category in zip(*columns):
+            item = new(ItemRecord)
+            item._extra = None
+            item.id, item.name, item.price_per_unit, item.unit, item.category = item_id, name, price, unit, category
+            items.append(item)
+        return dict(rest, items=items)
+    _, keys, columns = packed
+    experiments = {}
+    new, new_items = ExperimentRecord.__new__, ExperimentItems.__new__
+    for key, exp_id, name, trials, category, grade, ids, quantities in zip(keys, *columns):
+        exp = new(ExperimentRecord)
+        exp._extra = None
+        exp.id, exp.name, exp.trials, exp.category, exp.grade = exp_id, name, trials, category, grade
+        entries = exp.entries = new_items(ExperimentItems)
+        entries.ids, entries.quantities = ids, quantities
+        experiments[key] = exp
+    return experiments
+
+
+# Everything json_default turns back into plain JSON
+RECORD_TYPES = (Record, ExperimentItems, ExperimentItem)
+
+
+def json_default(obj):
+    """json.dumps(default=...) hook for records"""
+    if isinstance(obj, RECORD_TYPES):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,176 @@
+"""
+Procurement report (XLSX / CSV) built from a /api/calculate result
+
+The XLSX keeps the sheets and columns of the workbook the browser used to
+assemble in exportToExcel, but is generated server-side with the streaming
+writers in bulk_io. CSV is the flat item list (ITEM_HEADER).
+"""
+
+import bulk_io
+from records import item_pairs
+
+CURRENCY = '₹'
+ITEM_HEADER = ['Item ID', 'Item Name', 'Type', 'Category', 'Total Quantity', 'Unit',
+               f'Price/Unit ({CURRENCY})', f'Total Cost ({CURRENCY})', 'Used In Experiments']
+
+
+def _category_label(item):
+    return 'Equipment' if item['category'] == 'non_consumable' else item['category'].replace('_', ' ').title()
+
+
+def _experiment_quantity(item, quantity, trials):
+    # Equipment is reused across trials; everything else is needed per trial
+    return quantity if item['category'] == 'non_consumable' else quantity * trials
+
+
+def item_rows(result):
+    """One row per procured item: common items first, then unique items"""
+    for usage, items in (('Common', result['common_items']), ('Unique', result['unique_items'])):
+        for item in items:
+            yield [
+                item['id'],
+                item['name'],
+                usage,
+                _category_label(item),
+                item['total_quantity'],
+                item['unit'],
+                item['price'],
+                item['total_cost'],
+                ', '.join(e['exp_name'] for e in item['experiments'])
+            ]
+
+
+def _usage(result):
+    """item id -> ('Common' | 'Unique', result item)"""
+    usage = {}
+    for kind, items in (('Common', result['common_items']), ('Unique', result['unique_items'])):
+        for item in items:
+            usage[item['id']] = (kind, item)
+    return usage
+
+
+def _experiment_items(usage, exp):
+    """(kind, item, quantity) for each procured item of exp: unique items first, then common ones"""
+    trials = exp.get('trials', 1)
+    used = [(usage[item_id], quantity) for item_id, quantity in item_pairs(exp) if item_id in usage]
+    for wanted in ('Unique', 'Common'):
+        for (kind, item), quantity in used:
+            if kind == wanted:
+                yield kind, item, _experiment_quantity(item, quantity, trials)
+
+
+def experiment_item_rows(result, selected_experiments, get_category_name):
+    """Per-experiment breakdown; common items point at the Common Items sheet for cost"""
+    usage = _usage(result)
+    for exp in selected_experiments:
+        for kind, item, qty in _experiment_items(usage, exp):
+            yield [
+                exp['id'],
+                exp['name'],
+                get_category_name(exp.get('category', '')),
+                exp.get('trials', 1),
+                item['name'],
+                kind,
+                qty,
+                item['unit'],
+                item['price'],
+                qty * item['price'] if kind == 'Unique' else '(See Common Items sheet)'
+            ]
+        yield [''] * 10
+
+
+def common_item_rows(result, common_cost):
+    yield ['Item Name', 'Total Quantity', 'Unit', f'Price/Unit ({CURRENCY})', f'Total Cost ({CURRENCY})',
+           'Category', 'Used In Experiments']
+    for item in result['common_items']:
+        yield [
+            item['name'],
+            item['total_quantity'],
+            item['unit'],
+            item['price'],
+            item['total_cost'],
+            _category_label(item),
+            ', '.join(e['exp_name'] for e in item['experiments'])
+        ]
+    yield ['', '', '', 'TOTAL:', round(common_cost, 2), '', '']
+
+
+def unique_item_rows(result, selected_experiments, unique_cost):
+    """Unique items grouped by experiment, a blank row after each"""
+    yield ['Experiment', 'Item Name', 'Quantity', 'Unit', f'Price/Unit ({CURRENCY})', f'Total Cost ({CURRENCY})',
+           'Category']
+    usage = _usage(result)
+    for exp in selected_experiments:
+        for kind, item, qty in _experiment_items(usage, exp):
+            if kind == 'Unique':
+                yield [exp['name'], item['name'], qty, item['unit'], item['price'], qty * item['price'],
+                       _category_label(item)]
+        yield [''] * 7
+    yield ['', '', '', '', 'TOTAL:', round(unique_cost, 2), '']
+
+
+def procurement_sheets(result, selected_experiments, get_category_name, generated):
+    """(title, header, rows) for every sheet of the XLSX report, in the browser export's order"""
+    common_cost = sum(item['total_cost'] for item in result['common_items'])
+    unique_cost = sum(item['total_cost'] for item in result['unique_items'])
+    common_count, unique_count = len(result['common_items']), len(result['unique_items'])
+
+    summary = [
+        ['Generated:', generated],
+        ['Total Experiments:', result['selected_count']],
+        [f'Total Cost ({CURRENCY}):', result['total_cost']],
+        []
+    ]
+    procurement = [
+        [''],
+        ['Total Experiments:', result['selected_count']],
+        [''],
+        ['Common Items Cost:', round(common_cost, 2)],
+        ['Unique Items Cost:', round(unique_cost, 2)],
+        ['GRAND TOTAL:', result['total_cost']],
+        [''],
+        [''],
+        ['Breakdown by Category'],
+        ['Type', 'Count', f'Total Cost ({CURRENCY})'],
+        ['Common Items', common_count, round(common_cost, 2)],
+        ['Unique Items', unique_count, round(unique_cost, 2)],
+        ['TOTAL', common_count + unique_count, result['total_cost']]
+    ]
+
+    return [
+        ('Summary', ['Lab Procurement Report'], summary),
+        ('Experiments & Items',
+         ['Experiment ID', 'Experiment Name', 'Category', 'Trials', 'Item Name', 'Type',
+          'Quantity', 'Unit', f'Price/Unit ({CURRENCY})', f'Total Cost ({CURRENCY})'],
+         experiment_item_rows(result, selected_experiments, get_category_name)),
+        ('Common Items', ['Common Items to Procure'], common_item_rows(result, common_cost)),
+        ('Unique Items', ['Unique Items Summary'], unique_item_rows(result, selected_experiments, unique_cost)),
+        ('Procurement Summary', ['PROCUREMENT SUMMARY'], procurement)
+    ]
+
+
+def stream_report(fmt, result, selected_experiments, get_category_name, generated):
+    """Yield the report file in chunks; CSV is the flat item list"""
+    if fmt == 'csv':
+        return bulk_io.stream_csv(ITEM_HEADER, item_rows(result))
+    sheets = procurement_sheets(result, selected_experiments, get_category_name, generated)
+    return bulk_io.stream_workbook(sheets)
+
+
+def cache_stream(chunks, on_complete, max_bytes):
+    """Pass chunks through, then hand the whole body to on_complete if it fit in max_bytes
+
+    A download the client abandons half-way is never cached.
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        on_complete(b''.join(part.encode('utf-8') if isinstance(part, str) else part for part in parts))
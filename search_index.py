@@ -0,0 +1,172 @@
+"""
+Incremental prefix index for /api/search over items, experiments and categories
+"""
+
+import heapq
+import re
+from bisect import bisect_left, insort
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+PARENS_RE = re.compile(r'\(([^()]*)\)')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens, plus each parenthesized group squashed into
+    one token so 'Sodium Carbonate (Na2 CO3)' also matches 'na2co3'"""
+    text = (text or '').lower()
+    tokens = set(TOKEN_RE.findall(text))
+    for group in PARENS_RE.findall(text):
+        squashed = ''.join(TOKEN_RE.findall(group))
+        if squashed:
+            tokens.add(squashed)
+    return tokens
+
+
+class SearchIndex:
+    """Token -> document keys, with a sorted token list for prefix lookups
+
+    Documents are (kind, id) keys with a display name used for ranking; the
+    caller resolves keys back to live records.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, documents=()):
+        """Rebuild from (kind, id, name, *extra_text) tuples, sorting once at the end"""
+        self._postings = {}
+        self._tokens = []
+        self._doc_tokens = {}
+        self._names = {}
+        # Sorted (lowercase name, key) for "name starts with" lookups, plus the
+        # same sort key per document for ordering the other tiers
+        self._sorted_names = []
+        self._sort_keys = {}
+        self._bulk = True
+        for document in documents:
+            self.add(*document)
+        self._bulk = False
+        self._tokens.sort()
+        self._sorted_names.sort()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, kind, doc_id, name, *extra_text):
+        """Index (or re-index) one document"""
+        key = (kind, doc_id)
+        tokens = tokenize(name)
+        for text in extra_text:
+            tokens |= tokenize(text)
+        old_tokens = self._doc_tokens.get(key, set())
+        for token in old_tokens - tokens:
+            self._unlink(token, key)
+        for token in tokens - old_tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                if self._bulk:
+                    self._tokens.append(token)
+                else:
+                    insort(self._tokens, token)
+            postings.add(key)
+        self._doc_tokens[key] = tokens
+
+        lowered = name.lower()
+        old_name = self._names.get(key)
+        if old_name is None or old_name.lower() != lowered:
+            if old_name is not None:
+                self._unlink_name(old_name.lower(), key)
+            if self._bulk:
+                self._sorted_names.append((lowered, key))
+            else:
+                insort(self._sorted_names, (lowered, key))
+        self._names[key] = name
+        self._sort_keys[key] = (lowered, key)
+
+    def remove(self, kind, doc_id):
+        key = (kind, doc_id)
+        for token in self._doc_tokens.pop(key, ()):
+            self._unlink(token, key)
+        name = self._names.pop(key, None)
+        if name is not None:
+            self._unlink_name(name.lower(), key)
+            del self._sort_keys[key]
+
+    def _unlink_name(self, lowered, key):
+        i = bisect_left(self._sorted_names, (lowered, key))
+        if i < len(self._sorted_names) and self._sorted_names[i] == (lowered, key):
+            del self._sorted_names[i]
+
+    def _unlink(self, token, key):
+        postings = self._postings.get(token)
+        if postings is None:
+            return
+        postings.discard(key)
+        if not postings:
+            del self._postings[token]
+            del self._tokens[bisect_left(self._tokens, token)]
+
+    def _prefix_matches(self, prefix):
+        """Documents having a token that starts with prefix"""
+        start = bisect_left(self._tokens, prefix)
+        end = bisect_left(self._tokens, prefix + '\uffff')
+        if end - start == 1:
+            return self._postings[self._tokens[start]]
+        matched = set()
+        for token in self._tokens[start:end]:
+            matched |= self._postings[token]
+        return matched
+
+    def search(self, query, kinds=None, limit=20):
+        """Ranked (kind, id) keys matching every query token as a prefix; returns (keys, total)
+
+        Like the item picker: names starting with the query come first, then names
+        containing every query word exactly, then prefix-only matches; each tier is
+        alphabetical.
+        """
+        query_tokens = sorted(set(TOKEN_RE.findall((query or '').lower())))
+        if not query_tokens:
+            return [], 0
+
+        candidate_sets = sorted((self._prefix_matches(token) for token in query_tokens), key=len)
+        # Posting sets are only read below, so a single one needn't be copied
+        matched = candidate_sets[0].intersection(*candidate_sets[1:]) if len(candidate_sets) > 1 else candidate_sets[0]
+        if kinds is not None:
+            matched = {key for key in matched if key[0] in kinds}
+
+        # Tier 1 walks the sorted names, so it stops as soon as the page is full
+        phrase = ' '.join(TOKEN_RE.findall(query.lower()))
+        results = []
+        position = bisect_left(self._sorted_names, (phrase,))
+        while position < len(self._sorted_names) and len(results) < limit:
+            lowered, key = self._sorted_names[position]
+            if not lowered.startswith(phrase):
+                break
+            if key in matched:
+                results.append(key)
+            position += 1
+        if len(results) == limit:
+            return results, len(matched)
+
+        seen = set(results)
+        exact_sets = sorted((self._postings.get(token, set()) for token in query_tokens), key=len)
+        word_matches = exact_sets[0].intersection(*exact_sets[1:], matched) - seen
+        for tier in (word_matches, matched - seen - word_matches):
+            if len(results) >= limit:
+                break
+            results.extend(self._first_in_order(tier, limit - len(results)))
+        return results, len(matched)
+
+    def _first_in_order(self, keys, n):
+        """The n alphabetically first of keys"""
+        if len(keys) * 16 < len(self._sorted_names):
+            return heapq.nsmallest(n, keys, key=self._sort_keys.__getitem__)
+        # Dense sets: a walk over the sorted names finds n members almost immediately
+        first = []
+        for _, key in self._sorted_names:
+            if key in keys:
+                first.append(key)
+                if len(first) == n:
+                    break
+        return first
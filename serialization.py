@@ -0,0 +1,82 @@
+"""
+JSON encoding for responses and data files, plus optional binary snapshots
+
+dumps() / loads() use orjson when it is installed and the stdlib json module
+otherwise; both produce compact UTF-8 JSON and understand the records from
+records.py.
+
+A binary snapshot is a marshal copy of one data file, written next to it
+(<file>.bin) with records stored column-wise, so a cold start skips JSON
+parsing and the dict -> record conversion. Each one carries the size and mtime
+of the JSON file it mirrors and is ignored as soon as they no longer match
+(e.g. after a hand edit); the JSON file stays the source of truth.
+marshal is used rather than pickle because loading it cannot run code.
+"""
+
+import json
+import marshal
+import os
+import sys
+
+from records import json_default, pack_collection, unpack_collection
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+BINARY_SUFFIX = '.bin'
+BINARY_FORMAT = 1
+
+
+def dumps(obj, sort_keys=False, default=json_default):
+    """Compact JSON as UTF-8 bytes"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, default=default,
+                      ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def file_stamp(path):
+    """(size, mtime_ns) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def encode_binary(kind, data):
+    """Binary snapshot payload for a collection, or None if it has records marshal can't pack"""
+    packed = pack_collection(kind, data)
+    if packed is None:
+        return None
+    return marshal.dumps(packed)
+
+
+def binary_snapshot(payload, stamp):
+    """Binary snapshot file contents: a header tying the payload to one version of its JSON file"""
+    header = marshal.dumps((BINARY_FORMAT, tuple(sys.version_info[:2]), stamp))
+    return len(header).to_bytes(4, 'little') + header + payload
+
+
+def read_binary_snapshot(json_path, kind):
+    """The collection from json_path's binary snapshot if it still matches the file, else None"""
+    stamp = file_stamp(json_path)
+    try:
+        with open(json_path + BINARY_SUFFIX, 'rb') as f:
+            header_size = int.from_bytes(f.read(4), 'little')
+            header = marshal.loads(f.read(header_size))
+            if header != (BINARY_FORMAT, tuple(sys.version_info[:2]), stamp):
+                return None
+            return unpack_collection(kind, marshal.loads(f.read()))
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
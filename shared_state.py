@@ -0,0 +1,105 @@
+"""
+Cross-process coherence for multiple worker processes on one host
+
+Writers take an exclusive fcntl lock, refresh their cache if another process
+changed the data, persist synchronously and bump a shared version file.
+Readers compare the version file before each request and reload when it moved.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from persistence import atomic_write
+
+LOCK_FILE = '.lab_data.lock'
+VERSION_FILE = '.lab_data.version'
+
+
+class SharedStateCoordinator:
+    """Version file + fcntl lock shared by every worker process"""
+
+    def __init__(self, reload_callback, lock_path=LOCK_FILE, version_path=VERSION_FILE):
+        if fcntl is None:
+            raise RuntimeError('Shared-state mode needs fcntl (POSIX only)')
+        self.reload_callback = reload_callback
+        self.lock_path = lock_path
+        self.version_path = version_path
+        # flock is per open file; the thread lock keeps this process's threads in line
+        self._thread_lock = threading.RLock()
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._depth = 0
+        self._stat_key = None
+        self.seen_version = self.read_version()
+        self.reloads = 0
+
+    def after_fork(self):
+        """Reopen the lock file so a forked child gets its own flock"""
+        os.close(self._lock_fd)
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._stat_key = None
+
+    def read_version(self):
+        try:
+            with open(self.version_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def is_stale(self):
+        """Cheap check: one stat() unless the version file changed"""
+        try:
+            st = os.stat(self.version_path)
+            key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            key = None
+        if key == self._stat_key:
+            return False
+        if self.read_version() != self.seen_version:
+            return True
+        self._stat_key = key
+        return False
+
+    @contextmanager
+    def _flock(self, mode):
+        with self._thread_lock:
+            if self._depth == 0:
+                fcntl.flock(self._lock_fd, mode)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reload the in-memory cache if another worker has written since we last looked"""
+        with self._flock(fcntl.LOCK_SH):
+            version = self.read_version()
+            if version == self.seen_version:
+                return False
+            self.reload_callback()
+            self.seen_version = version
+            self.reloads += 1
+            return True
+
+    @contextmanager
+    def write(self):
+        """Exclusive cross-process write section; bumps the shared version on success"""
+        with self._flock(fcntl.LOCK_EX):
+            version = self.read_version()
+            if version != self.seen_version:
+                self.reload_callback()
+                self.seen_version = version
+                self.reloads += 1
+            yield
+            self.seen_version = version + 1
+            atomic_write(self.version_path, str(self.seen_version))
@@ -335,9 +335,12 @@ async function initializeApp() {
     }
     
     try {
+        // Take the change cursor first so nothing saved during the loads is missed
+        await fetchChangeCursor();
         await loadCategories();
         await loadItems();
         await loadExperiments();
+        openChangeStream();
         
         // Set up filters after data is loaded
         setTimeout(() => {
@@ -467,6 +470,7 @@ function handleLogout() {
     if (!confirm('Are you sure you want to logout?')) {
         return;
     }
+    closeChangeStream();
     
     // Clear login state FIRST to prevent recursive calls
     loginState.isLoggedIn = false;
@@ -581,10 +585,16 @@ async function loadCategories() {
 
 async function loadExperiments() {
     try {
-        const response = await authenticatedFetch('/api/experiments');
+        // Subject teachers only ever see their own subject; let the server filter it
+        const subject = loginState.allowedSubject && loginState.allowedSubject !== 'All'
+            ? loginState.allowedSubject
+            : '';
+        const url = subject ? `/api/experiments?subject=${encodeURIComponent(subject)}` : '/api/experiments';
+        const response = await authenticatedFetch(url);
         if (!response.ok) throw new Error('Failed to load experiments');
         
-        state.experiments = await response.json();
+        const data = await response.json();
+        state.experiments = Array.isArray(data) ? data : data.experiments;
         
         // Ensure filteredExperiments is initialized
         if (!state.filteredExperiments) {
@@ -640,11 +650,15 @@ async function handleFetchError(response) {
 
 
 function populateItemsDatalist() {
+    renderItemsDatalist(itemsCache);
+}
+
+function renderItemsDatalist(items) {
     const datalist = document.getElementById('itemsList');
     if (!datalist) return;
     
     datalist.innerHTML = '';
-    itemsCache.forEach(item => {
+    items.forEach(item => {
         const option = document.createElement('option');
         option.value = item.name;
         option.setAttribute('data-id', item.id);
@@ -655,48 +669,37 @@ function populateItemsDatalist() {
     });
 }
 
+let itemSearchTimer = null;
+let itemSearchSeq = 0;
+
 function filterItemsDatalist(searchText) {
     const datalist = document.getElementById('itemsList');
     if (!datalist) return;
     
+    clearTimeout(itemSearchTimer);
     if (!searchText || searchText.length < 1) {
         populateItemsDatalist();
         return;
     }
     
-    const searchLower = searchText.toLowerCase();
-    
-    // Separate items into "starts with" and "contains"
-    const startsWithItems = [];
-    const containsItems = [];
-    
-    itemsCache.forEach(item => {
-        const nameLower = item.name.toLowerCase();
-        if (nameLower.startsWith(searchLower)) {
-            startsWithItems.push(item);
-        } else if (nameLower.includes(searchLower)) {
-            containsItems.push(item);
-        }
-    });
-    
-    // Sort each group alphabetically
-    startsWithItems.sort((a, b) => a.name.localeCompare(b.name));
-    containsItems.sort((a, b) => a.name.localeCompare(b.name));
-    
-    // Combine: starts-with first, then contains
-    const sortedItems = [...startsWithItems, ...containsItems];
-    
-    // Populate datalist
-    datalist.innerHTML = '';
-    sortedItems.forEach(item => {
-        const option = document.createElement('option');
-        option.value = item.name;
-        option.setAttribute('data-id', item.id);
-        option.setAttribute('data-unit', item.unit);
-        option.setAttribute('data-price', item.price_per_unit);
-        option.setAttribute('data-category', item.category);
-        datalist.appendChild(option);
-    });
+    // Ranked server-side (starts-with first, then word matches); debounced per keystroke
+    itemSearchTimer = setTimeout(() => searchItemsDatalist(searchText), 150);
+}
+
+async function searchItemsDatalist(searchText) {
+    const seq = ++itemSearchSeq;
+    try {
+        const response = await authenticatedFetch(
+            `/api/search?types=item&limit=50&q=${encodeURIComponent(searchText)}`
+        );
+        if (!response.ok) throw new Error('Search failed');
+        
+        const data = await response.json();
+        if (seq !== itemSearchSeq) return; // A newer keystroke already searched
+        renderItemsDatalist(data.results);
+    } catch (error) {
+        console.error('Error searching items:', error);
+    }
 }
 
 function populateCategoriesDatalist(subjectFilter = null) {
@@ -766,6 +769,138 @@ function filterCategoriesDatalist(searchText, subjectFilter = null) {
 }
 
 
+// ==================== CHANGE FEED ====================
+
+// Cursor into /api/changes; the collections are patched from it instead of refetched
+const changeFeed = {
+    epoch: null,
+    version: 0,
+    source: null
+};
+
+async function fetchChangeCursor() {
+    const response = await authenticatedFetch('/api/changes');
+    if (!response.ok) throw new Error('Failed to load change cursor');
+    const data = await response.json();
+    changeFeed.epoch = data.epoch;
+    changeFeed.version = data.version;
+}
+
+// Live updates from other users; EventSource reconnects (and resumes) by itself
+function openChangeStream() {
+    closeChangeStream();
+    if (!window.EventSource) return;
+    const source = new EventSource(
+        `/api/changes/stream?since=${changeFeed.version}&epoch=${encodeURIComponent(changeFeed.epoch)}`
+    );
+    source.addEventListener('changes', event => applyChanges(JSON.parse(event.data)));
+    changeFeed.source = source;
+}
+
+function closeChangeStream() {
+    if (changeFeed.source) {
+        changeFeed.source.close();
+        changeFeed.source = null;
+    }
+}
+
+// Pull pending changes now, e.g. right after this tab saved something
+async function syncChanges() {
+    try {
+        const response = await authenticatedFetch(
+            `/api/changes?since=${changeFeed.version}&epoch=${encodeURIComponent(changeFeed.epoch)}`
+        );
+        if (!response.ok) throw new Error('Failed to load changes');
+        await applyChanges(await response.json());
+    } catch (error) {
+        console.error('Error syncing changes:', error);
+        await loadExperiments();
+    }
+}
+
+async function applyChanges(payload) {
+    if (payload.reset) {
+        // Cursor too old (or the server reloaded its data): start over
+        changeFeed.epoch = payload.epoch;
+        changeFeed.version = payload.version;
+        await loadCategories();
+        await loadItems();
+        await loadExperiments();
+        return;
+    }
+    if (payload.epoch === changeFeed.epoch && payload.version <= changeFeed.version) return;
+    changeFeed.epoch = payload.epoch;
+    changeFeed.version = payload.version;
+
+    let experimentsChanged = false;
+    let itemsChanged = false;
+    let categoriesChanged = false;
+    payload.changes.forEach(change => {
+        if (change.type === 'experiment') {
+            const experiment = visibleExperiment(change.data);
+            upsertById(state.experiments, change.id, experiment);
+            if (!experiment) state.selectedExperiments.delete(change.id);
+            experimentsChanged = true;
+        } else if (change.type === 'item') {
+            upsertById(itemsCache, change.id, change.data);
+            if (change.data && patchExperimentItems(change.data)) experimentsChanged = true;
+            itemsChanged = true;
+        } else if (change.type === 'category') {
+            upsertById(state.categories, change.id, change.data);
+            categoriesChanged = true;
+        }
+    });
+
+    if (categoriesChanged) {
+        updateCategoryFilterDropdown();
+        populateCategoriesDatalist();
+    }
+    if (itemsChanged) populateItemsDatalist();
+    if (experimentsChanged) {
+        applyFilters();
+        renderExperiments();
+        calculateCosts();
+    }
+}
+
+// null for deleted experiments and, for subject teachers, other subjects' ones
+function visibleExperiment(experiment) {
+    if (!experiment) return null;
+    if (loginState.allowedSubject && loginState.allowedSubject !== 'All') {
+        const category = state.categories.find(cat => cat.id === experiment.category_id);
+        if (!category || category.subject !== loginState.allowedSubject) return null;
+    }
+    return experiment;
+}
+
+function upsertById(list, id, record) {
+    const index = list.findIndex(entry => entry.id === id);
+    if (!record) {
+        if (index !== -1) list.splice(index, 1);
+    } else if (index === -1) {
+        list.push(record);
+    } else {
+        list[index] = record;
+    }
+}
+
+// Experiments embed item details, so a catalog change is copied into each of them
+function patchExperimentItems(item) {
+    let patched = false;
+    state.experiments.forEach(exp => {
+        exp.items.forEach(expItem => {
+            if (expItem.id !== item.id) return;
+            expItem.name = item.name;
+            expItem.unit = item.unit;
+            expItem.price = item.price_per_unit;
+            expItem.category = item.category || 'consumable';
+            patched = true;
+        });
+    });
+    return patched;
+}
+
+
 // ==================== FILTER FUNCTIONS ====================
 // Replace applyFilters
 function applyFilters() {
@@ -855,7 +990,7 @@ async function deleteExperiment(expId, event) {
         if (!response.ok) throw new Error('Failed to delete experiment');
         
         state.selectedExperiments.delete(expId);
-        await loadExperiments(); // Refresh after delete
+        await syncChanges(); // Patch in the delete instead of refetching
         showSuccess('Experiment deleted');
     } catch (error) {
         console.error('Error deleting experiment:', error);
@@ -913,7 +1048,7 @@ async function copyExperiment(expId, event) {
             if (!itemResponse.ok) throw new Error('Failed to copy item');
         }
         
-        await loadExperiments(); // Refresh after copy
+        await syncChanges(); // Patch in the copy instead of refetching
         showSuccess(`Experiment "${newName}" created successfully with ${exp.items.length} items`);
     } catch (error) {
         console.error('Error copying experiment:', error);
@@ -932,7 +1067,7 @@ async function deleteItem(expId, itemId, event) {
         
         if (!response.ok) throw new Error('Failed to delete item');
         
-        await loadExperiments(); // Refresh after delete
+        await syncChanges(); // Patch in the delete instead of refetching
         showSuccess('Item deleted');
     } catch (error) {
         console.error('Error deleting item:', error);
@@ -1283,270 +1418,44 @@ function savePreviewData() {
 
 // Complete exportToExcel function - Add to your script.js
 
-function exportToExcel() {
+async function exportToExcel() {
     if (!state.currentResults) {
         showError('No data to export');
         return;
     }
     
-    // Check if XLSX library is loaded
-    if (typeof XLSX === 'undefined') {
-        showError('Excel library not loaded. Please refresh the page.');
-        return;
-    }
-    
-    // Create a new workbook
-    const wb = XLSX.utils.book_new();
-    
-    // Sheet 1: Summary
-    const summaryData = [
-        ['Lab Procurement Report'],
-        ['Generated:', new Date().toLocaleDateString()],
-        ['Total Experiments:', state.currentResults.selected_count],
-        ['Total Cost (₹):', state.currentResults.total_cost],
-        []
-    ];
-    const ws_summary = XLSX.utils.aoa_to_sheet(summaryData);
-    XLSX.utils.book_append_sheet(wb, ws_summary, 'Summary');
-    
-    // Get selected experiments
-    const selectedExps = Array.from(state.selectedExperiments)
-        .map(id => state.experiments.find(e => e.id === id))
-        .filter(e => e);
-    
-    // Sheet 2: Experiments with Items (per experiment breakdown)
-    const expData = [['Experiment ID', 'Experiment Name', 'Category', 'Trials', 'Item Name', 'Type', 'Quantity', 'Unit', 'Price/Unit (₹)', 'Total Cost (₹)']];
-    
-    selectedExps.forEach(exp => {
-        // Unique items for this experiment
-        const uniqueItemsForExp = state.currentResults.unique_items.filter(item => 
-            item.experiments.some(e => e.exp_name === exp.name)
-        );
-        
-        uniqueItemsForExp.forEach(item => {
-            const expItemData = item.experiments.find(e => e.exp_name === exp.name);
-            const isEquipment = item.category === 'non_consumable';
-            const isPacking = item.category === 'packing';
-
-            let qty;
-            if (isEquipment) {
-                qty = expItemData.quantity;
-            } else if (isPacking) {
-                qty = expItemData.quantity * expItemData.trials;
-            } else {
-                qty = expItemData.quantity * expItemData.trials;
-            }
-            const cost = qty * item.price
-            expData.push([
-                exp.id,
-                exp.name,
-                exp.category,
-                exp.trials,
-                item.name,
-                'Unique',
-                qty,
-                item.unit,
-                item.price,
-                cost
-            ]);
-        });
-        
-        // Common items used in this experiment
-        const commonItemsForExp = state.currentResults.common_items.filter(item => 
-            item.experiments.some(e => e.exp_name === exp.name)
-        );
-        
-        commonItemsForExp.forEach(item => {
-            const expItemData = item.experiments.find(e => e.exp_name === exp.name);
-            const isEquipment = item.category === 'non_consumable';
-            const isPacking = item.category === 'packing';
-
-            let qty;
-            if (isEquipment) {
-                qty = expItemData.quantity;
-            } else if (isPacking) {
-                qty = expItemData.quantity * expItemData.trials;
-            } else {
-                qty = expItemData.quantity * expItemData.trials;
-            }
-            const cost = qty * item.price;
-            
-            expData.push([
-                exp.id,
-                exp.name,
-                exp.category,
-                exp.trials,
-                item.name,
-                'Common',
-                qty,
-                item.unit,
-                item.price,
-                '(See Common Items sheet)'
-            ]);
+    try {
+        // The workbook is generated (and cached) server-side from the same calculation
+        const response = await authenticatedFetch('/api/calculate/export?format=xlsx', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                experiment_ids: Array.from(state.selectedExperiments),
+                item_usage_type: Object.fromEntries(state.itemUsageType),
+                item_custom_quantity: Object.fromEntries(state.itemCustomQuantity)
+            })
         });
         
-        // Add empty row between experiments
-        expData.push(['', '', '', '', '', '', '', '', '', '']);
-    });
-    
-    const ws_exp = XLSX.utils.aoa_to_sheet(expData);
-    
-    // Set column widths
-    ws_exp['!cols'] = [
-        { wch: 12 }, // Experiment ID
-        { wch: 30 }, // Experiment Name
-        { wch: 20 }, // Category
-        { wch: 8 },  // Trials
-        { wch: 40 }, // Item Name
-        { wch: 10 }, // Type
-        { wch: 10 }, // Quantity
-        { wch: 8 },  // Unit
-        { wch: 12 }, // Price/Unit
-        { wch: 15 }  // Total Cost
-    ];
-    
-    XLSX.utils.book_append_sheet(wb, ws_exp, 'Experiments & Items');
-    
-    // Sheet 3: Common Items to Procure
-    const commonData = [
-        ['Common Items to Procure'],
-        ['Item Name', 'Total Quantity', 'Unit', 'Price/Unit (₹)', 'Total Cost (₹)', 'Category', 'Used In Experiments']
-    ];
-    
-    state.currentResults.common_items.forEach(item => {
-        const customQty = state.itemCustomQuantity.get(item.id);
-        const displayQty = customQty !== undefined ? customQty : item.total_quantity;
-        const cost = displayQty * item.price;
-        const usedIn = item.experiments.map(e => e.exp_name).join(', ');
-        
-        commonData.push([
-            item.name,
-            displayQty,
-            item.unit,
-            item.price,
-            cost,
-            item.category === 'consumable' ? 'Consumable' : 'Equipment',
-            usedIn
-        ]);
-    });
-    
-    // Add total row
-    const totalCommonCost = state.currentResults.common_items.reduce((sum, item) => {
-        const customQty = state.itemCustomQuantity.get(item.id);
-        const displayQty = customQty !== undefined ? customQty : item.total_quantity;
-        return sum + (displayQty * item.price);
-    }, 0);
-    
-    commonData.push(['', '', '', 'TOTAL:', totalCommonCost, '', '']);
-    
-    const ws_common = XLSX.utils.aoa_to_sheet(commonData);
-    
-    // Set column widths for common items sheet
-    ws_common['!cols'] = [
-        { wch: 40 }, // Item Name
-        { wch: 15 }, // Total Quantity
-        { wch: 8 },  // Unit
-        { wch: 12 }, // Price/Unit
-        { wch: 15 }, // Total Cost
-        { wch: 15 }, // Category
-        { wch: 50 }  // Used In Experiments
-    ];
-    
-    XLSX.utils.book_append_sheet(wb, ws_common, 'Common Items');
-    
-    // Sheet 4: Unique Items Summary
-    const uniqueData = [
-        ['Unique Items Summary'],
-        ['Experiment', 'Item Name', 'Quantity', 'Unit', 'Price/Unit (₹)', 'Total Cost (₹)', 'Category']
-    ];
-    
-    selectedExps.forEach(exp => {
-        const uniqueItemsForExp = state.currentResults.unique_items.filter(item => 
-            item.experiments.some(e => e.exp_name === exp.name)
-        );
-        
-        uniqueItemsForExp.forEach(item => {
-            const expItemData = item.experiments.find(e => e.exp_name === exp.name);
-            const isEquipment = item.category === 'non_consumable';  // ✅ ADD THIS
-            const qty = isEquipment ? expItemData.quantity : (expItemData.quantity * expItemData.trials);  // ✅ FIX THIS
-            const cost = qty * item.price;
-            
-            uniqueData.push([
-                exp.name,
-                item.name,
-                qty,
-                item.unit,
-                item.price,
-                cost,
-                item.category === 'consumable' ? 'Consumable' : 'Equipment'
-            ]);
-        });
+        if (!response.ok) {
+            const result = await response.json().catch(() => ({}));
+            throw new Error(result.error || 'Failed to generate report');
+        }
         
-        // Add empty row between experiments
-        uniqueData.push(['', '', '', '', '', '', '']);
-    });
-    
-    // Add total row
-    const totalUniqueCost = state.currentResults.unique_items.reduce((sum, item) => {
-        return sum + item.total_cost;
-    }, 0);
-    
-    uniqueData.push(['', '', '', '', 'TOTAL:', totalUniqueCost, '']);
-    
-    const ws_unique = XLSX.utils.aoa_to_sheet(uniqueData);
-    
-    // Set column widths for unique items sheet
-    ws_unique['!cols'] = [
-        { wch: 30 }, // Experiment
-        { wch: 40 }, // Item Name
-        { wch: 10 }, // Quantity
-        { wch: 8 },  // Unit
-        { wch: 12 }, // Price/Unit
-        { wch: 15 }, // Total Cost
-        { wch: 15 }  // Category
-    ];
-    
-    XLSX.utils.book_append_sheet(wb, ws_unique, 'Unique Items');
-    
-    // Sheet 5: Procurement Summary
-    const procurementData = [
-        ['PROCUREMENT SUMMARY'],
-        [''],
-        ['Total Experiments:', state.currentResults.selected_count],
-        [''],
-        ['Common Items Cost:', totalCommonCost.toFixed(2)],
-        ['Unique Items Cost:', totalUniqueCost.toFixed(2)],
-        ['GRAND TOTAL:', state.currentResults.total_cost.toFixed(2)],
-        [''],
-        [''],
-        ['Breakdown by Category'],
-        ['Type', 'Count', 'Total Cost (₹)']
-    ];
-    
-    // Calculate breakdown
-    const commonItemsCount = state.currentResults.common_items.length;
-    const uniqueItemsCount = state.currentResults.unique_items.length;
-    
-    procurementData.push(['Common Items', commonItemsCount, totalCommonCost.toFixed(2)]);
-    procurementData.push(['Unique Items', uniqueItemsCount, totalUniqueCost.toFixed(2)]);
-    procurementData.push(['TOTAL', commonItemsCount + uniqueItemsCount, state.currentResults.total_cost.toFixed(2)]);
-    
-    const ws_procurement = XLSX.utils.aoa_to_sheet(procurementData);
-    
-    // Set column widths for procurement summary
-    ws_procurement['!cols'] = [
-        { wch: 25 },
-        { wch: 15 },
-        { wch: 20 }
-    ];
-    
-    XLSX.utils.book_append_sheet(wb, ws_procurement, 'Procurement Summary');
-    
-    // Save the file
-    const fileName = `lab_procurement_${new Date().toISOString().split('T')[0]}.xlsx`;
-    XLSX.writeFile(wb, fileName);
-    
-    showSuccess('Excel file downloaded successfully');
+        const blob = await response.blob();
+        const url = URL.createObjectURL(blob);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `lab_procurement_${new Date().toISOString().split('T')[0]}.xlsx`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        URL.revokeObjectURL(url);
+        
+        showSuccess('Excel file downloaded successfully');
+    } catch (error) {
+        console.error('Error exporting report:', error);
+        showError('Failed to export report: ' + error.message);
+    }
 }
 
 // ==================== RENDERING ====================
@@ -2131,35 +2040,24 @@ function saveModalItem() {
 
 async function createExperimentWithItems(name, category, trials, grade) {
     try {
-        const response = await authenticatedFetch('/api/experiments', {
+        // One request creates the experiment and all its items atomically
+        const response = await authenticatedFetch('/api/experiments:batch', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ name, category, trials, grade })
+            body: JSON.stringify({
+                experiments: [{
+                    name, category, trials, grade,
+                    items: { add: state.modalItems.map(modalItemData) }
+                }]
+            })
         });
         
-        if (!response.ok) throw new Error('Failed to create experiment');
-        
-        const newExp = await response.json();
-        
-        for (const item of state.modalItems) {
-            const itemData = {
-                name: item.name,
-                quantity: item.quantity,
-                unit: item.unit,
-                price: item.price,
-                category: item.category
-            };
-            
-            const itemResponse = await authenticatedFetch(`/api/experiments/${newExp.id}/items`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(itemData)
-            });
-            
-            if (!itemResponse.ok) throw new Error('Failed to add item');
+        if (!response.ok) {
+            const result = await response.json().catch(() => ({}));
+            throw new Error(result.error || 'Failed to create experiment');
         }
         
-        await loadExperiments(); // Refresh after create
+        await syncChanges(); // Patch in the create instead of refetching
         showSuccess(`Experiment "${name}" created with ${state.modalItems.length} items (${trials} trials)`);
     } catch (error) {
         console.error('Error creating experiment with items:', error);
@@ -2167,59 +2065,42 @@ async function createExperimentWithItems(name, category, trials, grade) {
     }
 }
 
+function modalItemData(item) {
+    return {
+        name: item.name,
+        quantity: item.quantity,
+        unit: item.unit,
+        price: item.price,
+        category: item.category
+    };
+}
+
 async function updateExperimentWithItems(expId, name, category, trials, grade) {
     try {
-        await authenticatedFetch(`/api/experiments/${expId}`, {
-            method: 'PUT',
+        const exp = state.experiments.find(e => e.id === expId);
+        const remove = exp.items
+            .filter(oldItem => !state.modalItems.find(i => i.id === oldItem.id))
+            .map(oldItem => oldItem.id);
+        const add = state.modalItems
+            .filter(item => item.id.startsWith('ITM_TEMP_'))
+            .map(modalItemData);
+        const update = state.modalItems
+            .filter(item => !item.id.startsWith('ITM_TEMP_'))
+            .map(item => ({ id: item.id, ...modalItemData(item) }));
+        
+        // Fields and the whole item diff go in one PATCH, applied all-or-nothing
+        const response = await authenticatedFetch(`/api/experiments/${expId}`, {
+            method: 'PATCH',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ name, category, trials, grade })
+            body: JSON.stringify({ name, category, trials, grade, items: { add, update, remove } })
         });
         
-        const exp = state.experiments.find(e => e.id === expId);
-        const oldItems = exp.items;
-        
-        for (const oldItem of oldItems) {
-            const stillExists = state.modalItems.find(i => i.id === oldItem.id);
-            if (!stillExists) {
-                await authenticatedFetch(`/api/experiments/${expId}/items/${oldItem.id}`, {
-                    method: 'DELETE'
-                });
-            }
-        }
-        
-        for (const item of state.modalItems) {
-            if (item.id.startsWith('ITM_TEMP_')) {
-                const itemData = {
-                    name: item.name,
-                    quantity: item.quantity,
-                    unit: item.unit,
-                    price: item.price,
-                    category: item.category
-                };
-                
-                await authenticatedFetch(`/api/experiments/${expId}/items`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(itemData)
-                });
-            } else {
-                const itemData = {
-                    name: item.name,
-                    quantity: item.quantity,
-                    unit: item.unit,
-                    price: item.price,
-                    category: item.category
-                };
-                
-                await authenticatedFetch(`/api/experiments/${expId}/items/${item.id}`, {
-                    method: 'PUT',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(itemData)
-                });
-            }
+        if (!response.ok) {
+            const result = await response.json().catch(() => ({}));
+            throw new Error(result.error || 'Failed to update experiment');
         }
         
-        await loadExperiments(); // Refresh after update
+        await syncChanges(); // Patch in the update instead of refetching
         showSuccess('Experiment updated successfully');
     } catch (error) {
         console.error('Error updating experiment with items:', error);
@@ -2783,7 +2664,7 @@ async function addItemToExperiment(expId, itemData) {
             throw new Error(error.error || 'Failed to add item');
         }
         
-        await loadExperiments(); // Refresh after add
+        await syncChanges(); // Patch in the add instead of refetching
         showSuccess('Item added successfully');
     } catch (error) {
         console.error('Error adding item:', error);
@@ -2801,7 +2682,7 @@ async function updateItem(expId, itemId, itemData) {
         
         if (!response.ok) throw new Error('Failed to update item');
         
-        await loadExperiments(); // Refresh after update
+        await syncChanges(); // Patch in the update instead of refetching
         showSuccess('Item updated successfully');
     } catch (error) {
         console.error('Error updating item:', error);
@@ -0,0 +1,469 @@
+"""
+Pluggable storage engines for experiments, items, categories and users
+
+STORAGE_ENGINE=json   (default) keeps the original JSON files
+STORAGE_ENGINE=sqlite stores rows in SQLITE_PATH with row-level upserts
+
+The JSON engine batches writes and flushes them atomically at most every
+PERSIST_FLUSH_INTERVAL_MS milliseconds (0 = write synchronously). With
+PERSIST_JOURNAL=1 (default) every mutation is first appended to JOURNAL_FILE,
+and snapshots are compacted every JOURNAL_COMPACT_INTERVAL_MS instead.
+BINARY_SNAPSHOTS=1 keeps a binary copy next to each data file for fast
+start-up (see serialization).
+
+Import the current JSON files into SQLite once with:
+    python storage.py import [--db lab_data.sqlite3]
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+import serialization
+from journal import MutationJournal, replay
+from persistence import WriteBehindWriter, atomic_write, write_binary_snapshot
+from records import json_default
+
+USERS_FILE = "users.json"
+EXPERIMENTS_FILE = 'experiments.json'
+ITEMS_FILE = 'items.json'
+CATEGORIES_FILE = 'exp_catagories.json'
+SQLITE_FILE = 'lab_data.sqlite3'
+JOURNAL_FILE = 'journal.jsonl'
+
+
+# ==================== FILE HELPERS ====================
+
+def load_json_file(filepath, default_value):
+    if os.path.exists(filepath):
+        try:
+            with open(filepath, 'rb') as f:
+                return serialization.loads(f.read())
+        except Exception as e:
+            print(f"Error loading {filepath}: {e}")
+            return default_value
+    return default_value
+
+
+# ==================== JSON ENGINE ====================
+
+class JSONStorage:
+    """Whole-file JSON storage; row writes mark their collection for a debounced rewrite"""
+
+    name = 'json'
+
+    def __init__(self, experiments_file=EXPERIMENTS_FILE, items_file=ITEMS_FILE,
+                 categories_file=CATEGORIES_FILE, users_file=USERS_FILE, flush_interval_ms=0,
+                 journal=None, binary_snapshots=False):
+        self.experiments_file = experiments_file
+        self.items_file = items_file
+        self.categories_file = categories_file
+        self.users_file = users_file
+        self.binary_kinds = {}
+        if binary_snapshots:
+            self.binary_kinds = {experiments_file: 'experiments', items_file: 'items',
+                                 categories_file: 'categories'}
+        self._json_loaded = {}  # path -> stamp of the JSON file read on the last load
+        # Shared by request handlers and writers so a file is never dumped mid-mutation
+        self.lock = threading.RLock()
+        self._experiments = {}
+        self._items_data = {'items': []}
+        self._categories_data = {'categories': []}
+        self.journal = journal
+        self._batch = None
+        self.writer = WriteBehindWriter(self.lock, flush_interval_ms, journal, self.binary_kinds)
+        self.writer.start()
+
+    # The JSON engine persists the live collections it handed out on load;
+    # row arguments only tell it which collection changed.
+
+    def _load(self, path, default_value):
+        kind = self.binary_kinds.get(path)
+        if kind is not None:
+            data = serialization.read_binary_snapshot(path, kind)
+            if data is not None:
+                self._json_loaded.pop(path, None)
+                return data
+        # Taken before reading, so a rewrite in between can only make the stamp stale
+        self._json_loaded[path] = serialization.file_stamp(path)
+        return load_json_file(path, default_value)
+
+    def load_experiments(self):
+        self._experiments = self._load(self.experiments_file, {})
+        return self._experiments
+
+    def load_items(self):
+        self._items_data = self._load(self.items_file, {'items': []})
+        return self._items_data
+
+    def load_categories(self):
+        self._categories_data = self._load(self.categories_file, {'categories': []})
+        return self._categories_data
+
+    def save_binary_snapshots(self):
+        """Write binary snapshots for collections just read from JSON (call once they hold records)
+
+        Skipped for files with pending writes: the next flush writes both.
+        """
+        collections = {self.experiments_file: self._experiments, self.items_file: self._items_data,
+                       self.categories_file: self._categories_data}
+        with self.lock:
+            for path, stamp in list(self._json_loaded.items()):
+                kind = self.binary_kinds.get(path)
+                if kind is None or stamp is None or self.writer.is_dirty(path) or stamp != serialization.file_stamp(path):
+                    continue
+                payload = serialization.encode_binary(kind, collections[path])
+                if payload is not None:
+                    write_binary_snapshot(path, payload)
+            self._json_loaded.clear()
+
+    def load_users(self):
+        try:
+            with open(self.users_file, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def users_stamp(self):
+        """Changes whenever users.json is rewritten (including by hand or another process)"""
+        try:
+            st = os.stat(self.users_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def replay_journal(self, experiments, items_data, categories_data):
+        """Re-apply journaled mutations that never made it into a snapshot"""
+        if self.journal is None:
+            return 0
+        entries = self.journal.entries()
+        touched = replay(entries, experiments, items_data, categories_data)
+        if 'experiments' in touched:
+            self.writer.mark_dirty(self.experiments_file, self._experiments)
+        if 'items' in touched:
+            self.writer.mark_dirty(self.items_file, self._items_data)
+        if 'categories' in touched:
+            self.writer.mark_dirty(self.categories_file, self._categories_data)
+        return len(entries)
+
+    @contextmanager
+    def batch(self, atomic=False):
+        """Group row writes into one journal append and one dirty mark per file
+
+        With atomic=True nothing is persisted if the block raises; the caller
+        puts the in-memory state back itself.
+        """
+        with self.lock:
+            if self._batch is not None:
+                yield
+                return
+            # Every row write happens under self.lock, so one pending batch is enough
+            self._batch = {'entries': [], 'files': {}}
+            completed = False
+            try:
+                yield
+                completed = True
+            finally:
+                batch, self._batch = self._batch, None
+                # In-memory state already changed, so persist whatever was applied
+                if completed or not atomic:
+                    if batch['entries'] and self.journal is not None:
+                        self.journal.append_many(batch['entries'])
+                    for path, data in batch['files'].items():
+                        self.writer.mark_dirty(path, data)
+
+    def _write(self, op, payload, path, data):
+        if self._batch is not None:
+            self._batch['entries'].append((op, payload))
+            self._batch['files'][path] = data
+            return
+        if self.journal is not None:
+            self.journal.append(op, payload)
+        self.writer.mark_dirty(path, data)
+
+    def save_experiment(self, experiment):
+        self._write('experiment.save', experiment, self.experiments_file, self._experiments)
+
+    def delete_experiment(self, exp_id):
+        self._write('experiment.delete', {'id': exp_id}, self.experiments_file, self._experiments)
+
+    def save_item(self, item):
+        self._write('item.save', item, self.items_file, self._items_data)
+
+    def save_category(self, category):
+        self._write('category.save', category, self.categories_file, self._categories_data)
+
+    def save_users(self, users):
+        # Credentials are written through immediately
+        with self.lock:
+            atomic_write(self.users_file, json.dumps(users, indent=2))
+
+    def flush(self):
+        """Write pending collections now and return the flush metrics"""
+        self.writer.flush()
+        return self.persistence_metrics()
+
+    def persistence_metrics(self):
+        metrics = dict(self.writer.metrics(), engine=self.name)
+        if self.journal is not None:
+            metrics['journal_appends'] = self.journal.appended
+        return metrics
+
+    def close(self):
+        self.writer.stop()
+        if self.journal is not None:
+            self.journal.close()
+
+    def make_synchronous(self):
+        """Persist on every write (needed when other processes read the files)"""
+        self.writer.stop()
+        self.writer.interval = 0
+
+    def after_fork(self):
+        self.writer.after_fork()
+
+
+# ==================== SQLITE ENGINE ====================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    category TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_experiments_category ON experiments(category);
+
+CREATE TABLE IF NOT EXISTS items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name_lower TEXT NOT NULL,
+    category TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_name ON items(name_lower);
+CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
+
+CREATE TABLE IF NOT EXISTS categories (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    subject TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_categories_subject_name ON categories(subject, name);
+
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStorage:
+    """SQLite storage in WAL mode; every write is a single-row upsert in its own transaction"""
+
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Commit after the block, unless an enclosing batch() will commit"""
+        conn = self._connect()
+        if getattr(self._local, 'in_batch', False):
+            yield conn
+            return
+        with metrics.timer('sqlite_transaction'), conn:
+            yield conn
+
+    @contextmanager
+    def batch(self, atomic=False):
+        """Run several row writes in one transaction; atomic=True rolls it back if the block raises"""
+        if getattr(self._local, 'in_batch', False):
+            yield
+            return
+        with self.lock:
+            self._local.in_batch = True
+            completed = False
+            try:
+                yield
+                completed = True
+            finally:
+                self._local.in_batch = False
+                if not completed and atomic:
+                    self._connect().rollback()
+                else:
+                    # In-memory state already changed, so commit whatever was applied
+                    with metrics.timer('sqlite_transaction'):
+                        self._connect().commit()
+
+    def _rows(self, sql):
+        return [json.loads(row[0]) for row in self._connect().execute(sql)]
+
+    def load_experiments(self):
+        return {exp['id']: exp for exp in self._rows('SELECT data FROM experiments ORDER BY seq')}
+
+    def load_items(self):
+        return {'items': self._rows('SELECT data FROM items ORDER BY seq')}
+
+    def load_categories(self):
+        return {'categories': self._rows('SELECT data FROM categories ORDER BY seq')}
+
+    def load_users(self):
+        conn = self._connect()
+        return {
+            username: json.loads(data)
+            for username, data in conn.execute('SELECT username, data FROM users ORDER BY seq')
+        }
+
+    def users_stamp(self):
+        # User writes go through save_users (or a shared-state reload), which refresh the cache
+        return None
+
+    def replay_journal(self, experiments, items_data, categories_data):
+        """SQLite commits every row itself; there is no journal to replay"""
+        return 0
+
+    def save_binary_snapshots(self):
+        """Binary snapshots are a JSON-engine feature"""
+
+    def flush(self):
+        """Every write is already committed; nothing is buffered"""
+        return self.persistence_metrics()
+
+    def persistence_metrics(self):
+        return {'engine': self.name}
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def make_synchronous(self):
+        """Every write already commits before returning"""
+
+    def after_fork(self):
+        # SQLite connections must not be shared with the parent process
+        self._local = threading.local()
+
+    def save_experiment(self, experiment):
+        with self.lock, self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO experiments (id, name, category, data) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET name=excluded.name, category=excluded.category, data=excluded.data',
+                (experiment['id'], experiment['name'], experiment.get('category', ''), json.dumps(experiment, default=json_default))
+            )
+
+    def delete_experiment(self, exp_id):
+        with self.lock, self._transaction() as conn:
+            conn.execute('DELETE FROM experiments WHERE id = ?', (exp_id,))
+
+    def save_item(self, item):
+        with self.lock, self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO items (id, name_lower, category, data) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET name_lower=excluded.name_lower, category=excluded.category, data=excluded.data',
+                (item['id'], item['name'].lower(), item.get('category', 'consumable'), json.dumps(item, default=json_default))
+            )
+
+    def save_category(self, category):
+        with self.lock, self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO categories (id, subject, name, data) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET subject=excluded.subject, name=excluded.name, data=excluded.data',
+                (category['id'], category['subject'], category['name'], json.dumps(category))
+            )
+
+    def save_users(self, users):
+        with self.lock, self._transaction() as conn:
+            names = list(users.keys())
+            conn.execute(
+                f"DELETE FROM users WHERE username NOT IN ({', '.join('?' * len(names))})", names
+            )
+            conn.executemany(
+                'INSERT INTO users (username, data) VALUES (?, ?) '
+                'ON CONFLICT(username) DO UPDATE SET data=excluded.data',
+                [(username, json.dumps(data)) for username, data in users.items()]
+            )
+
+
+# ==================== CONFIGURATION ====================
+
+def create_storage(engine=None):
+    """Create the storage engine selected by STORAGE_ENGINE (json or sqlite)"""
+    engine = engine or os.environ.get('STORAGE_ENGINE', 'json')
+    if engine == 'json':
+        if os.environ.get('PERSIST_JOURNAL', '1') == '1':
+            journal = MutationJournal(
+                os.environ.get('JOURNAL_FILE', JOURNAL_FILE),
+                history_path=os.environ.get('JOURNAL_HISTORY_FILE')
+            )
+            interval_ms = int(os.environ.get('JOURNAL_COMPACT_INTERVAL_MS', 10000))
+        else:
+            journal = None
+            interval_ms = int(os.environ.get('PERSIST_FLUSH_INTERVAL_MS', 500))
+        return JSONStorage(flush_interval_ms=interval_ms, journal=journal,
+                           binary_snapshots=os.environ.get('BINARY_SNAPSHOTS') == '1')
+    if engine == 'sqlite':
+        return SQLiteStorage(os.environ.get('SQLITE_PATH', SQLITE_FILE))
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+
+def import_json_files(target, source=None):
+    """One-shot copy of every JSON collection into another storage engine"""
+    source = source or JSONStorage()
+    experiments = source.load_experiments()
+    items_data = source.load_items()
+    categories_data = source.load_categories()
+    users = source.load_users()
+
+    for item in items_data['items']:
+        target.save_item(item)
+    for category in categories_data['categories']:
+        target.save_category(category)
+    for experiment in experiments.values():
+        target.save_experiment(experiment)
+    if users:
+        target.save_users(users)
+
+    return {
+        'experiments': len(experiments),
+        'items': len(items_data['items']),
+        'categories': len(categories_data['categories']),
+        'users': len(users)
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Lab cost estimator storage tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import the JSON files into SQLite')
+    import_parser.add_argument('--db', default=os.environ.get('SQLITE_PATH', SQLITE_FILE))
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        counts = import_json_files(SQLiteStorage(args.db))
+        print(f"Imported into {args.db}: " + ', '.join(f"{v} {k}" for k, v in counts.items()))
@@ -0,0 +1,71 @@
+"""
+Shared fixtures: the Flask app running on a scratch copy of the data files
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+DATA_FILES = ('experiments.json', 'items.json', 'exp_catagories.json', 'users.json')
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A scratch copy of the data files, made the working directory"""
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(REPO, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def open_storage(engine):
+    """A storage engine over the data files in the working directory"""
+    import storage
+    if engine == 'sqlite':
+        sqlite_storage = storage.SQLiteStorage(storage.SQLITE_FILE)
+        if not sqlite_storage.load_experiments():
+            storage.import_json_files(sqlite_storage)
+        return sqlite_storage
+    return storage.create_storage('json')
+
+
+@pytest.fixture
+def lab(data_dir, monkeypatch):
+    """Factory: point app at a fresh storage engine (json or sqlite) and load its data"""
+    import app
+    from user_store import UserStore
+
+    opened = []
+
+    def start(engine='json'):
+        engine_storage = open_storage(engine)
+        opened.append(engine_storage)
+        monkeypatch.setattr(app, 'storage', engine_storage)
+        monkeypatch.setattr(app, 'user_store', UserStore(engine_storage, 0))
+        monkeypatch.setattr(app, 'dataset', None)
+        app.reload_data()
+        return app
+
+    yield start
+    for engine_storage in opened:
+        engine_storage.close()
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage_engine(request):
+    return request.param
+
+
+@pytest.fixture
+def client(lab, storage_engine):
+    """Test client logged in as admin, on each storage engine"""
+    app = lab(storage_engine)
+    test_client = app.create_app({'SECRET_KEY': 'test'}).test_client()
+    with test_client.session_transaction() as session:
+        session['username'] = 'admin'
+    return test_client
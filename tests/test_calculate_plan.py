@@ -0,0 +1,63 @@
+"""
+POST /api/calculate/plan: section scaling, filters, validation
+"""
+
+import pytest
+
+
+def plan(client, **body):
+    response = client.post('/api/calculate/plan', json=body)
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def test_one_section_matches_calculate(client):
+    payload = plan(client, grades=[8])
+    exp_ids = [experiment['id'] for experiment in payload['experiments']]
+    assert payload['sections'] == {'8': 1} and payload['experiment_count'] == len(exp_ids) > 0
+    calculated = client.post('/api/calculate', json={'experiment_ids': exp_ids}).get_json()
+    assert payload['total_cost'] == calculated['total_cost']
+    assert payload['consumable_cost'] + payload['equipment_cost'] == pytest.approx(payload['total_cost'], abs=0.02)
+
+
+def test_sections_scale_consumables_only(client):
+    one = plan(client, sections={'8': 1})
+    three = plan(client, sections={'8': 3})
+    assert three['equipment_cost'] == one['equipment_cost']
+    assert three['consumable_cost'] == pytest.approx(3 * one['consumable_cost'], abs=0.05)
+    assert all(experiment['total_trials'] == 3 * experiment['trials'] for experiment in three['experiments'])
+
+
+def test_experiment_in_several_grades_adds_their_sections(client):
+    import app
+    exp_id, experiment = next((exp_id, experiment) for exp_id, experiment in app.dataset.experiments_db.items()
+                              if len(experiment.get('grade', [])) > 1)
+    grades = [str(grade) for grade in experiment['grade'][:2]]
+    payload = plan(client, sections={grades[0]: 2, grades[1]: 3})
+    planned = next(planned for planned in payload['experiments'] if planned['id'] == exp_id)
+    assert planned['sections'] == 5
+
+
+def test_category_filter(client):
+    import app
+    category_id = next(iter(app.dataset.experiments_db.values()))['category']
+    payload = plan(client, sections={'8': 1}, category_ids=[category_id])
+    assert all(app.dataset.experiments_db[experiment['id']]['category'] == category_id
+               for experiment in payload['experiments'])
+    empty = plan(client, sections={'8': 1}, category_ids=[])
+    assert empty['experiment_count'] == 0 and empty['items'] == [] and empty['total_cost'] == 0
+
+
+@pytest.mark.parametrize('body, message', [
+    ([8], 'Request body must be a JSON object'),
+    ({}, 'Select at least one grade'),
+    ({'sections': [8]}, "'sections' must be an object"),
+    ({'sections': {'8': 0}}, 'Section counts must be positive integers'),
+    ({'sections': {'8': True}}, 'Section counts must be positive integers'),
+    ({'grades': [6], 'sections': {'8': 2}}, 'Sections given for grade 8, which is not in grades'),
+    ({'grades': [8], 'category_ids': 'CAT0001'}, "'category_ids' must be a list"),
+])
+def test_invalid_requests(client, body, message):
+    response = client.post('/api/calculate/plan', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == message
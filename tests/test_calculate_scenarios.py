@@ -0,0 +1,75 @@
+"""
+POST /api/calculate/scenarios: rows against /api/calculate, validation
+"""
+
+import pytest
+
+
+def selection(app):
+    return list(app.dataset.experiments_db)
+
+
+def post(client, experiment_ids, scenarios, **fields):
+    return client.post('/api/calculate/scenarios',
+                       json=dict(fields, experiment_ids=experiment_ids, scenarios=scenarios))
+
+
+def test_rows_match_calculate(client):
+    import app
+    exp_ids = selection(app)
+    item_ids = [item['id'] for item in app.dataset.items_data['items']]
+    calculated = client.post('/api/calculate', json={'experiment_ids': exp_ids}).get_json()
+    usage = {item_ids[0]: 'common'}
+    overlaid = client.post('/api/calculate', json={'experiment_ids': exp_ids, 'item_usage_type': usage,
+                                                   'item_custom_quantity': {item_ids[0]: 10000}}).get_json()
+
+    response = post(client, exp_ids, [
+        {'name': 'Same'},
+        {'name': 'Free', 'price_multipliers': {item_id: 0 for item_id in item_ids}},
+        {'item_usage_type': usage, 'item_custom_quantity': {item_ids[0]: 10000}}
+    ])
+    assert response.status_code == 200, response.data
+    payload = response.get_json()
+    assert payload['selected_count'] == len(exp_ids)
+    rows = [dict(zip(payload['columns'], row)) for row in payload['rows']]
+    assert [row['name'] for row in rows] == ['Baseline', 'Same', 'Free', 'Scenario 3']
+
+    baseline, same, free, overlay = rows
+    assert baseline['total_cost'] == same['total_cost'] == calculated['total_cost']
+    assert same['delta'] == 0 and same['delta_percent'] == 0
+    assert free['total_cost'] == 0 and free['delta_percent'] == -100
+    assert overlay['total_cost'] == overlaid['total_cost']
+    assert overlay['common_cost'] + overlay['unique_cost'] == pytest.approx(overlay['total_cost'], abs=0.02)
+
+
+def test_trials_scale_consumables(client):
+    import app
+    exp_id = selection(app)[0]
+    trials = app.dataset.experiments_db[exp_id].get('trials', 1)
+    rows = post(client, [exp_id], [{'trials': {exp_id: trials * 3}}]).get_json()['rows']
+    assert rows[1][1] > rows[0][1]
+
+
+@pytest.mark.parametrize('body, status, message', [
+    ([1, 2], 400, 'Request body must be a JSON object'),
+    ({'experiment_ids': ['EXP001'], 'scenarios': []}, 400, 'scenarios must be a non-empty list'),
+    ({'experiment_ids': ['EXP999'], 'scenarios': [{}]}, 404, 'Experiment EXP999 not found'),
+    ({'experiment_ids': ['EXP001'], 'scenarios': ['cheap']}, 400, 'Scenario 1: Each scenario must be an object'),
+    ({'experiment_ids': ['EXP001'], 'scenarios': [{}, {'discount': 1}]}, 400, "Scenario 2: Unknown field 'discount'"),
+    ({'experiment_ids': ['EXP001'], 'scenarios': [{'trials': {'EXP002': 2}}]}, 400,
+     'Scenario 1: Experiment EXP002 is not in the selection'),
+    ({'experiment_ids': ['EXP001'], 'scenarios': [{'price_multipliers': {'ITM002': -1}}]}, 400,
+     'Scenario 1: Price multipliers must be non-negative numbers'),
+])
+def test_invalid_requests(client, body, status, message):
+    response = client.post('/api/calculate/scenarios', json=body)
+    assert response.status_code == status
+    assert response.get_json()['error'] == message
+
+
+def test_scenario_count_is_capped(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'MAX_SCENARIOS', 2)
+    response = post(client, selection(app), [{}, {}, {}])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'At most 2 scenarios per request'
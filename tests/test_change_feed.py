@@ -0,0 +1,98 @@
+"""
+/api/changes and its SSE stream: deltas since a cursor, resets, rolled-back batches
+"""
+
+from change_feed import ChangeFeed
+
+
+def cursor(client):
+    payload = client.get('/api/changes').get_json()
+    assert payload['changes'] == [] and not payload['reset']
+    return payload['epoch'], payload['version']
+
+
+def changes(client, epoch, version):
+    return client.get(f'/api/changes?since={version}&epoch={epoch}').get_json()
+
+
+def test_each_changed_record_appears_once_with_its_current_data(client):
+    import app
+    epoch, version = cursor(client)
+    edited_id, deleted_id = list(app.dataset.experiments_db)[:2]
+    item_id = app.dataset.items_data['items'][0]['id']
+
+    client.patch(f'/api/experiments/{edited_id}', json={'name': 'First name'})
+    client.patch(f'/api/experiments/{edited_id}', json={'name': 'Second name'})
+    client.put(f'/api/items/{item_id}/price', json={'price': 4.25})
+    client.delete(f'/api/experiments/{deleted_id}')
+
+    payload = changes(client, epoch, version)
+    assert not payload['reset'] and payload['epoch'] == epoch and payload['version'] > version
+    by_id = {change['id']: change for change in payload['changes']}
+    assert len(by_id) == len(payload['changes']) == 3
+    assert by_id[edited_id]['op'] == 'upsert' and by_id[edited_id]['data']['name'] == 'Second name'
+    assert by_id[item_id]['type'] == 'item' and by_id[item_id]['data']['price_per_unit'] == 4.25
+    assert by_id[deleted_id] == {'type': 'experiment', 'op': 'delete', 'id': deleted_id, 'data': None}
+
+    # Caught up: nothing more
+    assert changes(client, epoch, payload['version'])['changes'] == []
+
+
+def test_unusable_cursors_ask_for_a_refetch(client):
+    epoch, version = cursor(client)
+    assert changes(client, 'other-epoch', version)['reset']
+    assert changes(client, epoch, version + 5)['reset']
+    assert client.get('/api/changes?since=abc').status_code == 400
+
+    assert client.post('/api/admin/reload').status_code == 200
+    payload = changes(client, epoch, version)
+    assert payload['reset'] and payload['epoch'] != epoch
+
+
+def test_feed_drops_entries_beyond_its_size():
+    feed = ChangeFeed(max_entries=2)
+    for doc_id in ('a', 'b', 'c'):
+        feed.record('item', 'upsert', doc_id)
+    epoch, version = feed.cursor()
+    assert feed.since(0, epoch)[2] is None
+    assert [entry[3] for entry in feed.since(1, epoch)[2]] == ['b', 'c']
+
+
+def test_rolled_back_batch_reports_the_restored_records(client):
+    import app
+    epoch, version = cursor(client)
+    exp_id = next(iter(app.dataset.experiments_db))
+    name = app.dataset.experiments_db[exp_id]['name']
+    response = client.post('/api/experiments:batch', json={'experiments': [
+        {'name': 'Rolled back', 'items': {'add': [{'name': 'Rolled back reagent'}]}},
+        {'id': exp_id, 'name': 'Renamed'},
+        {'id': 'EXP999'}
+    ]})
+    assert response.status_code == 404
+
+    # The edited experiment is back to its old data; what the batch created is gone
+    by_op = {}
+    for change in changes(client, epoch, version)['changes']:
+        by_op.setdefault((change['type'], change['op']), []).append(change)
+    assert set(by_op) == {('experiment', 'upsert'), ('experiment', 'delete'), ('item', 'delete')}
+    [restored] = by_op['experiment', 'upsert']
+    assert restored['id'] == exp_id and restored['data']['name'] == name
+    [created] = by_op['experiment', 'delete']
+    assert created['id'] not in app.dataset.experiments_db
+    assert app.dataset.catalog.get_item(by_op['item', 'delete'][0]['id']) is None
+
+
+def test_stream_sends_pending_changes_as_one_event(client):
+    import app
+    epoch, version = cursor(client)
+    exp_id = next(iter(app.dataset.experiments_db))
+
+    idle = client.get(f'/api/changes/stream?since={version}&epoch={epoch}')
+    assert idle.mimetype == 'text/event-stream'
+    assert idle.get_data(as_text=True) == f"retry: {app.SSE_RETRY_MS}\n\n"
+
+    client.patch(f'/api/experiments/{exp_id}', json={'name': 'Streamed'})
+    # A reconnecting EventSource resumes from the last event id
+    body = client.get('/api/changes/stream', headers={'Last-Event-ID': f'{epoch}:{version}'}).get_data(as_text=True)
+    assert f"id: {epoch}:{version + 1}\nevent: changes\n" in body
+    assert '"Streamed"' in body
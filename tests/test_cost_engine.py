@@ -0,0 +1,144 @@
+"""
+Parity: cost_engine.aggregate vs the original nested-loop aggregate_reference
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cost_engine
+from cost_engine import Scenario, aggregate, aggregate_reference, evaluate_scenarios
+from records import compact_experiment, compact_item
+
+
+def build_dataset(n_experiments=60, items_per_experiment=25, seed=7):
+    rng = random.Random(seed)
+    items = {
+        f"ITM{i:04d}": {
+            'id': f"ITM{i:04d}",
+            'name': f"Reagent {i}",
+            'price_per_unit': rng.choice([2, 0.2, 1.66667, 7.5, 4500]),
+            'unit': rng.choice(['g', 'ml', 'pcs']),
+            'category': rng.choice(['consumable', 'non_consumable', 'packing'])
+        }
+        for i in range(1, 301)
+    }
+    item_ids = list(items)
+    experiments = []
+    for e in range(n_experiments):
+        exp_items = [
+            # Ints, floats and 1 vs 1.0 ties, so JSON number types are exercised too
+            {'id': rng.choice(item_ids), 'quantity': rng.choice([1, 1.0, 2, 4, 0.5, 1.5, 12.25, 30])}
+            for _ in range(items_per_experiment)
+        ]
+        exp_items.append({'id': 'ITM_MISSING', 'quantity': 1})
+        experiments.append({
+            'id': f"EXP{e:03d}",
+            'name': f"Experiment {e}",
+            'trials': rng.choice([1, 2, 3, 5, 2.5]),
+            'items': exp_items
+        })
+    return experiments, items
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def engine(request, monkeypatch):
+    if request.param == 'numpy':
+        if cost_engine.np is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(cost_engine, 'np', None)
+    return request.param
+
+
+def assert_parity(result, experiments, get_item):
+    ref_map, ref_required = aggregate_reference(experiments, get_item)
+    assert list(result.item_ids) == list(ref_map)
+    assert result.item_map == ref_map
+    assert list(result.item_map) == list(ref_map)
+    for item_id, item_data in ref_map.items():
+        assert result.entry_counts[result.item_ids.index(item_id)] == len(item_data['experiments'])
+    assert list(result.required) == list(ref_required)
+    for item_id, qty in ref_required.items():
+        # Exact value and exact type, so the JSON response is byte-identical
+        assert repr(result.required[item_id]) == repr(qty), item_id
+
+
+def test_parity_with_reference(engine):
+    experiments, items = build_dataset()
+    assert_parity(aggregate(experiments, items.get), experiments, items.get)
+
+
+def test_parity_with_records(engine):
+    experiments, items = build_dataset(seed=11)
+    records = [compact_experiment(dict(exp, items=[dict(i) for i in exp['items']])) for exp in experiments]
+    item_records = {item_id: compact_item(dict(item)) for item_id, item in items.items()}
+    result = aggregate(records, item_records.get)
+    assert_parity(result, experiments, items.get)
+    # Dropping missing items must not touch the records' own lists
+    assert [len(exp['items']) for exp in records] == [len(exp['items']) for exp in experiments]
+
+
+def test_trial_multipliers_match_scaled_trials(engine):
+    experiments, items = build_dataset(seed=3)
+    multipliers = [1 + i % 4 for i in range(len(experiments))]
+    scaled = [dict(exp, trials=exp['trials'] * m) for exp, m in zip(experiments, multipliers)]
+    assert_parity(aggregate(experiments, items.get, trial_multipliers=multipliers), scaled, items.get)
+
+
+def test_duplicate_items_and_empty_selection(engine):
+    items = {'ITM1': {'id': 'ITM1', 'name': 'Beaker', 'price_per_unit': 3, 'unit': 'pcs',
+                      'category': 'non_consumable'},
+             'ITM2': {'id': 'ITM2', 'name': 'Salt', 'price_per_unit': 0.5, 'unit': 'g'}}
+    experiments = [
+        {'id': 'EXP1', 'name': 'A', 'trials': 2,
+         'items': [{'id': 'ITM2', 'quantity': 3}, {'id': 'ITM1', 'quantity': 1}, {'id': 'ITM2', 'quantity': 1.5}]},
+        {'id': 'EXP2', 'name': 'B', 'items': [{'id': 'GONE', 'quantity': 1}, {'id': 'ITM1', 'quantity': 2}]},
+        {'id': 'EXP3', 'name': 'C', 'trials': 1, 'items': []}
+    ]
+    result = aggregate(experiments, items.get)
+    assert_parity(result, experiments, items.get)
+    assert result.required == {'ITM2': 9.0, 'ITM1': 2}
+
+    # Equal maxima keep the first entry's type, as max() does
+    ties = [{'id': 'EXP1', 'name': 'A', 'items': [{'id': 'ITM1', 'quantity': 1.0}]},
+            {'id': 'EXP2', 'name': 'B', 'items': [{'id': 'ITM1', 'quantity': 1}]}]
+    assert repr(aggregate(ties, items.get).required['ITM1']) == '1.0'
+    assert repr(aggregate(ties[::-1], items.get).required['ITM1']) == '1'
+
+    empty = aggregate([], items.get)
+    assert empty.item_ids == [] and empty.required == {} and empty.item_map == {}
+
+
+def test_scenarios_match_pure_python(monkeypatch):
+    if cost_engine.np is None:
+        pytest.skip('numpy is not installed')
+    experiments, items = build_dataset(seed=5)
+    rng = random.Random(5)
+    exp_ids = [exp['id'] for exp in experiments]
+    item_ids = list(items)
+    scenarios = [
+        Scenario(f"S{i}",
+                 trials={rng.choice(exp_ids): rng.choice([0, 1, 4, 2.5]) for _ in range(i % 4)},
+                 price_multipliers={rng.choice(item_ids): 1.5},
+                 category_price_multipliers={'consumable': 1 + i / 50},
+                 item_usage_type={rng.choice(item_ids): rng.choice(['common', 'unique'])},
+                 item_custom_quantity={rng.choice(item_ids): 500})
+        for i in range(40)
+    ]
+    usage, custom = {item_ids[0]: 'common'}, {item_ids[1]: 1000}
+    aggregation = aggregate(experiments, items.get)
+    # Small blocks, so scenarios are spread over several of them
+    monkeypatch.setattr(cost_engine, 'SCENARIO_BLOCK_CELLS', 7 * len(aggregation.item_ids))
+    result = evaluate_scenarios(aggregation, exp_ids, scenarios, usage, custom)
+
+    monkeypatch.setattr(cost_engine, 'np', None)
+    expected = evaluate_scenarios(aggregate(experiments, items.get), exp_ids, scenarios, usage, custom)
+    assert [cost for row in result for cost in row] == pytest.approx([cost for row in expected for cost in row], rel=1e-9)
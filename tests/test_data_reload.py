@@ -0,0 +1,54 @@
+"""
+Reloading the data while requests are running: each request keeps the set it bound
+"""
+
+import threading
+
+
+def reload_elsewhere(app):
+    """reload_data() from another thread, as a shared-state refresh or admin reload would run"""
+    thread = threading.Thread(target=app.reload_data)
+    thread.start()
+    thread.join()
+
+
+def test_request_keeps_its_data_across_a_reload(lab):
+    app = lab()
+    flask_app = app.create_app({'SECRET_KEY': 'test'})
+    with flask_app.test_request_context('/api/experiments'):
+        app.bind_data()
+        bound = app.current_data._get_current_object()
+        reload_elsewhere(app)
+
+        assert app.dataset is not bound
+        assert app.current_data._get_current_object() is bound
+        assert app.current_data.catalog is bound.catalog
+        assert app.current_data.experiment_index is bound.experiment_index
+
+        # The reloading request itself moves to the new set
+        app.reload_data()
+        assert app.current_data._get_current_object() is app.dataset
+    # Outside a request, the live set
+    assert app.current_data._get_current_object() is app.dataset
+
+
+def test_write_after_a_reload_goes_to_the_live_data(lab):
+    app = lab()
+    flask_app = app.create_app({'SECRET_KEY': 'test'})
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'admin'
+    exp_id = next(iter(app.dataset.experiments_db))
+    bound = []
+
+    @flask_app.before_request
+    def reload_after_binding():
+        # Runs after the request bound its data, before the view takes the write lock
+        bound.append(app.current_data._get_current_object())
+        reload_elsewhere(app)
+
+    response = client.patch(f'/api/experiments/{exp_id}', json={'name': 'After reload'})
+    assert response.status_code == 200, response.data
+    assert app.dataset is not bound[0]
+    assert app.dataset.experiments_db[exp_id]['name'] == 'After reload'
+    assert bound[0].experiments_db[exp_id]['name'] != 'After reload'
@@ -0,0 +1,82 @@
+"""
+PATCH /api/experiments/<id> and POST /api/experiments:batch: validation and rollback
+"""
+
+import json
+
+import pytest
+
+from records import json_default
+
+
+def data_state(app):
+    """Experiments and items as JSON text, for before/after comparisons"""
+    return json.dumps([app.dataset.experiments_db, app.dataset.items_data], default=json_default, sort_keys=True)
+
+
+def disk_state(app, lab, storage_engine):
+    """The same, as a fresh process would load it from disk"""
+    app.storage.flush()
+    return data_state(lab(storage_engine))
+
+
+def first_experiment(app):
+    exp_id = next(iter(app.dataset.experiments_db))
+    return exp_id, app.dataset.experiments_db[exp_id]['items'][0]['id']
+
+
+def test_batch_creates_and_edits(client, lab, storage_engine):
+    import app
+    exp_id, item_id = first_experiment(app)
+    response = client.post('/api/experiments:batch', json={'experiments': [
+        {'name': 'Batch A', 'items': {'add': [{'name': 'Batch reagent', 'quantity': 2, 'price': 1.5}]}},
+        {'id': exp_id, 'items': {'update': [{'id': item_id, 'quantity': 7}]}}
+    ]})
+    assert response.status_code == 200, response.data
+    created, edited = response.get_json()['experiments']
+    assert [item['name'] for item in created['items']] == ['Batch reagent']
+    assert next(item for item in edited['items'] if item['id'] == item_id)['quantity'] == 7
+    assert disk_state(app, lab, storage_engine) == data_state(app)
+
+
+@pytest.mark.parametrize('patches, status, index', [
+    # Later patches are checked against what earlier ones did
+    (lambda exp_id, item_id: [{'id': exp_id, 'items': {'remove': [item_id]}},
+                              {'id': exp_id, 'items': {'update': [{'id': item_id, 'quantity': 2}]}}], 400, 1),
+    (lambda exp_id, item_id: [{'id': exp_id, 'items': {'update': [{'id': item_id, 'quantity': 'abc'}]}}], 400, 0),
+    (lambda exp_id, item_id: [{'id': exp_id, 'items': {'add': ['not an object']}}], 400, 0),
+    (lambda exp_id, item_id: [{'id': exp_id, 'items': {'add': [{'name': 'Cheap', 'price': -1}]}}], 400, 0),
+    # Applied patches, items created and then reused, and a renamed catalog item are all undone
+    (lambda exp_id, item_id: [{'name': 'A', 'items': {'add': [{'name': 'Foo'}]}},
+                              {'name': 'B', 'items': {'add': [{'name': 'Foo', 'price': 3}]}},
+                              {'id': exp_id, 'name': 'Renamed',
+                               'items': {'update': [{'id': item_id, 'name': 'Renamed item', 'price': 9}]}},
+                              {'id': 'EXP999'}], 404, 3),
+])
+def test_failed_batch_changes_nothing(client, lab, storage_engine, patches, status, index):
+    import app
+    exp_id, item_id = first_experiment(app)
+    before = data_state(app)
+    listing = client.get('/api/experiments').data
+
+    response = client.post('/api/experiments:batch', json={'experiments': patches(exp_id, item_id)})
+    assert response.status_code == status, response.data
+    assert response.get_json()['index'] == index
+
+    assert data_state(app) == before
+    assert client.get('/api/experiments').data == listing
+    assert client.get('/api/search?q=foo').get_json()['results'] == []
+    assert client.post('/api/calculate', json={'experiment_ids': [exp_id]}).status_code == 200
+    assert disk_state(app, lab, storage_engine) == before
+
+
+def test_failed_patch_changes_nothing(client, lab, storage_engine):
+    import app
+    exp_id, item_id = first_experiment(app)
+    before = data_state(app)
+    for patch in ({'items': {'update': [{'id': item_id, 'quantity': 'abc'}]}},
+                  {'items': {'add': [1]}},
+                  {'items': {'remove': [item_id], 'update': [{'id': item_id}]}}):
+        assert client.patch(f'/api/experiments/{exp_id}', json=patch).status_code == 400
+    assert data_state(app) == before
+    assert disk_state(app, lab, storage_engine) == before
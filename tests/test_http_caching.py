@@ -0,0 +1,75 @@
+"""
+Conditional GETs: ETags, 304 responses and compressed representations
+"""
+
+import pytest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def client(lab):
+    """Caching doesn't depend on the storage engine, so the JSON one only"""
+    app = lab()
+    test_client = app.create_app({'SECRET_KEY': 'test'}).test_client()
+    with test_client.session_transaction() as session:
+        session['username'] = 'admin'
+    return test_client
+
+
+def test_etag_holds_until_the_data_changes(client):
+    response = client.get('/api/items')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    not_modified = client.get('/api/items', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+    # The query string is part of the body's identity
+    assert client.get('/api/items?category=x').headers['ETag'] != etag
+
+    item_id = response.get_json()['items'][0]['id']
+    assert client.put(f'/api/items/{item_id}/price', json={'price': 12.5}).status_code == 200
+    changed = client.get('/api/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_compressed_body_has_its_own_etag(client):
+    response = client.get('/api/experiments', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+    for candidate in (etag, 'W/' + etag):
+        assert client.get('/api/experiments', headers=dict(GZIP, **{'If-None-Match': candidate})).status_code == 304
+
+
+def test_no_etag_while_a_mutation_runs(client, monkeypatch):
+    import app
+    etag = client.get('/api/items').headers['ETag']
+    monkeypatch.setattr(app, 'mutations_running', 1)
+    response = client.get('/api/items', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_304_needs_a_session_unless_public(client):
+    items_etag = client.get('/api/items').headers['ETag']
+    categories_etag = client.get('/api/categories').headers['ETag']
+    with client.session_transaction() as session:
+        session.clear()
+    assert client.get('/api/items', headers={'If-None-Match': items_etag}).status_code == 401
+    assert client.get('/api/categories', headers={'If-None-Match': categories_etag}).status_code == 304
+
+
+def test_static_files_revalidate_their_compressed_copy(client):
+    response = client.get('/static/script.js?v=1', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    not_modified = client.get('/static/script.js?v=1', headers=dict(GZIP, **{'If-None-Match': etag}))
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert 'immutable' in not_modified.headers['Cache-Control']
+    assert client.get('/static/script.js', headers={'If-None-Match': '"other-gzip"'}).status_code == 200
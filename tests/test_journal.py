@@ -0,0 +1,109 @@
+"""
+JSON engine durability: journaled writes are replayed after a crash and folded in by compaction
+"""
+
+import json
+import os
+
+from journal import MutationJournal, replay
+from storage import JOURNAL_FILE, JSONStorage
+
+
+def open_json_storage():
+    return JSONStorage(flush_interval_ms=10000, journal=MutationJournal(JOURNAL_FILE))
+
+
+def load(store):
+    experiments, items_data, categories_data = store.load_experiments(), store.load_items(), store.load_categories()
+    replayed = store.replay_journal(experiments, items_data, categories_data)
+    return experiments, items_data, categories_data, replayed
+
+
+def edit(store, experiments, items_data):
+    """One experiment renamed, one deleted and one item added; returns their ids"""
+    renamed_id, deleted_id = list(experiments)[:2]
+    renamed = dict(experiments[renamed_id], name='Renamed in journal')
+    experiments[renamed_id] = renamed
+    store.save_experiment(renamed)
+    del experiments[deleted_id]
+    store.delete_experiment(deleted_id)
+    item = {'id': 'ITM_JOURNAL', 'name': 'Journal salt', 'price_per_unit': 2, 'unit': 'g', 'category': 'consumable'}
+    items_data['items'].append(item)
+    store.save_item(item)
+    return renamed_id, deleted_id
+
+
+def test_unflushed_writes_are_replayed(data_dir, monkeypatch):
+    originals = {name: (data_dir / name).read_bytes() for name in ('experiments.json', 'items.json')}
+    store = open_json_storage()
+    # The process dies before any snapshot is written
+    monkeypatch.setattr(store.writer, 'flush', store.writer.metrics)
+    experiments, items_data, _, _ = load(store)
+    renamed_id, deleted_id = edit(store, experiments, items_data)
+    assert {name: (data_dir / name).read_bytes() for name in originals} == originals
+
+    reopened = open_json_storage()
+    experiments, items_data, _, replayed = load(reopened)
+    assert replayed == 3
+    assert experiments[renamed_id]['name'] == 'Renamed in journal'
+    assert deleted_id not in experiments
+    assert items_data['items'][-1]['id'] == 'ITM_JOURNAL'
+    reopened.close()
+
+
+def test_flush_compacts_the_journal(data_dir):
+    store = open_json_storage()
+    experiments, items_data, _, _ = load(store)
+    renamed_id, deleted_id = edit(store, experiments, items_data)
+    assert len(store.journal.entries()) == 3
+
+    store.flush()
+    assert store.journal.entries() == []
+    assert not os.path.exists(JOURNAL_FILE + '.compacting')
+    on_disk = json.loads((data_dir / 'experiments.json').read_text(encoding='utf-8'))
+    assert on_disk[renamed_id]['name'] == 'Renamed in journal' and deleted_id not in on_disk
+    store.close()
+
+    reopened = open_json_storage()
+    experiments, _, _, replayed = load(reopened)
+    assert replayed == 0
+    assert experiments[renamed_id]['name'] == 'Renamed in journal'
+    reopened.close()
+
+
+def test_failed_compaction_is_replayed_before_the_live_log(data_dir):
+    def line(seq, name):
+        return json.dumps({'seq': seq, 'ts': 0, 'op': 'experiment.save',
+                           'data': {'id': 'EXP_J', 'name': name, 'items': []}}) + '\n'
+
+    # A compaction that died after rotating, then more writes, then a crash mid-append
+    (data_dir / (JOURNAL_FILE + '.compacting')).write_text(line(1, 'first'), encoding='utf-8')
+    (data_dir / JOURNAL_FILE).write_text(line(2, 'second') + '{"seq": 3, "op": "exp', encoding='utf-8')
+
+    journal = MutationJournal(JOURNAL_FILE)
+    assert [entry['seq'] for entry in journal.entries()] == [1, 2]
+    experiments = {}
+    assert replay(journal.entries(), experiments, {'items': []}, {'categories': []}) == {'experiments'}
+    assert experiments['EXP_J']['name'] == 'second'
+
+    # Sequence numbers continue, and a second rotation keeps the older entries first
+    assert journal.append('experiment.delete', {'id': 'EXP_J'}) == 3
+    journal.rotate()
+    assert [entry['seq'] for entry in journal.entries()] == [1, 2, 3]
+    journal.discard_rotated()
+    assert journal.entries() == []
+    journal.close()
+
+
+def test_replay_updates_in_place_and_appends_new_rows():
+    items_data = {'items': [{'id': 'ITM1', 'name': 'Salt'}, {'id': 'ITM2', 'name': 'Sugar'}]}
+    categories_data = {'categories': [{'id': 'CAT1', 'name': 'Chemistry'}]}
+    entries = [
+        {'seq': 1, 'op': 'item.save', 'data': {'id': 'ITM2', 'name': 'Brown sugar'}},
+        {'seq': 2, 'op': 'item.save', 'data': {'id': 'ITM3', 'name': 'Pepper'}},
+        {'seq': 3, 'op': 'category.save', 'data': {'id': 'CAT1', 'name': 'Chem'}},
+        {'seq': 4, 'op': 'item.save', 'data': {'id': 'ITM3', 'name': 'Black pepper'}}
+    ]
+    assert replay(entries, {}, items_data, categories_data) == {'items', 'categories'}
+    assert [item['name'] for item in items_data['items']] == ['Salt', 'Brown sugar', 'Black pepper']
+    assert categories_data['categories'] == [{'id': 'CAT1', 'name': 'Chem'}]
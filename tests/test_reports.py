@@ -0,0 +1,75 @@
+"""
+/api/calculate/export: the XLSX keeps the browser export's sheets, CSV is the flat item list
+"""
+
+import csv
+import io
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+def export(client, fmt, exp_ids):
+    response = client.post(f'/api/calculate/export?format={fmt}', json={'experiment_ids': exp_ids})
+    assert response.status_code == 200, response.data
+    return response.data
+
+
+def rows(sheet):
+    return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+
+def test_xlsx_layout(client):
+    import app
+    exp_ids = list(app.dataset.experiments_db)
+    result = client.post('/api/calculate', json={'experiment_ids': exp_ids}).get_json()
+    workbook = openpyxl.load_workbook(io.BytesIO(export(client, 'xlsx', exp_ids)))
+    assert workbook.sheetnames == ['Summary', 'Experiments & Items', 'Common Items', 'Unique Items',
+                                   'Procurement Summary']
+
+    summary = rows(workbook['Summary'])
+    assert summary[0] == ['Lab Procurement Report', None]
+    assert summary[2] == ['Total Experiments:', len(exp_ids)]
+    assert summary[3] == ['Total Cost (₹):', result['total_cost']]
+
+    common = rows(workbook['Common Items'])
+    assert common[0][0] == 'Common Items to Procure'
+    assert common[1] == ['Item Name', 'Total Quantity', 'Unit', 'Price/Unit (₹)', 'Total Cost (₹)', 'Category',
+                         'Used In Experiments']
+    assert [row[0] for row in common[2:-1]] == [item['name'] for item in result['common_items']]
+    assert common[-1][3] == 'TOTAL:'
+
+    unique = rows(workbook['Unique Items'])
+    assert unique[0][0] == 'Unique Items Summary'
+    assert unique[1] == ['Experiment', 'Item Name', 'Quantity', 'Unit', 'Price/Unit (₹)', 'Total Cost (₹)',
+                         'Category']
+    # One group per experiment, each followed by a blank row
+    body = unique[2:-1]
+    assert sum(1 for row in body if row[0] is None) == len(exp_ids)
+    names = [app.dataset.experiments_db[exp_id]['name'] for exp_id in exp_ids]
+    grouped = [row[0] for row in body if row[0] is not None]
+    assert grouped == sorted(grouped, key=names.index)
+    unique_cost = sum(item['total_cost'] for item in result['unique_items'])
+    assert unique[-1][4:6] == ['TOTAL:', pytest.approx(unique_cost, abs=0.01)]
+    assert sum(row[5] for row in body if row[0] is not None) == pytest.approx(unique_cost, abs=0.01)
+
+    # Unique items come before common ones within each experiment
+    breakdown = rows(workbook['Experiments & Items'])
+    kinds = [row[5] for row in breakdown[1:] if row[0] == exp_ids[0]]
+    assert kinds == sorted(kinds, key=['Unique', 'Common'].index)
+
+    procurement = rows(workbook['Procurement Summary'])
+    assert procurement[0][0] == 'PROCUREMENT SUMMARY'
+    assert procurement[-1] == ['TOTAL', len(result['common_items']) + len(result['unique_items']),
+                               result['total_cost']]
+
+
+def test_csv_is_the_flat_item_list(client):
+    import app
+    from reports import ITEM_HEADER
+    exp_ids = list(app.dataset.experiments_db)
+    result = client.post('/api/calculate', json={'experiment_ids': exp_ids}).get_json()
+    table = list(csv.reader(io.StringIO(export(client, 'csv', exp_ids).decode('utf-8-sig'))))
+    assert table[0] == ITEM_HEADER
+    assert [row[0] for row in table[1:]] == [item['id'] for item in result['common_items'] + result['unique_items']]
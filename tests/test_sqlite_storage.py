@@ -0,0 +1,88 @@
+"""
+SQLite engine: import from the JSON files, row writes, transactions
+"""
+
+import pytest
+
+from records import ExperimentRecord, ItemRecord
+from storage import SQLITE_FILE, JSONStorage, SQLiteStorage, import_json_files
+
+
+@pytest.fixture
+def sqlite_storage(data_dir):
+    store = SQLiteStorage(SQLITE_FILE)
+    import_json_files(store, JSONStorage())
+    yield store
+    store.close()
+
+
+def reopen():
+    """A second engine on the same file: its own connection, so it only sees committed rows"""
+    return SQLiteStorage(SQLITE_FILE)
+
+
+def test_import_matches_the_json_files(sqlite_storage):
+    source = JSONStorage()
+    assert sqlite_storage.load_experiments() == source.load_experiments()
+    assert list(sqlite_storage.load_experiments()) == list(source.load_experiments())
+    assert sqlite_storage.load_items() == source.load_items()
+    assert sqlite_storage.load_categories() == source.load_categories()
+    assert sqlite_storage.load_users() == source.load_users()
+
+
+def test_row_writes_persist_and_keep_order(sqlite_storage):
+    items = sqlite_storage.load_items()['items']
+    first = ItemRecord(dict(items[0], name='Renamed first item'))
+    sqlite_storage.save_item(first)
+    sqlite_storage.save_item(ItemRecord({'id': 'ITM_NEW', 'name': 'New', 'price_per_unit': 1.5,
+                                         'unit': 'g', 'category': 'consumable'}))
+    experiments = sqlite_storage.load_experiments()
+    deleted_id = next(iter(experiments))
+    sqlite_storage.delete_experiment(deleted_id)
+    sqlite_storage.save_experiment(ExperimentRecord({'id': 'EXP_NEW', 'name': 'New', 'trials': 2, 'category': '',
+                                                     'grade': [9], 'items': [{'id': 'ITM_NEW', 'quantity': 3}]}))
+
+    other = reopen()
+    reloaded_items = other.load_items()['items']
+    # An update keeps the row's place; a new row goes last
+    assert reloaded_items[0]['name'] == 'Renamed first item'
+    assert reloaded_items[-1]['id'] == 'ITM_NEW' and len(reloaded_items) == len(items) + 1
+    reloaded = other.load_experiments()
+    assert deleted_id not in reloaded
+    assert reloaded['EXP_NEW']['items'] == [{'id': 'ITM_NEW', 'quantity': 3}]
+    other.close()
+
+
+def test_batch_commits_once_at_the_end(sqlite_storage):
+    other = reopen()
+    count = len(other.load_items()['items'])
+    with sqlite_storage.batch():
+        for i in range(3):
+            sqlite_storage.save_item({'id': f"ITM_B{i}", 'name': f"Batch {i}", 'price_per_unit': 1, 'unit': 'g'})
+        assert len(other.load_items()['items']) == count
+    assert len(other.load_items()['items']) == count + 3
+    other.close()
+
+
+@pytest.mark.parametrize('atomic, kept', [(True, 0), (False, 1)])
+def test_failed_batch(sqlite_storage, atomic, kept):
+    count = len(sqlite_storage.load_items()['items'])
+    with pytest.raises(RuntimeError):
+        with sqlite_storage.batch(atomic=atomic):
+            sqlite_storage.save_item({'id': 'ITM_FAIL', 'name': 'Fail', 'price_per_unit': 1, 'unit': 'g'})
+            raise RuntimeError('edit failed')
+    other = reopen()
+    assert len(other.load_items()['items']) == count + kept
+    other.close()
+
+
+def test_save_users_replaces_the_table(sqlite_storage):
+    users = sqlite_storage.load_users()
+    removed = next(iter(users))
+    users.pop(removed)
+    users['newcomer'] = {'password': 'hash', 'subject': 'Physics'}
+    sqlite_storage.save_users(users)
+    reloaded = reopen().load_users()
+    assert removed not in reloaded
+    assert reloaded['newcomer'] == {'password': 'hash', 'subject': 'Physics'}
+    assert reloaded == users
@@ -0,0 +1,76 @@
+"""
+In-memory user table with change detection, so auth checks don't touch disk
+"""
+
+import copy
+import threading
+import time
+
+from username_index import UsernameIndex
+
+
+class UserStore:
+    """Cached copy of the storage engine's user table
+
+    The cache is replaced on every write through save() and reloaded when the
+    storage stamp (users.json's mtime for the JSON engine) changes. The stamp
+    is checked at most once per check_interval seconds. A trigram index over
+    the usernames is kept in step for login suggestions.
+    """
+
+    def __init__(self, storage, check_interval=1.0):
+        self.storage = storage
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._users = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self.index = UsernameIndex()
+        self.loads = 0
+
+    def get(self):
+        """The cached user table; treat it as read-only"""
+        now = time.monotonic()
+        users = self._users
+        if users is not None and now - self._checked_at < self.check_interval:
+            return users
+        with self._lock:
+            stamp = self.storage.users_stamp()
+            if self._users is None or stamp != self._stamp:
+                self._users = self.storage.load_users()
+                self._stamp = stamp
+                self.index.reset(self._users)
+                self.loads += 1
+            self._checked_at = now
+            return self._users
+
+    def get_for_update(self):
+        """A private deep copy to modify and pass to save()"""
+        return copy.deepcopy(self.get())
+
+    def save(self, users):
+        """Persist users and make them the cached table"""
+        with self._lock:
+            self.storage.save_users(users)
+            if self._users is None:
+                self.index.reset(users)
+            else:
+                # Creates, renames and deletes touch only the names that changed
+                for username in self._users.keys() - users.keys():
+                    self.index.remove(username)
+                for username in users.keys() - self._users.keys():
+                    self.index.add(username)
+            self._users = users
+            self._stamp = self.storage.users_stamp()
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a reload on next access (e.g. another worker process wrote)"""
+        with self._lock:
+            self._users = None
+
+    def suggest(self, username, k=3):
+        """Up to k existing usernames similar to username"""
+        self.get()
+        with self._lock:
+            return self.index.suggest(username, k)
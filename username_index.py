@@ -0,0 +1,65 @@
+"""
+Trigram index over usernames for "Did you mean" suggestions
+"""
+
+import heapq
+from collections import Counter
+
+MIN_SIMILARITY = 0.2
+
+
+def trigrams(name):
+    """Character trigrams of a lowercased, padded name ('ab' -> {'  a', ' ab', 'ab '})"""
+    padded = f"  {name.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class UsernameIndex:
+    """Inverted index trigram -> usernames
+
+    A lookup only touches the posting lists of the query's own trigrams, so
+    its cost depends on how many names share trigrams with the query rather
+    than on the total number of accounts.
+    """
+
+    def __init__(self, usernames=()):
+        self.reset(usernames)
+
+    def reset(self, usernames):
+        self._postings = {}
+        self._sizes = {}
+        for username in usernames:
+            self.add(username)
+
+    def add(self, username):
+        grams = trigrams(username)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(username)
+        self._sizes[username] = len(grams)
+
+    def remove(self, username):
+        if self._sizes.pop(username, None) is None:
+            return
+        for gram in trigrams(username):
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(username)
+                if not names:
+                    del self._postings[gram]
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def suggest(self, query, k=3):
+        """Up to k usernames most similar to query (Jaccard similarity of trigram sets)"""
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        scored = []
+        for username, count in shared.items():
+            similarity = count / (len(query_grams) + self._sizes[username] - count)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((-similarity, username))
+        return [username for _, username in heapq.nsmallest(k, scored)]